@@ -0,0 +1,62 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+import os
+import sys
+import time
+import statistics
+from typing import Callable, Dict, List, Optional
+
+# Make backend/src importable (as main.py does)
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import numpy as np
+import nibabel as nib
+
+
+def load_reference_labels(seg_path: Optional[str]) -> Optional[np.ndarray]:
+    """Load a BraTS ground-truth segmentation with label 4 remapped to 3."""
+    if not seg_path:
+        return None
+    seg = np.asarray(nib.load(seg_path).dataobj).astype(np.uint8)
+    seg[seg == 4] = 3
+    return seg
+
+
+def time_runs(fn: Callable[[], object], repeats: int = 3, warmup: int = 1) -> Dict:
+    """
+    Time a callable.
+
+    Args:
+        fn: Callable to time; its last result is returned
+        repeats: Timed runs
+        warmup: Untimed runs first
+
+    Returns:
+        Dictionary with 'median_s', 'min_s', 'runs_s' and 'result'
+    """
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    runs: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return {
+        "median_s": round(statistics.median(runs), 4),
+        "min_s": round(min(runs), 4),
+        "runs_s": [round(r, 4) for r in runs],
+        "result": result,
+    }
+
+
+def print_table(rows: List[Dict], columns: List[str]) -> None:
+    """Print rows as an aligned text table."""
+    widths = [max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
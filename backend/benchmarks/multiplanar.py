@@ -0,0 +1,83 @@
+"""
+Multi-Orientation Fusion Benchmark
+==================================
+Segments the same reference case with axial slices only and with
+axial/coronal/sagittal fusion, and reports the added latency next to the
+Dice gain: against ground truth when a segmentation is given, otherwise
+only the agreement between the two masks.
+
+Usage:
+    python benchmarks/multiplanar.py --flair case_flair.nii --t1ce case_t1ce.nii \
+        [--seg case_seg.nii] [--model models/saved_models/final_model.pth]
+"""
+import argparse
+import json
+
+from common import load_reference_labels, time_runs, print_table
+
+from utils.config import settings
+from models.unet_pytorch import get_segmenter
+from models.multiplanar import MultiPlanarInferer, parse_orientations
+from preprocessing.nifti_loader import BraTSPreprocessor
+from postprocessing.statistics import dice_scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flair", required=True)
+    parser.add_argument("--t1ce", required=True)
+    parser.add_argument("--seg", default=None, help="Ground-truth segmentation (optional)")
+    parser.add_argument("--model", default=str(settings.get_model_path()))
+    parser.add_argument("--orientations", default="axial,coronal,sagittal")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=settings.INFERENCE_BATCH_SIZE)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    segmenter = get_segmenter(args.model)
+    if not segmenter.is_loaded():
+        raise SystemExit(f"Could not load model from {args.model}")
+
+    volume = BraTSPreprocessor(target_size=settings.TARGET_SIZE).preprocess_native(
+        args.flair, args.t1ce
+    )['model_input']
+    reference = load_reference_labels(args.seg)
+
+    rows, masks = [], {}
+    for orientations in [("axial",), parse_orientations(args.orientations)]:
+        inferer = MultiPlanarInferer(
+            lambda batch: segmenter.predict_batch(batch, normalize=False),
+            target_size=settings.TARGET_SIZE,
+            batch_size=args.batch_size,
+            num_classes=settings.NUM_CLASSES,
+            orientations=orientations
+        )
+        timing = time_runs(lambda: inferer.predict_volume(volume), repeats=args.repeats)
+        name = "+".join(orientations)
+        masks[name] = timing.pop("result")
+        row = {"mode": name, "batches": inferer.last_stats["batches"], **timing}
+        if reference is not None:
+            row["dice_vs_gt"] = dice_scores(masks[name], reference)
+        rows.append(row)
+
+    baseline, fused = rows
+    fused["added_latency_s"] = round(fused["median_s"] - baseline["median_s"], 4)
+    fused["latency_ratio"] = round(fused["median_s"] / baseline["median_s"], 2)
+    fused["dice_vs_axial"] = dice_scores(masks[fused["mode"]], masks[baseline["mode"]])
+    if reference is not None:
+        fused["dice_gain"] = {
+            region: round(score - baseline["dice_vs_gt"][region], 4)
+            for region, score in fused["dice_vs_gt"].items()
+        }
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        columns = ["mode", "batches", "median_s", "min_s", "added_latency_s", "latency_ratio", "dice_vs_axial"]
+        if reference is not None:
+            columns += ["dice_vs_gt", "dice_gain"]
+        print_table(rows, columns)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Intensity Normalization Benchmark
+=================================
+Times loading + normalizing the reference case with the legacy float64
+min-max path and with each normalization strategy, then segments the case
+with each strategy and reports the Dice agreement with the min-max mask,
+and the Dice against ground truth when a segmentation is given.
+
+Usage:
+    python benchmarks/normalization.py --flair case_flair.nii --t1ce case_t1ce.nii \
+        [--seg case_seg.nii] [--model models/saved_models/final_model.pth]
+"""
+import argparse
+import json
+
+import numpy as np
+
+from common import load_reference_labels, time_runs, print_table
+
+from utils.config import settings
+from models.unet_pytorch import get_segmenter
+from preprocessing.nifti_loader import BraTSPreprocessor
+from preprocessing.normalization import STRATEGIES, IntensityNormalizer
+from postprocessing.resample import ProbabilityResampler
+from postprocessing.statistics import dice_scores
+
+
+def legacy_normalize(preprocessor, flair_path, t1ce_path):
+    """Float64 load and out-of-place min-max, as before the normalizer."""
+    return [
+        preprocessor.normalize_modality(preprocessor.load_nifti(path))
+        for path in (flair_path, t1ce_path)
+    ]
+
+
+def segment(segmenter, result, batch_size):
+    """Run inference + chunked postprocessing and return the label volume."""
+    resampler = ProbabilityResampler(result['original_shape'], num_classes=settings.NUM_CLASSES)
+    for start, probabilities in segmenter.iter_predict(result['model_input'], batch_size=batch_size):
+        resampler.add(start, probabilities)
+    return resampler.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flair", required=True)
+    parser.add_argument("--t1ce", required=True)
+    parser.add_argument("--seg", default=None, help="Ground-truth segmentation (optional)")
+    parser.add_argument("--model", default=str(settings.get_model_path()))
+    parser.add_argument("--percentiles", default="0.5,99.5")
+    parser.add_argument("--sample-voxels", type=int, default=settings.NORMALIZATION_SAMPLE_VOXELS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=settings.INFERENCE_BATCH_SIZE)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    segmenter = get_segmenter(args.model)
+    if not segmenter.is_loaded():
+        raise SystemExit(f"Could not load model from {args.model}")
+    reference = load_reference_labels(args.seg)
+    percentiles = tuple(float(p) for p in args.percentiles.split(","))
+
+    legacy = time_runs(
+        lambda: legacy_normalize(BraTSPreprocessor(target_size=settings.TARGET_SIZE), args.flair, args.t1ce),
+        repeats=args.repeats
+    )
+    legacy.pop("result")
+    rows = [{"mode": "minmax (float64, legacy)", **legacy}]
+
+    masks = {}
+    for strategy in STRATEGIES:
+        preprocessor = BraTSPreprocessor(
+            target_size=settings.TARGET_SIZE,
+            normalizer=IntensityNormalizer(strategy, percentiles, args.sample_voxels)
+        )
+        timing = time_runs(
+            lambda: preprocessor._load_normalized_pair(args.flair, args.t1ce),
+            repeats=args.repeats
+        )
+        flair = timing.pop("result")[0]
+        row = {
+            "mode": strategy,
+            **timing,
+            "flair_range": [round(float(np.min(flair)), 3), round(float(np.max(flair)), 3)]
+        }
+        masks[strategy] = segment(
+            segmenter, preprocessor.preprocess_for_inference(args.flair, args.t1ce), args.batch_size
+        )
+        if reference is not None:
+            row["dice_vs_gt"] = dice_scores(masks[strategy], reference)
+        rows.append(row)
+
+    baseline = rows[0]
+    for row in rows:
+        row["speedup"] = round(baseline["median_s"] / row["median_s"], 2)
+        if row["mode"] in masks:
+            row["dice_vs_minmax"] = dice_scores(masks[row["mode"]], masks["minmax"])
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        columns = ["mode", "median_s", "min_s", "speedup", "flair_range", "dice_vs_minmax"]
+        if reference is not None:
+            columns.append("dice_vs_gt")
+        print_table(rows, columns)
+
+
+if __name__ == "__main__":
+    main()
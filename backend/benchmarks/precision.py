@@ -0,0 +1,85 @@
+"""
+Precision Benchmark (fp32 vs bfloat16)
+======================================
+Runs the same reference case through the UNet in fp32, fp32 channels-last
+and bfloat16 autocast (channels-last), reports latency and the Dice
+agreement with the fp32 mask, and the Dice against ground truth when a
+segmentation is given. The "model" column tells whether a row ran the
+optimized TorchScript graph (plain fp32 with OPTIMIZE_MODEL) or the eager
+model (channels-last and bf16).
+
+Usage:
+    python benchmarks/precision.py --flair case_flair.nii --t1ce case_t1ce.nii \
+        [--seg case_seg.nii] [--model models/saved_models/final_model.pth]
+"""
+import argparse
+import json
+
+from common import load_reference_labels, time_runs, print_table
+
+from utils.config import settings
+from models.unet_pytorch import get_segmenter
+from preprocessing.nifti_loader import BraTSPreprocessor
+from postprocessing.resample import ProbabilityResampler
+from postprocessing.statistics import dice_scores
+
+
+def segment(segmenter, model_input, original_shape, batch_size):
+    """Run inference + chunked postprocessing and return the label volume."""
+    resampler = ProbabilityResampler(original_shape, num_classes=settings.NUM_CLASSES)
+    for start, probabilities in segmenter.iter_predict(model_input, batch_size=batch_size):
+        resampler.add(start, probabilities)
+    return resampler.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flair", required=True)
+    parser.add_argument("--t1ce", required=True)
+    parser.add_argument("--seg", default=None, help="Ground-truth segmentation (optional)")
+    parser.add_argument("--model", default=str(settings.get_model_path()))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=settings.INFERENCE_BATCH_SIZE)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    segmenter = get_segmenter(args.model)
+    if not segmenter.is_loaded():
+        raise SystemExit(f"Could not load model from {args.model}")
+
+    result = BraTSPreprocessor(target_size=settings.TARGET_SIZE).preprocess_for_inference(
+        args.flair, args.t1ce
+    )
+    reference = load_reference_labels(args.seg)
+
+    rows, masks = [], {}
+    for precision, channels_last in [("fp32", False), ("fp32", True), ("bf16", True)]:
+        segmenter.configure(precision, channels_last)
+        timing = time_runs(
+            lambda: segment(segmenter, result['model_input'], result['original_shape'], args.batch_size),
+            repeats=args.repeats
+        )
+        name = f"{precision}{'+cl' if channels_last else ''}"
+        masks[name] = timing.pop("result")
+        graph = "optimized" if segmenter._runtime_model() is segmenter.optimized_model else "eager"
+        row = {"mode": name, "model": graph, **timing}
+        if reference is not None:
+            row["dice_vs_gt"] = dice_scores(masks[name], reference)
+        rows.append(row)
+
+    baseline = rows[0]
+    for row in rows:
+        row["speedup"] = round(baseline["median_s"] / row["median_s"], 2)
+        row["dice_vs_fp32"] = dice_scores(masks[row["mode"]], masks["fp32"])
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        columns = ["mode", "model", "median_s", "min_s", "speedup", "dice_vs_fp32"]
+        if reference is not None:
+            columns.append("dice_vs_gt")
+        print_table(rows, columns)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Multi-Worker Serving Benchmark
+==============================
+Starts gunicorn (gunicorn.conf.py) with 1, 2, 4... workers, sends
+concurrent /api/predict/ requests and reports per-worker memory next to
+total throughput.
+
+Memory is read from /proc/<pid>/smaps_rollup (Linux): RSS counts shared
+pages in full for every process, PSS splits them between the processes
+mapping them, so total PSS is the real footprint of the server.
+
+Usage:
+    python benchmarks/workers.py --flair case_flair.nii --t1ce case_t1ce.nii \
+        [--workers 1,2,4] [--requests 8]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import httpx
+
+from common import print_table
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory_kib(pid: int) -> Dict[str, int]:
+    """Rss, Pss and shared kB of a process from smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].rstrip(":") in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty"):
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "shared": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of a process."""
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children += [int(c) for c in f.read().split()]
+    return children
+
+
+def wait_ready(url: str, workers: int, master: subprocess.Popen, timeout: float = 300) -> None:
+    """Wait until the server answers and all workers are forked."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if master.poll() is not None:
+            raise SystemExit("gunicorn exited during startup")
+        try:
+            if httpx.get(f"{url}/api/health/", timeout=2).status_code == 200 \
+                    and len(child_pids(master.pid)) >= workers:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    raise SystemExit("Server did not become ready")
+
+
+def predict(url: str, flair: str, t1ce: str) -> float:
+    """Send one prediction request; returns its latency in seconds."""
+    start = time.perf_counter()
+    with open(flair, "rb") as f, open(t1ce, "rb") as t:
+        response = httpx.post(
+            f"{url}/api/predict/",
+            files={"flair": (os.path.basename(flair), f), "t1ce": (os.path.basename(t1ce), t)},
+            timeout=None
+        )
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run(workers: int, args) -> Dict:
+    """Benchmark one worker count."""
+    url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, WORKERS=str(workers), API_HOST="127.0.0.1", API_PORT=str(args.port))
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None
+    )
+    try:
+        wait_ready(url, workers, master)
+        # Warm every worker up once
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda _: predict(url, args.flair, args.t1ce), range(workers)))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            latencies = list(pool.map(lambda _: predict(url, args.flair, args.t1ce), range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        worker_memory = [memory_kib(pid) for pid in child_pids(master.pid)]
+        master_memory = memory_kib(master.pid)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+    mib = lambda kib: round(kib / 1024, 1)
+    return {
+        "workers": workers,
+        "throughput_rps": round(args.requests / elapsed, 3),
+        "median_latency_s": round(sorted(latencies)[len(latencies) // 2], 3),
+        "worker_rss_mib": mib(sum(m["rss"] for m in worker_memory) / len(worker_memory)),
+        "worker_pss_mib": mib(sum(m["pss"] for m in worker_memory) / len(worker_memory)),
+        "worker_shared_mib": mib(sum(m["shared"] for m in worker_memory) / len(worker_memory)),
+        "total_pss_mib": mib(master_memory["pss"] + sum(m["pss"] for m in worker_memory)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flair", required=True)
+    parser.add_argument("--t1ce", required=True)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--requests", type=int, default=8, help="Timed requests per worker count")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show gunicorn logs")
+    args = parser.parse_args()
+    args.flair, args.t1ce = os.path.abspath(args.flair), os.path.abspath(args.t1ce)
+
+    rows = [run(int(n), args) for n in args.workers.split(",")]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Gunicorn Configuration (multi-worker serving)
+=============================================
+Runs the FastAPI app in several uvicorn worker processes that share one
+copy of the model weights:
+
+- preload_app imports the app in the master, and when_ready loads the
+  model there and moves its weights into shared memory (share_memory()),
+  so every forked worker maps the same pages.
+- The frozen TorchScript graph (OPTIMIZE_MODEL) holds private copies of
+  the weights, so with SHARE_WEIGHTS=true (default) it is not built and
+  workers serve the eager model. SHARE_WEIGHTS=false keeps the optimized
+  graph at the cost of one copy of the weights per worker.
+- The master keeps torch single-threaded, so no OpenMP thread pool exists
+  at fork time; each worker then sets its own thread count (TORCH_THREADS,
+  default: CPU count / WORKERS).
+
+Usage (from backend/):
+    WORKERS=4 gunicorn -c gunicorn.conf.py main:app
+
+Admission control (utils/admission.py) keeps its buckets and queue per
+worker, so its limits are divided by WORKERS (exported below for the app).
+"""
+import os
+import multiprocessing
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+pythonpath = chdir
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8000')}"
+workers = int(os.getenv("WORKERS", "2"))
+os.environ["WORKERS"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Inference requests can take minutes on CPU
+timeout = int(os.getenv("WORKER_TIMEOUT", "600"))
+graceful_timeout = 30
+keepalive = 5
+
+torch_threads = int(os.getenv("TORCH_THREADS", "0")) or max(1, multiprocessing.cpu_count() // workers)
+share_weights = os.getenv("SHARE_WEIGHTS", "true").lower() == "true"
+
+
+def when_ready(server):
+    """Load the model once in the master, before any worker is forked."""
+    import torch
+    torch.set_num_threads(1)
+
+    from utils.config import settings
+    from models.unet_pytorch import get_segmenter
+
+    if settings.INFERENCE_WORKERS > 0:
+        server.log.info("INFERENCE_WORKERS is set; each worker starts its own inference pool")
+        return
+
+    if share_weights:
+        # Workers could not use the shared weights through a frozen graph
+        settings.OPTIMIZE_MODEL = False
+
+    segmenter = get_segmenter(str(settings.get_model_path()))
+    if segmenter.is_loaded() and share_weights:
+        shared = segmenter.share_memory()
+        server.log.info(f"Model loaded in master; {shared / 2**20:.1f} MiB of weights shared with workers")
+    elif segmenter.is_loaded():
+        server.log.info("Model loaded in master; SHARE_WEIGHTS=false, workers get copy-on-write weights")
+    else:
+        server.log.warning("Model not loaded in master; workers will load their own copy")
+
+
+def post_fork(server, worker):
+    """Give each worker its share of the CPU threads."""
+    import torch
+    torch.set_num_threads(torch_threads)
+    server.log.info(f"Worker {worker.pid}: {torch_threads} torch thread(s)")
@@ -0,0 +1,45 @@
+"""
+Admin endpoints (profiling artifacts).
+"""
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from utils.config import settings
+from utils.profiling import get_profiler, ARTIFACTS
+
+router = APIRouter()
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Check an admin token. Without ADMIN_TOKEN, only DEBUG mode is trusted."""
+    if not settings.ADMIN_TOKEN:
+        return settings.DEBUG
+    return token is not None and hmac.compare_digest(token, settings.ADMIN_TOKEN)
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency rejecting non-admin requests."""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """List stored request profiles, newest first."""
+    profiler = get_profiler()
+    return {
+        "sample_rate": profiler.sample_rate,
+        "max_runs": profiler.max_runs,
+        "runs": profiler.list_runs()
+    }
+
+
+@router.get("/profiles/{run_id}/{artifact}", dependencies=[Depends(require_admin)])
+async def get_profile_artifact(run_id: str, artifact: str):
+    """Download one artifact of a profiled run."""
+    path = get_profiler().get_artifact(run_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    return FileResponse(path, media_type=ARTIFACTS[artifact], filename=f"{run_id}_{artifact}")
@@ -10,7 +10,11 @@ import numpy as np
 import nibabel as nib
 
 from utils.config import settings
-from models.unet_pytorch import get_segmenter
+from models.inference_pool import get_predictor, get_inference_pool
+from utils.admission import get_admission_controller
+from utils.artifact_store import get_artifact_store
+from preprocessing.tensor_cache import get_tensor_cache
+from preprocessing.normalization import get_normalizer
 
 router = APIRouter()
 
@@ -30,7 +34,8 @@ async def health_check():
 async def model_health():
     """Check model status."""
     model_path = settings.get_model_path()
-    segmenter = get_segmenter()
+    segmenter = get_predictor()
+    pool = get_inference_pool()
     
     return {
         "model_path": str(model_path),
@@ -38,21 +43,56 @@ async def model_health():
         "model_loaded": segmenter.is_loaded(),
         "device": segmenter.device if segmenter.is_loaded() else None,
         "input_channels": settings.NUM_CHANNELS,
-        "output_classes": settings.NUM_CLASSES
+        "output_classes": settings.NUM_CLASSES,
+        "inference_workers": pool.status() if pool is not None else None
     }
 
 
 @router.get("/config")
 async def get_config():
     """Get application configuration."""
+    admission = get_admission_controller()
+    tensor_cache = get_tensor_cache()
     return {
         "preprocessing": {
             "target_size": settings.TARGET_SIZE,
             "volume_slices": settings.VOLUME_SLICES,
             "volume_start_at": settings.VOLUME_START_AT,
             "num_classes": settings.NUM_CLASSES,
-            "num_channels": settings.NUM_CHANNELS
+            "num_channels": settings.NUM_CHANNELS,
+            "normalization": get_normalizer().params(),
+            "cache": tensor_cache.status() if tensor_cache is not None else None
         },
+        "inference": {
+            "mode": settings.INFERENCE_MODE,
+            "available_modes": list(settings.INFERENCE_MODES),
+            "sliding_window_overlap": settings.SW_OVERLAP,
+            "sliding_window_batch_size": settings.SW_BATCH_SIZE,
+            "multiplanar_orientations": settings.MULTIPLANAR_ORIENTATIONS,
+            "precision": settings.INFERENCE_PRECISION,
+            "channels_last": settings.CHANNELS_LAST,
+            "optimize_model": settings.OPTIMIZE_MODEL,
+            "tta_transforms": settings.TTA_TRANSFORMS,
+            "context_slices": settings.CONTEXT_SLICES,
+            "uncertainty": settings.UNCERTAINTY_MODE,
+            "mc_dropout_samples": settings.MC_DROPOUT_SAMPLES
+        },
+        "postprocessing": {
+            "cleanup": settings.POSTPROCESS_CLEANUP,
+            "min_component_mm3": settings.POSTPROCESS_MIN_COMPONENT_MM3,
+            "keep_largest": settings.POSTPROCESS_KEEP_LARGEST,
+            "fill_holes": settings.POSTPROCESS_FILL_HOLES,
+            "time_budget_s": settings.POSTPROCESS_TIME_BUDGET_S
+        },
+        "admission": {
+            "enabled": settings.ADMISSION_CONTROL,
+            "rate": settings.ADMISSION_RATE,
+            "burst": settings.ADMISSION_BURST,
+            "max_queued": settings.ADMISSION_MAX_QUEUED,
+            "server_workers": settings.SERVER_WORKERS,
+            "state": admission.status() if admission is not None else None
+        },
+        "outputs": get_artifact_store().status(),
         "modalities": settings.MODALITIES,
         "class_labels": settings.CLASS_LABELS,
         "class_colors": settings.CLASS_COLORS,
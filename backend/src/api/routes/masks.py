@@ -0,0 +1,127 @@
+"""
+Compact segmentation mask transport.
+Serves masks in the packed BSM1 format (see utils/mask_codec.py) with
+HTTP range support, so the viewer can fetch only the slices it displays.
+"""
+import re
+from typing import Optional, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from utils import mask_codec
+from utils.artifact_store import get_artifact_store
+from api.routes.outputs import artifact_headers
+
+router = APIRouter()
+
+MASK_ID = re.compile(r"^segmentation_[0-9a-f]+$")
+
+
+def mask_artifact(mask_id: str) -> dict:
+    """Resolve a mask id to its packed file in the artifact store, or raise 404."""
+    if not MASK_ID.match(mask_id):
+        raise HTTPException(status_code=404, detail="Mask not found")
+    artifact = get_artifact_store().lookup(f"{mask_id}.bsm")
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Mask not found")
+    return artifact
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range` header.
+
+    Args:
+        range_header: Header value, e.g. "bytes=0-1023", "bytes=500-" or "bytes=-200"
+        size: Resource size in bytes
+
+    Returns:
+        Inclusive (start, end), or None if the header should be ignored
+
+    Raises:
+        HTTPException: 416 if the range cannot be satisfied
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header)
+    if not match or match.group(1) == match.group(2) == "":
+        # Multi-range or malformed: serve the full resource
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+@router.get("/{mask_id}")
+async def get_mask(mask_id: str, request: Request):
+    """
+    Download a packed mask (`application/x-bsm`).
+
+    Supports `Range: bytes=...` (single range) for fetching the header,
+    the slice index or a run of slice payloads.
+    """
+    artifact = mask_artifact(mask_id)
+    path = artifact["path"]
+    headers = {"Accept-Ranges": "bytes", **artifact_headers(artifact, request)}
+
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    size = artifact["size"]
+    byte_range = parse_range(request.headers.get("range", ""), size)
+    if byte_range is None:
+        return FileResponse(path, media_type=mask_codec.MEDIA_TYPE, headers=headers)
+
+    start, end = byte_range
+    with open(path, "rb") as f:
+        f.seek(start)
+        content = f.read(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(
+        content=content,
+        status_code=206,
+        media_type=mask_codec.MEDIA_TYPE,
+        headers=headers
+    )
+
+
+@router.get("/{mask_id}/index")
+async def get_mask_index(mask_id: str):
+    """
+    Get the slice index of a packed mask as JSON.
+
+    Each slice lists its byte `offset`/`length` in the mask file and its
+    bounding box `[y0, y1, x0, x1]`; empty slices have length 0.
+    """
+    path = mask_artifact(mask_id)["path"]
+    try:
+        with open(path, "rb") as f:
+            head = f.read(mask_codec.HEADER_SIZE)
+            (_, _, depth), _ = mask_codec.read_shape(head)
+            head += f.read(mask_codec.index_size(depth) - mask_codec.HEADER_SIZE)
+        header = mask_codec.read_header(head)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Corrupt mask file: {e}")
+
+    return {
+        "shape": list(header["shape"]),
+        "affine": header["affine"].tolist(),
+        "media_type": mask_codec.MEDIA_TYPE,
+        "size": path.stat().st_size,
+        "slices": [
+            {
+                "offset": int(entry["offset"]),
+                "length": int(entry["length"]),
+                "bbox": [int(entry["y0"]), int(entry["y1"]), int(entry["x0"]), int(entry["x1"])]
+            }
+            for entry in header["index"]
+        ]
+    }
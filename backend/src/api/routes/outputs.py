@@ -0,0 +1,63 @@
+"""
+Prediction output downloads.
+Serves masks, uncertainty maps and overlays from the artifact store (see
+utils/artifact_store.py) at /outputs/<name>. Re-segmentation replaces a
+result's files under the same names and links them with `?v=<revision>`:
+versioned URLs are cacheable until the artifact expires, while bare URLs
+of results that can still be re-segmented must be revalidated (ETag).
+"""
+from email.utils import formatdate
+from typing import Dict
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from utils.artifact_store import ARTIFACT_NAME, get_artifact_store
+
+router = APIRouter()
+
+# Artifact kinds served here; the rest (e.g. re-segmentation state) is internal
+PUBLIC_KINDS = {"segmentation", "uncertainty", "overlay"}
+
+
+def is_mutable(artifact: Dict) -> bool:
+    """Whether re-segmentation may still replace the artifact's file."""
+    match = ARTIFACT_NAME.match(artifact["path"].name)
+    return match is not None and get_artifact_store().lookup(f"state_{match['id']}.npz", touch=False) is not None
+
+
+def artifact_headers(artifact: Dict, request: Request) -> dict:
+    """
+    ETag, Last-Modified and Cache-Control for a looked-up artifact.
+
+    A `?v=` URL names one revision and is immutable; a bare URL of a result
+    that can be re-segmented is revalidated on every use.
+    """
+    headers = {
+        "ETag": f'"{int(artifact["created"] * 1e6):x}-{artifact["size"]:x}"',
+        "Last-Modified": formatdate(artifact["created"], usegmt=True),
+    }
+    if "v" not in request.query_params and is_mutable(artifact):
+        headers["Cache-Control"] = "private, no-cache"
+        return headers
+    expires_in = get_artifact_store().expires_in(artifact)
+    max_age = 31536000 if expires_in is None else int(expires_in)
+    headers["Cache-Control"] = f"private, max-age={max_age}, immutable"
+    return headers
+
+
+@router.get("/{name}")
+async def get_output(name: str, request: Request):
+    """
+    Download a prediction artifact.
+
+    Answers `If-None-Match` with 304; expired or evicted artifacts are 404.
+    """
+    match = ARTIFACT_NAME.match(name)
+    artifact = get_artifact_store().lookup(name) if match and match["kind"] in PUBLIC_KINDS else None
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Output not found")
+    headers = artifact_headers(artifact, request)
+
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(artifact["path"], media_type=artifact["media_type"], headers=headers)
@@ -3,25 +3,56 @@ Prediction endpoints for 2-channel brain tumor segmentation.
 Matching Kaggle notebook: uses only FLAIR and T1CE modalities.
 """
 import os
+import re
+import json
+import base64
+import asyncio
+import contextlib
+import time
 import tempfile
 import shutil
 import logging
+import threading
+import weakref
 from pathlib import Path
-from typing import List, Dict, Any
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import numpy as np
 import nibabel as nib
 
 from preprocessing.nifti_loader import BraTSPreprocessor
-from models.unet_pytorch import get_segmenter
+from preprocessing.context import allocate_padded, context_view, fill_edges
+from preprocessing.normalization import get_normalizer
+from preprocessing.validation import validate_pair
+from preprocessing.tensor_cache import geometry_from_json, geometry_to_json, get_tensor_cache
+from models.unet_pytorch import BrainTumorSegmenter
+from models.inference_pool import get_predictor
+from models.sliding_window import SlidingWindowInferer
+from models.multiplanar import MultiPlanarInferer
+from postprocessing.resample import ProbabilityResampler
+from postprocessing.writer import MaskWriter
+from postprocessing.uncertainty import UncertaintyMap
+from postprocessing.cleanup import clean_segmentation
+from postprocessing.statistics import class_counts, class_statistics, tumor_volumetrics
 from utils.config import settings
+from utils import mask_codec
+from utils.profiling import get_profiler, profile_stage
+from utils.admission import client_key, estimate_cost, get_admission_controller
+from utils.artifact_store import get_artifact_store
+from utils.deadline import Deadline, DeadlineExceeded, checkpoint, deadline_scope, scale_for_studies
+from utils.helpers import resolve_data_path
+from utils.study_archive import copy_limited, extract_studies, study_name
+from api.routes.admin import is_admin
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+RESULT_ID = re.compile(r"^[0-9a-f]{8,}$")
+
 
 def save_upload_file(upload_file: UploadFile, dest_path: Path) -> None:
     """Save an uploaded file to disk."""
@@ -30,10 +61,212 @@ def save_upload_file(upload_file: UploadFile, dest_path: Path) -> None:
         f.write(content)
 
 
+def finalize_prediction(
+    result: Dict,
+    output_volume: np.ndarray,
+    class_mask: np.ndarray,
+    classes: str = "all",
+    uncertainty_map: Optional[UncertaintyMap] = None,
+    uncertainty_method: Optional[str] = None,
+    run_info: Optional[Dict[str, Any]] = None,
+    result_id: Optional[str] = None,
+    revision: int = 0
+) -> Dict[str, Any]:
+    """
+    Clean up, measure and save a finished segmentation.
+    
+    Args:
+        result: Preprocessing result (geometry, 'volume', 'original_shape')
+        output_volume: Label volume (H, W, D) uint8; cleaned in place
+        class_mask: Labels (D, h, w) matching result['volume'], for the overlay
+        classes: Comma-separated list of classes to include in the stats
+        uncertainty_map: Streamed uncertainty map to save and summarize
+        uncertainty_method: Method that produced the map
+        run_info: Extra response fields (mode, TTA, model)
+        result_id: Id of a stored result to replace (re-segmentation);
+                   a new id is drawn otherwise
+        revision: Revision of the replaced result, added to its URLs
+    
+    Returns:
+        Dictionary with prediction results
+    """
+    checkpoint("postprocess")
+    run_info = run_info or {}
+    result_id = result_id or os.urandom(4).hex()
+    
+    # Re-segmentation patches the labels as predicted, before cleanup
+    keep_state = settings.RESULT_STATE and run_info.get("inference_mode") == "resize"
+    raw_labels = output_volume.copy() if keep_state else None
+    
+    # Remove small islands, enforce ET ⊂ TC ⊂ WT, fill holes (in place)
+    cleanup = None
+    if settings.POSTPROCESS_CLEANUP:
+        with profile_stage("cleanup"):
+            cleanup = clean_segmentation(
+                output_volume,
+                voxel_spacing=result['voxel_spacing'],
+                min_component_mm3=settings.POSTPROCESS_MIN_COMPONENT_MM3,
+                keep_largest=settings.POSTPROCESS_KEEP_LARGEST,
+                fill_holes=settings.POSTPROCESS_FILL_HOLES,
+                time_budget_s=settings.POSTPROCESS_TIME_BUDGET_S
+            )
+    
+    # Get tumor statistics in the original scan space (one counting pass)
+    with profile_stage("statistics"):
+        counts = class_counts(output_volume, settings.NUM_CLASSES)
+        stats = class_statistics(counts, settings.CLASS_LABELS)
+        volumetrics = tumor_volumetrics(
+            output_volume,
+            voxel_spacing=result['voxel_spacing'],
+            counts=counts,
+            class_labels=settings.CLASS_LABELS
+        )
+    
+    # Filter by requested classes
+    if classes != "all":
+        requested = [int(c.strip()) for c in classes.split(",")]
+        stats = {
+            k: v for k, v in stats.items()
+            if any(settings.CLASS_LABELS[i] == k for i in requested)
+        }
+    
+    # Generate output files (nothing is written for abandoned requests).
+    # Files are staged and renamed into place, so replacing a result never
+    # exposes a partial file; revised results get new URLs for caches.
+    checkpoint("write")
+    store = get_artifact_store()
+    version = f"?v={revision}" if revision else ""
+    
+    # Save segmentation mask in the source geometry
+    mask_id = f"segmentation_{result_id}"
+    writer = MaskWriter(settings.MASK_FORMAT, settings.MASK_COMPRESSION_LEVEL)
+    with profile_stage("save_mask"):
+        mask_path = store.publish(writer.write(
+            output_volume,
+            store.staging_path(mask_id),
+            affine=result['affine'],
+            header=result['header']
+        ))
+        # Packed copy for slice-wise fetching by the viewer
+        viewer_mask = None
+        if writer.fmt == "bsm" or settings.MASK_VIEWER_SIDECAR:
+            if writer.fmt != "bsm":
+                store.publish(MaskWriter("bsm").write(
+                    output_volume, store.staging_path(mask_id), affine=result['affine']
+                ))
+            viewer_mask = f"/api/masks/{mask_id}{version}"
+    mask_filename = mask_path.name
+    
+    # Save the uncertainty map (uint8, scl_slope 1/255) and summarize it
+    uncertainty_info = None
+    if uncertainty_map is not None:
+        with profile_stage("save_uncertainty"):
+            uncertainty_filename = f"uncertainty_{result_id}.nii.gz"
+            uncertainty_path = store.staging_path(uncertainty_filename)
+            uncertainty_map.write(
+                uncertainty_path,
+                affine=result['affine'],
+                header=result['header'],
+                compression_level=settings.MASK_COMPRESSION_LEVEL
+            )
+            store.publish(uncertainty_path)
+            uncertainty_info = {
+                "method": uncertainty_method,
+                "map": f"/outputs/{uncertainty_filename}{version}",
+                "summary": uncertainty_map.summary(output_volume)
+            }
+    
+    # Create overlay image (middle slice)
+    middle_slice_idx = settings.VOLUME_SLICES // 2
+    overlay_filename = f"overlay_{result_id}.png"
+    overlay_path = store.staging_path(overlay_filename)
+    
+    # Generate visualization
+    try:
+        from visualization.visualize import create_overlay_image
+        create_overlay_image(
+            result['volume'][middle_slice_idx],
+            class_mask[middle_slice_idx],
+            overlay_path
+        )
+        store.publish(overlay_path)
+    except Exception as viz_e:
+        logger.warning(f"Could not create overlay: {viz_e}")
+        overlay_path.unlink(missing_ok=True)
+        overlay_filename = None
+    
+    payload = {
+        "status": "success",
+        "result_id": result_id,
+        "revision": revision,
+        "segmentation_mask": f"/outputs/{mask_filename}{version}",
+        "mask_format": writer.fmt,
+        "viewer_mask": viewer_mask,
+        "overlay_image": f"/outputs/{overlay_filename}{version}" if overlay_filename else None,
+        "tumor_stats": stats,
+        "volumetrics": volumetrics,
+        "postprocessing": cleanup,
+        "uncertainty": uncertainty_info,
+        "class_distribution": {
+            label: stats.get(label, {"pixel_count": 0, "percentage": 0})
+            for label in settings.CLASS_LABELS.values()
+        },
+        "slice_thickness": result['voxel_spacing'][2],
+        "processed_slices": settings.VOLUME_SLICES,
+        "input_shape": list(result['original_shape']),
+        **run_info
+    }
+    
+    if keep_state:
+        with profile_stage("save_state"):
+            save_result_state(result_id, result, raw_labels, class_mask, classes, run_info, revision)
+    return payload
+
+
+def save_result_state(
+    result_id: str,
+    result: Dict,
+    raw_labels: np.ndarray,
+    class_mask: np.ndarray,
+    classes: str,
+    run_info: Dict[str, Any],
+    revision: int
+) -> None:
+    """
+    Store what re-segmentation of a result needs next to its outputs.
+    
+    Written as two internal artifacts (not served under /outputs):
+    `state_<id>.npz` with the preprocessed input, the labels before cleanup
+    and the model-grid labels, and `result_<id>.json` with the geometry
+    and request options.
+    """
+    store = get_artifact_store()
+    state_path = store.staging_path(f"state_{result_id}.npz")
+    with open(state_path, "wb") as f:
+        np.savez(f, volume=result['volume'], labels=raw_labels, low_res_labels=class_mask)
+    store.publish(state_path)
+    
+    record_path = store.staging_path(f"result_{result_id}.json")
+    with open(record_path, "w") as f:
+        json.dump({
+            "revision": revision,
+            "classes": classes,
+            "run_info": run_info,
+            "batch_size": settings.INFERENCE_BATCH_SIZE,
+            # Slices normalized together (see BrainTumorSegmenter.iter_predict)
+            "normalization_group": settings.INFERENCE_BATCH_SIZE,
+            "geometry": geometry_to_json(result)
+        }, f)
+    store.publish(record_path)
+
+
 def process_prediction(
     flair_path: str,
     t1ce_path: str,
-    classes: str = "all"
+    classes: str = "all",
+    inference_mode: Optional[str] = None,
+    tta: Optional[str] = None,
+    uncertainty: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Process prediction on uploaded files (2-channel: FLAIR + T1CE).
@@ -42,6 +275,10 @@ def process_prediction(
         flair_path: Path to FLAIR NIfTI file
         t1ce_path: Path to T1CE NIfTI file
         classes: Comma-separated list of classes to include
+        inference_mode: "resize", "sliding_window" or "multiplanar" (default: settings.INFERENCE_MODE)
+        tta: Comma-separated TTA transforms or "none" (default: settings.TTA_TRANSFORMS)
+        uncertainty: "entropy", "max_prob", "mc_dropout" or "none"
+                     (default: settings.UNCERTAINTY_MODE; resize mode only)
     
     Returns:
         Dictionary with prediction results
@@ -50,7 +287,7 @@ def process_prediction(
     model_path = settings.get_model_path()
     
     # Get segmenter instance
-    segmenter = get_segmenter(str(model_path))
+    segmenter = get_predictor(str(model_path))
     
     if not segmenter.is_loaded():
         raise HTTPException(
@@ -58,106 +295,479 @@ def process_prediction(
             detail=f"Model not loaded. Please check server configuration. Model path: {model_path}"
         )
     
+    mode = inference_mode or settings.INFERENCE_MODE
+    if mode == "multiplanar" and segmenter.context_slices != 1:
+        raise HTTPException(
+            status_code=422,
+            detail="multiplanar inference needs a 2D model (the loaded model uses slice context)"
+        )
+    
     try:
         # Load and preprocess images (2 channels: FLAIR + T1CE)
         logger.info("Preprocessing 2-channel input (FLAIR + T1CE)...")
         preprocessor = BraTSPreprocessor(
             target_size=settings.TARGET_SIZE,
             volume_slices=settings.VOLUME_SLICES,
-            volume_start_at=settings.VOLUME_START_AT
+            volume_start_at=settings.VOLUME_START_AT,
+            cache=get_tensor_cache(),
+            normalizer=get_normalizer()
         )
         
-        result = preprocessor.preprocess_for_inference(
-            flair_path, t1ce_path
-        )
-        input_data = result['model_input']
-        original_shape = result['original_shape']
-        
-        logger.info(f"Input shape: {input_data.shape}")
+        tta_set = segmenter.parse_tta(tta if tta is not None else settings.TTA_TRANSFORMS)
+        uncertainty_method = uncertainty if uncertainty is not None else settings.UNCERTAINTY_MODE
+        if uncertainty_method in ("", "none"):
+            uncertainty_method = None
+        elif mode != "resize":
+            logger.info(f"Uncertainty output is not available in {mode} mode; skipped")
+            uncertainty_method = None
+        uncertainty_map = None
         
-        # Run prediction
-        logger.info("Running prediction...")
-        prediction = segmenter.predict(input_data)
+        if mode == "sliding_window":
+            with profile_stage("preprocess"):
+                result = preprocessor.preprocess_native(
+                    flair_path, t1ce_path, context_slices=segmenter.context_slices
+                )
+            input_data = result['model_input']
+            original_shape = result['original_shape']
+            
+            logger.info(f"Input shape: {input_data.shape}")
+            
+            # Tile native-resolution slices; the volume is already in [0, 1]
+            logger.info("Running sliding-window prediction...")
+            inferer = SlidingWindowInferer(
+                lambda batch: segmenter.predict_batch(batch, normalize=False, tta=tta_set),
+                patch_size=settings.TARGET_SIZE,
+                overlap=settings.SW_OVERLAP,
+                batch_size=max(1, settings.SW_BATCH_SIZE // (len(tta_set) + 1)),
+                num_classes=settings.NUM_CLASSES,
+                sigma_scale=settings.SW_SIGMA_SCALE,
+                background_threshold=settings.SW_BACKGROUND_THRESHOLD
+            )
+            with profile_stage("inference"):
+                output_volume = inferer.predict_volume(input_data)
+            
+            # (D, H, W) view for the overlay
+            class_mask = np.moveaxis(output_volume, 2, 0)
+        elif mode == "multiplanar":
+            with profile_stage("preprocess"):
+                result = preprocessor.preprocess_native(flair_path, t1ce_path)
+            input_data = result['model_input']
+            original_shape = result['original_shape']
+            
+            logger.info(f"Input shape: {input_data.shape}")
+            
+            # Fuse axial/coronal/sagittal predictions; the volume is already in [0, 1]
+            logger.info("Running multi-planar prediction...")
+            inferer = MultiPlanarInferer(
+                lambda batch: segmenter.predict_batch(batch, normalize=False, tta=tta_set),
+                target_size=settings.TARGET_SIZE,
+                batch_size=max(1, settings.INFERENCE_BATCH_SIZE // (len(tta_set) + 1)),
+                num_classes=settings.NUM_CLASSES,
+                orientations=settings.MULTIPLANAR_ORIENTATIONS
+            )
+            with profile_stage("inference"):
+                output_volume = inferer.predict_volume(input_data)
+            
+            # (D, H, W) view for the overlay
+            class_mask = np.moveaxis(output_volume, 2, 0)
+        else:
+            with profile_stage("preprocess"):
+                result = preprocessor.preprocess_for_inference(
+                    flair_path, t1ce_path, context_slices=segmenter.context_slices
+                )
+            input_data = result['model_input']
+            original_shape = result['original_shape']
+            
+            logger.info(f"Input shape: {input_data.shape}")
+            
+            # Run prediction, resampling each batch's probabilities to the
+            # original grid as it finishes (no full softmax volume is kept)
+            logger.info("Running prediction...")
+            resampler = ProbabilityResampler(
+                original_shape,
+                num_classes=settings.NUM_CLASSES,
+                chunk_size=settings.POSTPROCESS_CHUNK_SLICES,
+                mode=settings.POSTPROCESS_INTERPOLATION
+            )
+            with profile_stage("inference"):
+                if uncertainty_method:
+                    # Uncertainty is resampled and quantized batch by batch too
+                    uncertainty_map = UncertaintyMap(
+                        original_shape, chunk_size=settings.POSTPROCESS_CHUNK_SLICES
+                    )
+                    for start, probabilities, batch_uncertainty in segmenter.iter_predict_uncertainty(
+                        input_data,
+                        uncertainty_method,
+                        batch_size=settings.INFERENCE_BATCH_SIZE,
+                        tta=tta_set,
+                        mc_samples=settings.MC_DROPOUT_SAMPLES
+                    ):
+                        with profile_stage("postprocess"):
+                            resampler.add(start, probabilities)
+                            uncertainty_map.add(start, batch_uncertainty)
+                else:
+                    for start, probabilities in segmenter.iter_predict(
+                        input_data, batch_size=settings.INFERENCE_BATCH_SIZE, tta=tta_set
+                    ):
+                        with profile_stage("postprocess"):
+                            resampler.add(start, probabilities)
+            
+            output_volume = resampler.result()
+            # Model-grid segmentation mask (D, H, W)
+            class_mask = resampler.low_res_labels
         
-        logger.info(f"Prediction shape: {prediction.shape}")
+        return finalize_prediction(
+            result,
+            output_volume,
+            class_mask,
+            classes,
+            uncertainty_map=uncertainty_map,
+            uncertainty_method=uncertainty_method,
+            run_info={
+                "inference_mode": mode,
+                "tta": list(tta_set),
+                "context_slices": segmenter.context_slices,
+                "model_used": str(model_path.name)
+            }
+        )
         
-        # Generate segmentation mask
-        class_mask = segmenter.predict_class_mask(input_data)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.exception("Prediction processing failed")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction failed: {str(e)}"
+        )
+
+
+# Re-segmentations of one result run one at a time (read-modify-write)
+_result_locks = weakref.WeakValueDictionary()
+_result_locks_guard = threading.Lock()
+
+
+def load_result_record(result_id: str) -> Dict[str, Any]:
+    """
+    Read the stored record of a result.
+    
+    Raises:
+        HTTPException: 404 if the result is unknown, expired or was made
+                       without re-segmentation state
+    """
+    store = get_artifact_store()
+    record = store.lookup(f"result_{result_id}.json") if RESULT_ID.match(result_id) else None
+    if record is None or store.lookup(f"state_{result_id}.npz", touch=False) is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    with open(record['path']) as f:
+        return json.load(f)
+
+
+def resegment_result(
+    result_id: str,
+    start_slice: int,
+    end_slice: int,
+    flair_path: Optional[str] = None,
+    t1ce_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Re-run a stored resize-mode result on a range of slices.
+    
+    Optionally replaces the input slices first. Only the normalization
+    groups whose samples see the range (including 2.5D context) are
+    predicted again; since every group is normalized by its own maximum,
+    they are cut exactly as in the original run. Cleanup and statistics are
+    redone on the whole patched volume (components are 3D), then the
+    result's outputs are replaced under the same id with the revision
+    bumped. The range is predicted without uncertainty, so an uncertainty
+    map of the result is deleted and the revision reports none.
+    
+    Replacement slices are normalized with the original volume's intensity
+    ranges, so the other slices' inputs stay as they were.
+    
+    Args:
+        result_id: Id returned by a prediction
+        start_slice: First slice to recompute
+        end_slice: Slice after the last one to recompute
+        flair_path: NIfTI with replacement FLAIR slices (H, W, end - start)
+        t1ce_path: NIfTI with replacement T1CE slices (H, W, end - start)
+    
+    Returns:
+        Prediction result of the new revision, plus 'recomputed_slices'
+    """
+    with _result_locks_guard:
+        lock = _result_locks.setdefault(result_id, threading.Lock())
+    with lock:
+        record = load_result_record(result_id)
+        run_info = record['run_info']
+        geometry = geometry_from_json(record['geometry'])
+        original_shape = geometry['original_shape']
         
-        # Get tumor statistics
-        stats = segmenter.get_tumor_regions(class_mask)
+        with np.load(get_artifact_store().lookup(f"state_{result_id}.npz")['path']) as state:
+            volume = state['volume']
+            labels = state['labels']
+            low_res_labels = state['low_res_labels']
+        num_slices = volume.shape[0]
+        if not 0 <= start_slice < end_slice <= num_slices:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Slice range {start_slice}:{end_slice} is outside the volume (0:{num_slices})"
+            )
         
-        # Filter by requested classes
-        if classes != "all":
-            requested = [int(c.strip()) for c in classes.split(",")]
-            stats = {
-                k: v for k, v in stats.items()
-                if any(settings.CLASS_LABELS[i] == k for i in requested)
-            }
+        model_path = settings.get_model_path()
+        segmenter = get_predictor(str(model_path))
+        if not segmenter.is_loaded():
+            raise HTTPException(status_code=503, detail="Model not loaded. Please check server configuration.")
+        if (model_path.name, segmenter.context_slices) != (run_info['model_used'], run_info['context_slices']):
+            raise HTTPException(
+                status_code=409,
+                detail="The model changed since this result was made; run a full prediction"
+            )
         
-        # Generate output files
-        output_dir = Path(settings.OUTPUT_DIR)
-        output_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            if flair_path is not None:
+                preprocessor = BraTSPreprocessor(target_size=settings.TARGET_SIZE)
+                with profile_stage("preprocess"):
+                    slices = preprocessor.preprocess_slices(
+                        flair_path, t1ce_path, geometry['normalization'], original_shape[:2]
+                    )
+                if slices.shape[0] != end_slice - start_slice:
+                    raise ValueError(
+                        f"Got {slices.shape[0]} replacement slices for range {start_slice}:{end_slice}"
+                    )
+                volume[start_slice:end_slice] = slices
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
         
-        # Create NIfTI segmentation mask
-        mask_filename = f"segmentation_{os.urandom(4).hex()}.nii.gz"
-        mask_path = output_dir / mask_filename
+        # Samples whose context reaches the range, widened to whole
+        # normalization groups (batch_size slices, see iter_predict)
+        tta = tuple(run_info['tta'])
+        context_slices = run_info['context_slices']
+        group = max(1, record.get('normalization_group', record['batch_size']))
+        first = max(0, start_slice - context_slices // 2) // group * group
+        last = min(num_slices, -(-(end_slice + context_slices // 2) // group) * group)
         
-        # Post-process prediction back to original space
-        output_volume = preprocessor.postprocess_prediction(
-            prediction, original_shape
+        padded, center = allocate_padded(
+            num_slices, volume.shape[1], volume.shape[2], volume.shape[3], context_slices
         )
+        center[:] = volume
+        fill_edges(padded, context_slices)
+        model_input = context_view(padded, context_slices)[first:last]
         
-        # Save as NIfTI
-        nii_img = nib.Nifti1Image(output_volume, affine=np.eye(4))
-        nib.save(nii_img, mask_path)
-        
-        # Create overlay image (middle slice)
-        middle_slice_idx = settings.VOLUME_SLICES // 2
-        overlay_filename = f"overlay_{os.urandom(4).hex()}.png"
-        overlay_path = output_dir / overlay_filename
+        logger.info(f"Re-segmenting {result_id} slices {first}:{last}")
+        resampler = ProbabilityResampler(
+            original_shape,
+            num_classes=settings.NUM_CLASSES,
+            chunk_size=settings.POSTPROCESS_CHUNK_SLICES,
+            mode=settings.POSTPROCESS_INTERPOLATION,
+            slice_offset=first
+        )
+        with profile_stage("inference"):
+            for start, probabilities in segmenter.iter_predict(
+                model_input, batch_size=record['batch_size'], tta=tta
+            ):
+                with profile_stage("postprocess"):
+                    resampler.add(start, probabilities)
+        labels[:, :, first:last] = resampler.result()[:, :, first:last]
+        low_res_labels[first:last] = resampler.low_res_labels[:last - first]
         
-        # Generate visualization
-        try:
-            from visualization.visualize import create_overlay_image
-            create_overlay_image(
-                input_data[middle_slice_idx],
-                class_mask[middle_slice_idx],
-                overlay_path
-            )
-        except Exception as viz_e:
-            logger.warning(f"Could not create overlay: {viz_e}")
-            overlay_filename = None
-        
-        return {
-            "status": "success",
-            "segmentation_mask": f"/outputs/{mask_filename}",
-            "overlay_image": f"/outputs/{overlay_filename}" if overlay_filename else None,
-            "tumor_stats": stats,
-            "class_distribution": {
-                label: stats.get(label, {"pixel_count": 0, "percentage": 0})
-                for label in settings.CLASS_LABELS.values()
-            },
-            "slice_thickness": None,
-            "processed_slices": settings.VOLUME_SLICES,
-            "input_shape": list(original_shape),
-            "model_used": str(model_path.name)
-        }
+        # The old map no longer matches the labels
+        get_artifact_store().discard(f"uncertainty_{result_id}.nii.gz")
         
-    except Exception as e:
-        logger.exception("Prediction processing failed")
+        payload = finalize_prediction(
+            {'volume': volume, **geometry},
+            labels,
+            low_res_labels,
+            record['classes'],
+            run_info=run_info,
+            result_id=result_id,
+            revision=record['revision'] + 1
+        )
+        payload["recomputed_slices"] = [first, last]
+        return payload
+
+
+def validate_prediction_options(
+    inference_mode: Optional[str],
+    tta: Optional[str],
+    uncertainty: Optional[str]
+) -> None:
+    """Reject unknown or incompatible prediction options with a 422."""
+    if inference_mode is not None and inference_mode not in settings.INFERENCE_MODES:
         raise HTTPException(
-            status_code=500,
-            detail=f"Prediction failed: {str(e)}"
+            status_code=422,
+            detail=f"Unknown inference_mode '{inference_mode}'. Expected one of {list(settings.INFERENCE_MODES)}"
         )
+    
+    try:
+        BrainTumorSegmenter.parse_tta(tta)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if uncertainty not in (None, "none"):
+        if uncertainty not in BrainTumorSegmenter.UNCERTAINTY_METHODS:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown uncertainty '{uncertainty}'. Expected one of {list(BrainTumorSegmenter.UNCERTAINTY_METHODS)} or none"
+            )
+        if (inference_mode or settings.INFERENCE_MODE) != "resize":
+            raise HTTPException(status_code=422, detail="Uncertainty output needs inference_mode 'resize'")
+
+
+def study_cost(
+    flair_path: str,
+    inference_mode: Optional[str],
+    tta: Optional[str],
+    uncertainty: Optional[str]
+) -> Optional[float]:
+    """
+    Admission cost of a study from its FLAIR header and the request options.
+    
+    Returns:
+        Cost (see utils/admission.py), or None if the header is unreadable
+    """
+    try:
+        voxels = float(np.prod(nib.load(flair_path).shape[:3]))
+    except Exception:
+        return None
+    tta_set = BrainTumorSegmenter.parse_tta(tta if tta is not None else settings.TTA_TRANSFORMS)
+    method = uncertainty if uncertainty is not None else settings.UNCERTAINTY_MODE
+    return estimate_cost(
+        voxels,
+        len(tta_set),
+        inference_mode or settings.INFERENCE_MODE,
+        settings.MC_DROPOUT_SAMPLES if method == "mc_dropout" else 0
+    )
+
+
+async def watch_disconnect(request: Request, deadline: Deadline) -> None:
+    """
+    Cancel a request's deadline when its client goes away.
+    
+    Waits on the server's receive channel (see ServerReceive in main.py):
+    once the body has been read, the next message is the disconnect.
+    """
+    receive = getattr(request.state, "server_receive", None)
+    if receive is None:
+        return
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    deadline.cancel("abandoned by the client")
+
+
+def admission_slot(request: Request, cost: Optional[float]):
+    """
+    Settle a request's exact cost and return its fair-queue slot.
+    
+    The client's bucket was charged an estimate before the body was read
+    (see admission_control in main.py); the exact cost replaces it here.
+    
+    Args:
+        request: Incoming request (identifies the client)
+        cost: Exact cost from study_cost (None = keep the estimate)
+    
+    Returns:
+        Async context manager holding an inference slot (a no-op when
+        admission control is off)
+    """
+    admission = get_admission_controller()
+    if admission is None:
+        return contextlib.nullcontext()
+    client = client_key(request)
+    estimated = getattr(request.state, "admission_cost", 0.0)
+    if cost is None:
+        cost = estimated
+    else:
+        admission.settle(client, estimated, cost)
+        request.state.admission_cost = cost
+    return admission.slot(client, cost)
+
+
+async def run_admitted(request: Request, cost: Optional[float], job):
+    """
+    Run a prediction job in the threadpool behind the fair queue.
+    
+    The job runs under the request's deadline, cancelled early if the
+    client disconnects.
+    
+    Args:
+        request: Incoming request (identifies the client)
+        cost: Exact cost from study_cost (None = keep the estimate)
+        job: Callable running the prediction
+    
+    Returns:
+        The job's result
+    
+    Raises:
+        HTTPException: 504 if the deadline passed or the client went away
+    """
+    deadline = getattr(request.state, "deadline", None) or Deadline()
+    
+    def scoped_job():
+        with deadline_scope(deadline):
+            return job()
+    
+    watcher = asyncio.create_task(watch_disconnect(request, deadline))
+    try:
+        async with admission_slot(request, cost):
+            # The deadline may have passed while queued
+            deadline.check("queue")
+            return await run_in_threadpool(scoped_job)
+    except DeadlineExceeded as e:
+        logger.warning(f"Prediction stopped: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    finally:
+        watcher.cancel()
+
+
+async def run_admitted_stream(request: Request, cost: Optional[float], chunks):
+    """
+    Drive a streaming prediction generator behind the fair queue.
+    
+    The slot is taken when the response starts streaming and held until
+    the generator is exhausted or the client goes away. Each step of the
+    generator runs in the threadpool under the request's deadline (context
+    variables do not carry across steps), so checkpoints in preprocessing
+    and inference apply; generators report DeadlineExceeded themselves.
+    
+    Args:
+        request: Incoming request (identifies the client)
+        cost: Exact cost of the whole job (None = keep the estimate)
+        chunks: Generator yielding the response body
+    
+    Yields:
+        The generator's chunks
+    """
+    deadline = getattr(request.state, "deadline", None) or Deadline()
+    
+    def step():
+        with deadline_scope(deadline):
+            return next(chunks, None)
+    
+    watcher = asyncio.create_task(watch_disconnect(request, deadline))
+    try:
+        async with admission_slot(request, cost):
+            while True:
+                chunk = await run_in_threadpool(step)
+                if chunk is None:
+                    break
+                yield chunk
+    finally:
+        watcher.cancel()
+        # Runs the generator's cleanup when the client left mid-stream
+        chunks.close()
 
 
 @router.post("/")
 async def predict(
+    request: Request,
+    response: Response,
     background_tasks: BackgroundTasks,
     flair: UploadFile = File(..., description="FLAIR modality NIfTI file"),
     t1ce: UploadFile = File(..., description="T1CE modality NIfTI file"),
-    classes: str = Form("all", description="Comma-separated list of classes to include (default: all)")
+    classes: str = Form("all", description="Comma-separated list of classes to include (default: all)"),
+    inference_mode: Optional[str] = Form(None, description="Inference mode: resize, sliding_window or multiplanar (default: server setting)"),
+    tta: Optional[str] = Form(None, description="Test-time augmentation: comma-separated hflip,vflip,hvflip or none (default: server setting)"),
+    uncertainty: Optional[str] = Form(None, description="Uncertainty map: entropy, max_prob, mc_dropout or none (default: server setting)")
 ):
     """
     Run tumor segmentation prediction on uploaded MRI files.
@@ -166,7 +776,16 @@ async def predict(
     - **flair**: FLAIR modality NIfTI file
     - **t1ce**: T1CE (contrast-enhanced) modality NIfTI file
     - **classes**: Comma-separated list of classes to include (0=Non-tumor, 1=Necrotic/Core, 2=Edema, 3=Enhancing)
+    - **inference_mode**: `resize` (128x128 slices), `sliding_window` (native-resolution patches)
+      or `multiplanar` (axial, coronal and sagittal predictions fused)
+    - **tta**: Flip augmentations averaged into the prediction, e.g. `hflip,vflip` (`none` disables)
+    - **uncertainty**: Per-voxel uncertainty map (`entropy`, `max_prob` or `mc_dropout`; resize mode only)
+    
+    Send `X-Profile: 1` (with a valid `X-Admin-Token`) to profile this request;
+    the run id is returned in the `X-Profile-Id` response header.
     """
+    validate_prediction_options(inference_mode, tta, uncertainty)
+    
     temp_dir = Path(tempfile.mkdtemp())
     
     try:
@@ -188,13 +807,34 @@ async def predict(
                 f.write(content)
             logger.info(f"Saved {mod_name} ({len(content)} bytes)")
         
-        # Process prediction
+        # Reject malformed or mismatched pairs from their headers, before
+        # anything is decoded or queued
+        try:
+            validate_pair(flair_path, t1ce_path)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        
+        # Process prediction (optionally profiled) off the event loop, in
+        # fair-queue order
         logger.info("Processing prediction...")
-        result = process_prediction(
-            str(flair_path),
-            str(t1ce_path),
-            classes
+        profiler = get_profiler()
+        profile_requested = (
+            request.headers.get(settings.PROFILING_HEADER, "").lower() in ("1", "true")
+            and is_admin(request.headers.get("x-admin-token"))
         )
+        profiled = profiler.should_profile(profile_requested)
+        
+        def job():
+            args = (str(flair_path), str(t1ce_path), classes, inference_mode, tta, uncertainty)
+            if profiled:
+                with profiler.session("predict") as run_id:
+                    return process_prediction(*args), run_id
+            return process_prediction(*args), None
+        
+        cost = study_cost(str(flair_path), inference_mode, tta, uncertainty)
+        result, run_id = await run_admitted(request, cost, job)
+        if run_id:
+            response.headers["X-Profile-Id"] = run_id
         
         # Schedule cleanup
         background_tasks.add_task(shutil.rmtree, temp_dir, ignore_errors=True)
@@ -214,6 +854,503 @@ async def predict(
         )
 
 
+@router.post("/by-path")
+async def predict_by_path(
+    request: Request,
+    flair_path: str = Form(..., description="FLAIR NIfTI path, relative to the server's ingest root"),
+    t1ce_path: str = Form(..., description="T1CE NIfTI path, relative to the server's ingest root"),
+    classes: str = Form("all", description="Comma-separated list of classes to include (default: all)"),
+    inference_mode: Optional[str] = Form(None, description="Inference mode: resize, sliding_window or multiplanar (default: server setting)"),
+    tta: Optional[str] = Form(None, description="Test-time augmentation: comma-separated hflip,vflip,hvflip or none (default: server setting)"),
+    uncertainty: Optional[str] = Form(None, description="Uncertainty map: entropy, max_prob, mc_dropout or none (default: server setting)")
+):
+    """
+    Run prediction on studies already on the server's storage.
+    
+    **flair_path** and **t1ce_path** name files under the ingest root
+    (`INGEST_ROOT`, default `DATA_PATH`); nothing is uploaded, copied or
+    written to a temp dir. Uncompressed `.nii` files are memory-mapped,
+    `.nii.gz` files are decompressed while reading. Other options are as
+    for `/api/predict/`. Disabled unless `PATH_INGESTION=true`.
+    """
+    if not settings.PATH_INGESTION:
+        raise HTTPException(status_code=404, detail="Path ingestion is disabled")
+    
+    validate_prediction_options(inference_mode, tta, uncertainty)
+    
+    try:
+        paths = [
+            resolve_data_path(path, settings.INGEST_ROOT, settings.MAX_FILE_SIZE)
+            for path in (flair_path, t1ce_path)
+        ]
+        validate_pair(paths[0], paths[1])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    logger.info(f"Predicting from storage: {paths[0].name}, {paths[1].name}")
+    return await run_admitted(
+        request,
+        study_cost(str(paths[0]), inference_mode, tta, uncertainty),
+        lambda: process_prediction(
+            str(paths[0]),
+            str(paths[1]),
+            classes,
+            inference_mode,
+            tta,
+            uncertainty
+        )
+    )
+
+
+@router.post("/results/{result_id}/resegment")
+async def resegment(
+    request: Request,
+    result_id: str,
+    start_slice: int = Form(..., description="First slice (last axis of the input volume) to recompute"),
+    end_slice: Optional[int] = Form(None, description="Slice after the last one to recompute (default: start_slice + replacement slices)"),
+    flair: Optional[UploadFile] = File(None, description="Replacement FLAIR slices, NIfTI (H, W, n)"),
+    t1ce: Optional[UploadFile] = File(None, description="Replacement T1CE slices, NIfTI (H, W, n)")
+):
+    """
+    Re-segment a slice range of an earlier result in place.
+    
+    Send **flair** and **t1ce** holding corrected slices to replace the
+    inputs from **start_slice** on, or only a **start_slice**/**end_slice**
+    range to recompute. Only the affected forward batches (plus 2.5D
+    context) are predicted again; the result's mask, overlay and statistics
+    are replaced under the same `result_id`, and URLs carry the new
+    `revision`. Works for resize-mode results while they are stored;
+    uncertainty maps are not recomputed.
+    """
+    if (flair is None) != (t1ce is None):
+        raise HTTPException(status_code=422, detail="Send both flair and t1ce replacement slices, or neither")
+    if flair is None and end_slice is None:
+        raise HTTPException(status_code=422, detail="Send replacement slices or an end_slice")
+    
+    record = load_result_record(result_id)
+    height, width = record['geometry']['original_shape'][:2]
+    
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        paths = [None, None]
+        if flair is not None:
+            for index, upload in enumerate((flair, t1ce)):
+                suffix = ".nii.gz" if (upload.filename or "").lower().endswith(".gz") else ".nii"
+                paths[index] = str(temp_dir / f"slices_{index}{suffix}")
+                copy_limited(upload.file, Path(paths[index]), settings.MAX_FILE_SIZE)
+            if end_slice is None:
+                try:
+                    end_slice = start_slice + (nib.load(paths[0]).shape[2:3] or (1,))[0]
+                except Exception as e:
+                    raise HTTPException(status_code=422, detail=f"Unreadable replacement slices: {e}")
+        
+        run_info = record['run_info']
+        cost = estimate_cost(
+            height * width * max(0, end_slice - start_slice + run_info['context_slices'] - 1),
+            len(run_info['tta']),
+            "resize"
+        )
+        return await run_admitted(
+            request,
+            cost,
+            lambda: resegment_result(result_id, start_slice, end_slice, paths[0], paths[1])
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def iter_bulk_results(
+    studies: List[tuple],
+    temp_dir: Path,
+    classes: str = "all",
+    tta: tuple = ()
+):
+    """
+    Segment studies through shared forward batches and yield NDJSON lines.
+    
+    Studies are preprocessed one ahead of the model and their slices are
+    packed into common batches (see BrainTumorSegmenter.iter_predict_many);
+    each study's line is emitted as soon as its last slices are done. A
+    final summary line closes the stream. The temp dir is removed at the end.
+    
+    Driven by run_admitted_stream: once the request's deadline passes, the
+    stream ends with a "cancelled" line.
+    
+    Args:
+        studies: [(study, flair_path, t1ce_path)]
+        temp_dir: Directory holding the uploaded volumes
+        classes: Comma-separated list of classes to include
+        tta: Augmentation names from parse_tta
+    
+    Yields:
+        One JSON document per line
+    """
+    model_path = settings.get_model_path()
+    segmenter = get_predictor(str(model_path))
+    preprocessor = BraTSPreprocessor(
+        target_size=settings.TARGET_SIZE,
+        volume_slices=settings.VOLUME_SLICES,
+        volume_start_at=settings.VOLUME_START_AT,
+        cache=get_tensor_cache(),
+        normalizer=get_normalizer()
+    )
+    run_info = {
+        "inference_mode": "resize",
+        "tta": list(tta),
+        "context_slices": segmenter.context_slices,
+        "model_used": str(model_path.name)
+    }
+    started = time.perf_counter()
+    totals = {"succeeded": 0, "failed": 0}
+    # index -> (study, preprocessing result, resampler) while in flight
+    in_flight: Dict[int, tuple] = {}
+    failed_lines: List[str] = []
+    
+    def line(payload: Dict) -> str:
+        return json.dumps(payload, default=str) + "\n"
+    
+    def failure(index: int, study: str, error: Exception) -> str:
+        logger.warning(f"Bulk study {study} failed: {error}")
+        totals["failed"] += 1
+        return line({"study": study, "index": index, "status": "error", "detail": str(error)})
+    
+    def prepared():
+        for index, (study, flair_path, t1ce_path) in enumerate(studies):
+            try:
+                validate_pair(flair_path, t1ce_path)
+                with profile_stage("preprocess"):
+                    result = preprocessor.preprocess_for_inference(
+                        str(flair_path), str(t1ce_path), context_slices=segmenter.context_slices
+                    )
+            except Exception as e:
+                failed_lines.append(failure(index, study, e))
+                continue
+            resampler = ProbabilityResampler(
+                result['original_shape'],
+                num_classes=settings.NUM_CLASSES,
+                chunk_size=settings.POSTPROCESS_CHUNK_SLICES,
+                mode=settings.POSTPROCESS_INTERPOLATION
+            )
+            in_flight[index] = (study, result, resampler)
+            yield index, result['model_input']
+    
+    try:
+        # The deadline may have passed while queued
+        checkpoint("queue")
+        for index, start, probabilities, done in segmenter.iter_predict_many(
+            prepared(), batch_size=settings.INFERENCE_BATCH_SIZE, tta=tta
+        ):
+            while failed_lines:
+                yield failed_lines.pop(0)
+            checkpoint("inference")
+            study, result, resampler = in_flight[index]
+            resampler.add(start, probabilities)
+            if not done:
+                continue
+            del in_flight[index]
+            try:
+                payload = finalize_prediction(
+                    result, resampler.result(), resampler.low_res_labels, classes, run_info=run_info
+                )
+            except Exception as e:
+                yield failure(index, study, e)
+                continue
+            totals["succeeded"] += 1
+            yield line({"study": study, "index": index, **payload})
+        while failed_lines:
+            yield failed_lines.pop(0)
+        yield line({
+            "status": "complete",
+            "studies": len(studies),
+            **totals,
+            "elapsed_s": round(time.perf_counter() - started, 3)
+        })
+    except DeadlineExceeded as e:
+        logger.warning(f"Bulk prediction stopped: {e}")
+        yield line({"status": "cancelled", "detail": str(e), **totals})
+    except Exception as e:
+        logger.exception("Bulk prediction failed")
+        yield line({"status": "error", "detail": f"Bulk prediction failed: {e}", **totals})
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@router.post("/bulk")
+async def predict_bulk(
+    request: Request,
+    flair: Optional[List[UploadFile]] = File(None, description="FLAIR volumes, paired with t1ce by order"),
+    t1ce: Optional[List[UploadFile]] = File(None, description="T1CE volumes, paired with flair by order"),
+    archive: Optional[UploadFile] = File(None, description="tar/tar.gz/zip of *_flair.nii[.gz] / *_t1ce.nii[.gz] pairs"),
+    classes: str = Form("all", description="Comma-separated list of classes to include (default: all)"),
+    tta: Optional[str] = Form(None, description="Test-time augmentation: comma-separated hflip,vflip,hvflip or none (default: server setting)")
+):
+    """
+    Segment several studies in one request (resize mode).
+    
+    Send either repeated **flair**/**t1ce** parts (paired by order) or one
+    **archive** whose members are named `<study>_flair.nii[.gz]` and
+    `<study>_t1ce.nii[.gz]`. Slices of all studies share forward batches.
+    
+    The response is NDJSON (`application/x-ndjson`): one line per study as
+    soon as it is done (the `/api/predict/` result plus `study` and `index`,
+    or `status: error`), then a `status: complete` summary line.
+    """
+    try:
+        tta_set = BrainTumorSegmenter.parse_tta(tta if tta is not None else settings.TTA_TRANSFORMS)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if archive is None and not flair:
+        raise HTTPException(status_code=422, detail="Send flair/t1ce file pairs or an archive")
+    if archive is not None and flair:
+        raise HTTPException(status_code=422, detail="Send either flair/t1ce file pairs or an archive, not both")
+    if archive is None and len(flair) != len(t1ce or []):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Got {len(flair)} FLAIR and {len(t1ce or [])} T1CE files; they are paired by order"
+        )
+    if flair and len(flair) > settings.BULK_MAX_STUDIES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_MAX_STUDIES} studies per request")
+    
+    segmenter = get_predictor(str(settings.get_model_path()))
+    if not segmenter.is_loaded():
+        raise HTTPException(status_code=503, detail="Model not loaded. Please check server configuration.")
+    
+    # Volumes are streamed to disk, never held in memory whole
+    temp_dir = Path(tempfile.mkdtemp())
+    
+    def save_uploads():
+        if archive is not None:
+            archive_path = temp_dir / "studies.archive"
+            copy_limited(
+                archive.file,
+                archive_path,
+                settings.MAX_FILE_SIZE * 2 * settings.BULK_MAX_STUDIES
+            )
+            studies, incomplete = extract_studies(
+                archive_path, temp_dir, settings.MAX_FILE_SIZE, settings.BULK_MAX_STUDIES
+            )
+            archive_path.unlink()
+            if incomplete:
+                logger.warning(f"Skipping incomplete studies in archive: {incomplete}")
+            if not studies:
+                raise ValueError("No complete FLAIR/T1CE pairs found in the archive")
+        else:
+            studies = []
+            for index, (flair_file, t1ce_file) in enumerate(zip(flair, t1ce)):
+                paths = []
+                for upload, modality in ((flair_file, "flair"), (t1ce_file, "t1ce")):
+                    suffix = ".nii.gz" if (upload.filename or "").lower().endswith(".gz") else ".nii"
+                    path = temp_dir / f"{index:04d}_{modality}{suffix}"
+                    copy_limited(upload.file, path, settings.MAX_FILE_SIZE)
+                    paths.append(path)
+                studies.append((study_name(flair_file.filename, index), paths[0], paths[1]))
+        # Unreadable studies fail in the stream and cost nothing
+        costs = [study_cost(str(flair_path), "resize", tta, "none") for _, flair_path, _ in studies]
+        known = [cost for cost in costs if cost is not None]
+        return studies, sum(known) if known else None
+    
+    try:
+        studies, cost = await run_in_threadpool(save_uploads)
+    except ValueError as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    
+    logger.info(f"Bulk prediction: {len(studies)} studies")
+    scale_for_studies(getattr(request.state, "deadline", None), len(studies))
+    return StreamingResponse(
+        run_admitted_stream(request, cost, iter_bulk_results(studies, temp_dir, classes, tta_set)),
+        media_type="application/x-ndjson"
+    )
+
+
+def sse_event(event: str, payload: Dict) -> str:
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+def iter_prediction_events(
+    flair_path: str,
+    t1ce_path: str,
+    temp_dir: Path,
+    classes: str = "all",
+    tta: tuple = (),
+    mask_slices: bool = False
+):
+    """
+    Segment one study (resize mode) and yield Server-Sent Events.
+    
+    Driven by run_admitted_stream, which runs each step under the request's
+    deadline; checkpoints between batches end the stream early.
+    
+    Events:
+        start:  {"slices", "input_shape", "slices_per_batch"} once preprocessed
+        batch:  per finished forward batch, {"start", "stop", "class_counts"}
+                with one [count per class] row per slice on the original
+                grid (before cleanup), plus "mask_slices" if requested: per
+                slice null (empty) or {"bbox": [y0, y1, x0, x1], "data":
+                base64 run-length payload} in the BSM1 slice format
+        result: the /api/predict/ response
+        error / cancelled: {"detail"}; ends the stream
+    
+    Args:
+        flair_path: Path to FLAIR NIfTI file
+        t1ce_path: Path to T1CE NIfTI file
+        temp_dir: Directory holding the uploads, removed at the end
+        classes: Comma-separated list of classes to include
+        tta: Augmentation names from parse_tta
+        mask_slices: Include the encoded label slices in batch events
+    
+    Yields:
+        SSE messages
+    """
+    try:
+        # The deadline may have passed while queued
+        checkpoint("queue")
+        model_path = settings.get_model_path()
+        segmenter = get_predictor(str(model_path))
+        preprocessor = BraTSPreprocessor(
+            target_size=settings.TARGET_SIZE,
+            volume_slices=settings.VOLUME_SLICES,
+            volume_start_at=settings.VOLUME_START_AT,
+            cache=get_tensor_cache(),
+            normalizer=get_normalizer()
+        )
+        with profile_stage("preprocess"):
+            result = preprocessor.preprocess_for_inference(
+                flair_path, t1ce_path, context_slices=segmenter.context_slices
+            )
+        input_data = result['model_input']
+        original_shape = result['original_shape']
+        slices_per_pass = max(1, settings.INFERENCE_BATCH_SIZE // (len(tta) + 1))
+        yield sse_event("start", {
+            "slices": input_data.shape[0],
+            "input_shape": list(original_shape),
+            "slices_per_batch": slices_per_pass
+        })
+        
+        resampler = ProbabilityResampler(
+            original_shape,
+            num_classes=settings.NUM_CLASSES,
+            chunk_size=settings.POSTPROCESS_CHUNK_SLICES,
+            mode=settings.POSTPROCESS_INTERPOLATION
+        )
+        for start, probabilities in segmenter.iter_predict(
+            input_data, batch_size=settings.INFERENCE_BATCH_SIZE, tta=tta
+        ):
+            checkpoint("inference")
+            with profile_stage("postprocess"):
+                resampler.add(start, probabilities)
+            stop = min(start + probabilities.shape[0], original_shape[2])
+            labels = resampler.output[:, :, start:stop]
+            event = {
+                "start": start,
+                "stop": stop,
+                "class_counts": [
+                    np.bincount(labels[:, :, k].ravel(), minlength=settings.NUM_CLASSES).tolist()
+                    for k in range(stop - start)
+                ]
+            }
+            if mask_slices:
+                encoded = [mask_codec.encode_slice(labels[:, :, k]) for k in range(stop - start)]
+                event["mask_slices"] = [
+                    None if item is None else {
+                        "bbox": list(item[0]),
+                        "data": base64.b64encode(item[1]).decode()
+                    }
+                    for item in encoded
+                ]
+            yield sse_event("batch", event)
+        
+        checkpoint("postprocess")
+        payload = finalize_prediction(
+            result,
+            resampler.result(),
+            resampler.low_res_labels,
+            classes,
+            run_info={
+                "inference_mode": "resize",
+                "tta": list(tta),
+                "context_slices": segmenter.context_slices,
+                "model_used": str(model_path.name)
+            }
+        )
+        yield sse_event("result", payload)
+    except DeadlineExceeded as e:
+        logger.warning(f"Streamed prediction stopped: {e}")
+        yield sse_event("cancelled", {"detail": str(e)})
+    except Exception as e:
+        logger.exception("Streamed prediction failed")
+        yield sse_event("error", {"detail": f"Prediction failed: {e}"})
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@router.post("/stream")
+async def predict_stream(
+    request: Request,
+    flair: UploadFile = File(..., description="FLAIR modality NIfTI file"),
+    t1ce: UploadFile = File(..., description="T1CE modality NIfTI file"),
+    classes: str = Form("all", description="Comma-separated list of classes to include (default: all)"),
+    tta: Optional[str] = Form(None, description="Test-time augmentation: comma-separated hflip,vflip,hvflip or none (default: server setting)"),
+    mask_slices: bool = Form(False, description="Include run-length encoded label slices in batch events")
+):
+    """
+    Run prediction (resize mode) and stream progress as Server-Sent Events.
+    
+    The response is `text/event-stream`: a `start` event, one `batch`
+    event per forward batch with per-slice class counts (and optionally
+    the label slices, encoded as in `/api/masks/`) as soon as it is done,
+    then a `result` event with the `/api/predict/` response. Counts and
+    slices are before cleanup; the `result` statistics are final. Failures
+    end the stream with an `error` or `cancelled` event.
+    """
+    try:
+        tta_set = BrainTumorSegmenter.parse_tta(tta if tta is not None else settings.TTA_TRANSFORMS)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    segmenter = get_predictor(str(settings.get_model_path()))
+    if not segmenter.is_loaded():
+        raise HTTPException(status_code=503, detail="Model not loaded. Please check server configuration.")
+    
+    temp_dir = Path(tempfile.mkdtemp())
+    
+    def save_uploads():
+        paths = []
+        for upload, modality in ((flair, "flair"), (t1ce, "t1ce")):
+            suffix = ".nii.gz" if (upload.filename or "").lower().endswith(".gz") else ".nii"
+            path = temp_dir / f"{modality}{suffix}"
+            copy_limited(upload.file, path, settings.MAX_FILE_SIZE)
+            paths.append(str(path))
+        validate_pair(paths[0], paths[1])
+        return paths
+    
+    try:
+        paths = await run_in_threadpool(save_uploads)
+    except ValueError as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    
+    cost = study_cost(paths[0], "resize", tta, "none")
+    return StreamingResponse(
+        run_admitted_stream(
+            request, cost, iter_prediction_events(paths[0], paths[1], temp_dir, classes, tta_set, mask_slices)
+        ),
+        media_type="text/event-stream",
+        # Proxies (nginx) must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/classes")
 async def get_classes():
     """Get available tumor classes."""
@@ -237,14 +1374,18 @@ async def get_modalities():
 async def get_model_info():
     """Get information about the loaded model."""
     model_path = settings.get_model_path()
-    segmenter = get_segmenter()
+    segmenter = get_predictor()
     
     return {
         "model_path": str(model_path),
         "model_exists": model_path.exists(),
         "model_loaded": segmenter.is_loaded(),
         "device": segmenter.device if segmenter.is_loaded() else None,
+        "optimized": segmenter.is_optimized(),
+        "precision": segmenter.precision,
+        "inference_workers": settings.INFERENCE_WORKERS,
         "input_channels": settings.NUM_CHANNELS,
+        "context_slices": segmenter.context_slices,
         "output_classes": settings.NUM_CLASSES,
         "target_size": settings.TARGET_SIZE,
         "volume_slices": settings.VOLUME_SLICES
@@ -5,6 +5,7 @@ Main application entry point.
 PyTorch-based with 4-channel input support.
 """
 import os
+import re
 import sys
 from contextlib import asynccontextmanager
 
@@ -24,9 +25,13 @@ except ImportError as e:
 
 # Import routes and config
 try:
-    from api.routes import prediction, data_analysis, health
+    from api.routes import prediction, data_analysis, health, admin, masks, outputs
     from utils.config import settings
     from models.unet_pytorch import get_segmenter
+    from models.inference_pool import start_inference_pool, stop_inference_pool
+    from utils.admission import client_key, get_admission_controller
+    from utils.deadline import deadline_from_header
+    from utils.artifact_store import Evictor, get_artifact_store
 except ImportError as e:
     print(f"ERROR: Failed to import routes: {e}")
     sys.exit(1)
@@ -49,9 +54,24 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
     os.makedirs(settings.STATIC_DIR, exist_ok=True)
     
+    # Expire and evict prediction outputs in the background
+    evictor = Evictor(get_artifact_store(), settings.OUTPUT_EVICT_INTERVAL_S)
+    evictor.start()
+    
     # Try to load model on startup
     model_path = settings.get_model_path()
-    if model_path.exists():
+    if settings.INFERENCE_WORKERS > 0 and model_path.exists():
+        # Thin front end: the model lives in the worker processes only
+        print(f"📥 Starting {settings.INFERENCE_WORKERS} inference workers for {model_path}...")
+        try:
+            pool = start_inference_pool(
+                str(model_path), settings.INFERENCE_WORKERS, settings.INFERENCE_WORKER_THREADS
+            )
+            print(f"✅ Inference workers ready ({pool.threads} threads each)")
+        except RuntimeError as e:
+            print(f"⚠️  Inference workers failed to start: {e}")
+            print(f"   Predictions will fail until a valid model is provided.")
+    elif model_path.exists():
         print(f"📥 Loading model from {model_path}...")
         segmenter = get_segmenter(str(model_path))
         if segmenter.is_loaded():
@@ -66,6 +86,8 @@ async def lifespan(app: FastAPI):
     
     yield
     
+    evictor.stop()
+    stop_inference_pool()
     print("=" * 60)
     print("🛑 Brain Tumor Segmentation API Shutting down...")
     print("=" * 60)
@@ -120,30 +142,112 @@ async def global_exception_handler(request: Request, exc):
     return response
 
 
+# Routes behind admission control and deadlines (see utils/admission.py,
+# utils/deadline.py)
+PREDICTION_PATHS = {"/api/predict", "/api/predict/by-path", "/api/predict/bulk", "/api/predict/stream"}
+RESEGMENT_PATH = re.compile(r"^/api/predict/results/[^/]+/resegment$")
+# Responses of prediction requests refused before inference (too large,
+# invalid, model or queue unavailable) whose admission charge is refunded
+REFUNDED_STATUSES = {413, 422, 503}
+
+
+def is_prediction(request) -> bool:
+    """Whether a request runs inference."""
+    path = request.url.path.rstrip("/")
+    return request.method == "POST" and (path in PREDICTION_PATHS or bool(RESEGMENT_PATH.match(path)))
+
+
+@app.middleware("http")
+async def request_deadline(request, call_next):
+    """Start the deadline of a prediction request when it arrives."""
+    if is_prediction(request):
+        try:
+            request.state.deadline = deadline_from_header(
+                request.headers.get(settings.REQUEST_TIMEOUT_HEADER)
+            )
+        except ValueError as e:
+            response = JSONResponse(status_code=400, content={"detail": str(e)})
+            response.headers["Access-Control-Allow-Origin"] = "*"
+            return response
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def admission_control(request, call_next):
+    """Shed prediction requests over their client's budget before the body is read."""
+    admission = get_admission_controller()
+    if admission is not None and is_prediction(request):
+        cost = admission.estimate_upload_cost(int(request.headers.get("content-length") or 0))
+        rejection = admission.admit(client_key(request), cost)
+        if rejection is not None:
+            status_code, detail, retry_after = rejection
+            response = JSONResponse(status_code=status_code, content={"detail": detail})
+            response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+            response.headers["Access-Control-Allow-Origin"] = "*"
+            return response
+        # Settled against the exact cost once the volumes are read
+        request.state.admission_cost = cost
+        response = await call_next(request)
+        if response.status_code in REFUNDED_STATUSES:
+            # Rejected before any inference ran: give the charge back
+            admission.settle(client_key(request), request.state.admission_cost, 0.0)
+        return response
+    return await call_next(request)
+
+
 @app.middleware("http")
 async def limit_upload_size(request, call_next):
     """Limit upload size."""
     if request.method == "POST":
         content_length = request.headers.get("content-length")
-        if content_length and int(content_length) > settings.MAX_FILE_SIZE:
+        # Bulk requests carry two volumes per study
+        limit = settings.MAX_FILE_SIZE
+        if request.url.path.rstrip("/") == "/api/predict/bulk":
+            limit *= 2 * settings.BULK_MAX_STUDIES
+        if content_length and int(content_length) > limit:
             response = JSONResponse(
                 status_code=413,
-                content={"detail": f"File too large. Maximum size is {settings.MAX_FILE_SIZE / (1024*1024):.0f}MB"}
+                content={"detail": f"File too large. Maximum size is {limit / (1024*1024):.0f}MB"}
             )
             response.headers["Access-Control-Allow-Origin"] = "*"
             return response
     return await call_next(request)
 
 
+class ServerReceive:
+    """
+    Expose the server's receive channel as request.state.server_receive.
+    
+    Added last (outermost): the function middlewares above wrap receive in
+    a way that hides client disconnects from routes, and prediction routes
+    watch this channel to cancel abandoned work (see utils/deadline.py).
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["server_receive"] = receive
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(ServerReceive)
+
+
 # Include routers
 print("[APP] Registering routes...")
 app.include_router(health.router, prefix="/api/health", tags=["Health"])
 app.include_router(prediction.router, prefix="/api/predict", tags=["Prediction"])
 app.include_router(data_analysis.router, prefix="/api/data", tags=["Data Analysis"])
+app.include_router(masks.router, prefix="/api/masks", tags=["Masks"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(outputs.router, prefix="/outputs", tags=["Outputs"])
 
-# Static files
+# Static files (directories must exist before mounting; with gunicorn
+# preload_app this runs before the lifespan handler)
+os.makedirs(settings.STATIC_DIR, exist_ok=True)
 app.mount("/static", StaticFiles(directory=settings.STATIC_DIR), name="static")
-app.mount("/outputs", StaticFiles(directory=settings.OUTPUT_DIR), name="outputs")
 
 
 @app.get("/")
@@ -158,7 +262,12 @@ async def root():
         "endpoints": {
             "health": "/api/health",
             "predict": "/api/predict",
-            "data": "/api/data"
+            "predict_bulk": "/api/predict/bulk",
+            "predict_stream": "/api/predict/stream",
+            "predict_by_path": "/api/predict/by-path",
+            "data": "/api/data",
+            "masks": "/api/masks",
+            "admin": "/api/admin"
         }
     }
 
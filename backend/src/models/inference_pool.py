@@ -0,0 +1,534 @@
+"""
+Inference Worker Pool
+=====================
+Runs the UNet forward passes in local worker processes, so the API process
+only handles HTTP, file I/O and preprocessing.
+
+- Every worker loads the model and serves one connection on its own Unix
+  socket; it exits when that connection closes.
+- Messages are length-prefixed JSON. Arrays never go through the socket
+  (no pickling): the API process writes each batch into a shared-memory
+  input segment owned by the worker's slot, and the worker writes its
+  outputs into the slot's shared-memory output segment.
+- Each batch goes to the worker with the fewest queued batches.
+- A worker that dies is restarted (by the request that hit the crash, or by
+  the supervisor thread) and the batch is retried once; the API keeps
+  serving meanwhile.
+
+The pool exposes the segmenter's batch interface (predict_batch,
+iter_predict, ...), so routes use it through get_predictor().
+
+Worker process (started by the pool):
+    python -m models.inference_pool --socket PATH --model PATH --threads N
+"""
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+import threading
+import subprocess
+import numpy as np
+import logging
+from multiprocessing import shared_memory, resource_tracker
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.config import settings
+from models.unet_pytorch import BrainTumorSegmenter, get_segmenter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+# Message framing: 4-byte big-endian length, then UTF-8 JSON
+HEADER = struct.Struct("!I")
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process died or closed its socket during a request."""
+
+
+def send_message(sock: socket.socket, payload: Dict) -> None:
+    """Send one framed JSON message."""
+    data = json.dumps(payload).encode()
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Read exactly `size` bytes; None if the peer closed the socket."""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_message(sock: socket.socket) -> Optional[Dict]:
+    """Receive one framed JSON message; None if the peer closed the socket."""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    body = _recv_exact(sock, HEADER.unpack(header)[0])
+    return None if body is None else json.loads(body)
+
+
+# =============================================================================
+# Worker process
+# =============================================================================
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map a segment created by the API process."""
+    segment = shared_memory.SharedMemory(name=name)
+    # The API process owns (and unlinks) the segment; keep this process's
+    # resource tracker from unlinking it when the worker exits
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+    return segment
+
+
+def _handle(segmenter: BrainTumorSegmenter, request: Dict, segments: Dict) -> Dict:
+    """Run one request against the segments it names."""
+    if request["op"] == "hello":
+        return {
+            "pid": os.getpid(),
+            "context_slices": segmenter.context_slices,
+            "device": str(segmenter.device),
+            "precision": segmenter.precision,
+            "optimized": segmenter.is_optimized()
+        }
+
+    # Segments are replaced when the API process grows them: drop old mappings
+    names = (request["input"]["name"], request["output"])
+    for name in [n for n in segments if n not in names]:
+        segments.pop(name).close()
+    for name in names:
+        if name not in segments:
+            segments[name] = _attach(name)
+
+    batch = np.ndarray(request["input"]["shape"], dtype=np.float32, buffer=segments[names[0]].buf)
+    tta = tuple(request["tta"])
+    if request.get("method"):
+        arrays = segmenter.predict_batch_uncertainty(
+            batch, request["method"], normalize=request["normalize"], tta=tta,
+            mc_samples=request["mc_samples"]
+        )
+    else:
+        arrays = (segmenter.predict_batch(batch, normalize=request["normalize"], tta=tta),)
+    del batch
+
+    output = segments[names[1]]
+    outputs, offset = [], 0
+    for array in arrays:
+        if offset + array.size * 4 > output.size:
+            raise ValueError(f"Output segment too small ({output.size} bytes)")
+        np.ndarray(array.shape, dtype=np.float32, buffer=output.buf, offset=offset)[...] = array
+        outputs.append({"shape": list(array.shape), "offset": offset})
+        offset += array.size * 4
+    return {"outputs": outputs}
+
+
+def serve(socket_path: str, model_path: str, threads: int = 1) -> None:
+    """
+    Worker main loop: load the model, then answer one connection.
+
+    Args:
+        socket_path: Unix socket to listen on (bound once the model is loaded)
+        model_path: Model checkpoint
+        threads: Torch intra-op threads
+    """
+    import torch
+    torch.set_num_threads(max(1, threads))
+
+    segmenter = get_segmenter(model_path)
+    if not segmenter.is_loaded():
+        logger.error(f"Inference worker could not load {model_path}")
+        sys.exit(1)
+
+    parent = os.getppid()
+    path = Path(socket_path)
+    path.unlink(missing_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen(1)
+    server.settimeout(1.0)
+    logger.info(f"Inference worker {os.getpid()} listening on {path}")
+
+    # Give up if the API process goes away before connecting
+    while True:
+        try:
+            connection, _ = server.accept()
+            break
+        except socket.timeout:
+            if os.getppid() != parent:
+                sys.exit(0)
+    connection.settimeout(None)
+    server.close()
+    path.unlink(missing_ok=True)
+
+    segments: Dict[str, shared_memory.SharedMemory] = {}
+    with connection:
+        while True:
+            request = recv_message(connection)
+            if request is None:
+                break
+            try:
+                reply = _handle(segmenter, request, segments)
+            except Exception as e:
+                logger.exception("Inference worker request failed")
+                reply = {"error": str(e)}
+            send_message(connection, reply)
+
+    for segment in segments.values():
+        segment.close()
+    logger.info(f"Inference worker {os.getpid()} exiting")
+
+
+# =============================================================================
+# API side
+# =============================================================================
+
+class SharedBuffer:
+    """Shared-memory segment owned by the API process, grown on demand."""
+
+    def __init__(self):
+        self.segment: Optional[shared_memory.SharedMemory] = None
+
+    def reserve(self, nbytes: int) -> shared_memory.SharedMemory:
+        """Get a segment of at least nbytes (replaced if too small)."""
+        if self.segment is None or self.segment.size < nbytes:
+            self.release()
+            self.segment = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+        return self.segment
+
+    def release(self) -> None:
+        """Unmap and unlink the segment."""
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+
+class _Worker:
+    """One worker slot: process, connection and its shared buffers."""
+
+    def __init__(self, index: int, socket_path: Path):
+        self.index = index
+        self.socket_path = socket_path
+        self.process: Optional[subprocess.Popen] = None
+        self.connection: Optional[socket.socket] = None
+        self.ready = False
+        self.info: Dict = {}
+        # Batches queued or running on this worker (routing key)
+        self.pending = 0
+        self.restarts = 0
+        # One request at a time per connection and buffer pair
+        self.lock = threading.Lock()
+        self.input = SharedBuffer()
+        self.output = SharedBuffer()
+
+
+class InferencePool:
+    """Local inference worker processes behind the segmenter's batch interface."""
+
+    # Seconds between supervisor liveness checks
+    CHECK_INTERVAL_S = 1.0
+
+    UNCERTAINTY_METHODS = BrainTumorSegmenter.UNCERTAINTY_METHODS
+    parse_tta = BrainTumorSegmenter.parse_tta
+    # Batch iteration only needs predict_batch / predict_batch_uncertainty
+    iter_predict = BrainTumorSegmenter.iter_predict
+    iter_predict_many = BrainTumorSegmenter.iter_predict_many
+    iter_predict_uncertainty = BrainTumorSegmenter.iter_predict_uncertainty
+
+    def __init__(
+        self,
+        model_path: str,
+        num_workers: int = 2,
+        threads: int = 0,
+        socket_dir: Optional[Path] = None,
+        start_timeout_s: float = 120.0
+    ):
+        """
+        Start the workers and wait until they have loaded the model.
+
+        Args:
+            model_path: Model checkpoint
+            num_workers: Worker processes
+            threads: Torch threads per worker (0 = CPU count / num_workers)
+            socket_dir: Directory for the Unix sockets
+            start_timeout_s: Time allowed for a worker to load the model
+        """
+        self.model_path = str(model_path)
+        self.threads = threads or max(1, (os.cpu_count() or 1) // num_workers)
+        self.start_timeout_s = start_timeout_s
+        self.socket_dir = Path(socket_dir or settings.INFERENCE_SOCKET_DIR)
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.workers = [
+            _Worker(i, self.socket_dir / f"worker-{os.getpid()}-{i}.sock")
+            for i in range(num_workers)
+        ]
+        try:
+            for worker in self.workers:
+                self._spawn(worker)
+            for worker in self.workers:
+                self._connect(worker)
+        except Exception:
+            self.close()
+            raise
+
+        info = self.workers[0].info
+        self.context_slices = info["context_slices"]
+        self.device = info["device"]
+        self.precision = info["precision"]
+        self._optimized = info["optimized"]
+
+        self._supervisor = threading.Thread(target=self._supervise, name="inference-supervisor", daemon=True)
+        self._supervisor.start()
+        logger.info(f"Inference pool ready: {num_workers} workers x {self.threads} threads")
+
+    def is_loaded(self) -> bool:
+        """Check if any worker is serving."""
+        return any(worker.ready for worker in self.workers)
+
+    def is_optimized(self) -> bool:
+        """Check if the workers run the optimized graph."""
+        return self._optimized
+
+    def _spawn(self, worker: _Worker) -> None:
+        """Start a worker process."""
+        worker.socket_path.unlink(missing_ok=True)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (str(SRC_DIR), env.get("PYTHONPATH")) if p)
+        worker.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "models.inference_pool",
+                "--socket", str(worker.socket_path),
+                "--model", self.model_path,
+                "--threads", str(self.threads)
+            ],
+            cwd=str(SRC_DIR),
+            env=env
+        )
+
+    def _connect(self, worker: _Worker) -> None:
+        """Wait for a worker's socket and handshake."""
+        deadline = time.monotonic() + self.start_timeout_s
+        while True:
+            if worker.process.poll() is not None:
+                raise RuntimeError(f"Inference worker {worker.index} exited with code {worker.process.returncode}")
+            try:
+                connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                connection.connect(str(worker.socket_path))
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                connection.close()
+                if time.monotonic() > deadline:
+                    worker.process.kill()
+                    raise RuntimeError(f"Inference worker {worker.index} did not start in {self.start_timeout_s}s")
+                time.sleep(0.05)
+
+        send_message(connection, {"op": "hello"})
+        worker.info = recv_message(connection)
+        if worker.info is None:
+            raise RuntimeError(f"Inference worker {worker.index} closed the connection")
+        worker.connection = connection
+        worker.ready = True
+
+    def _restart(self, worker: _Worker) -> None:
+        """Replace a worker's process; caller holds worker.lock."""
+        worker.ready = False
+        if worker.connection is not None:
+            worker.connection.close()
+            worker.connection = None
+        if worker.process.poll() is None:
+            worker.process.kill()
+        worker.process.wait()
+        logger.warning(
+            f"Inference worker {worker.index} (pid {worker.process.pid}) exited "
+            f"with code {worker.process.returncode}; restarting"
+        )
+        worker.restarts += 1
+        self._spawn(worker)
+        self._connect(worker)
+
+    def _supervise(self) -> None:
+        """Restart idle workers that died."""
+        while not self._closed.wait(self.CHECK_INTERVAL_S):
+            for worker in self.workers:
+                if worker.process.poll() is None or not worker.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if not self._closed.is_set() and worker.process.poll() is not None:
+                        self._restart(worker)
+                except Exception:
+                    logger.exception(f"Could not restart inference worker {worker.index}")
+                finally:
+                    worker.lock.release()
+
+    def _acquire(self) -> _Worker:
+        """Pick the least-loaded worker (serving workers first)."""
+        with self._lock:
+            worker = min(self.workers, key=lambda w: (not w.ready, w.pending))
+            worker.pending += 1
+        return worker
+
+    def _send(self, worker: _Worker, batch: np.ndarray, request: Dict, output_planes: int) -> List[np.ndarray]:
+        """Run one request on a worker; caller holds worker.lock."""
+        if not worker.ready:
+            raise WorkerCrashed("worker not running")
+
+        input_segment = worker.input.reserve(batch.size * 4)
+        staged = np.ndarray(batch.shape, dtype=np.float32, buffer=input_segment.buf)
+        staged[...] = batch
+        del staged
+        # (B, output_planes, H, W) float32 at most
+        output_segment = worker.output.reserve(
+            batch.shape[0] * output_planes * batch.shape[2] * batch.shape[3] * 4
+        )
+
+        message = dict(request, input={"name": input_segment.name, "shape": list(batch.shape)})
+        message["output"] = output_segment.name
+        try:
+            send_message(worker.connection, message)
+            reply = recv_message(worker.connection)
+        except OSError as e:
+            raise WorkerCrashed(str(e))
+        if reply is None:
+            raise WorkerCrashed("connection closed")
+        if "error" in reply:
+            raise RuntimeError(f"Inference worker {worker.index}: {reply['error']}")
+
+        return [
+            np.ndarray(o["shape"], dtype=np.float32, buffer=output_segment.buf, offset=o["offset"]).copy()
+            for o in reply["outputs"]
+        ]
+
+    def _call(self, batch: np.ndarray, request: Dict, output_planes: int) -> List[np.ndarray]:
+        """Route a request, restarting a crashed worker and retrying once."""
+        if self._closed.is_set():
+            raise RuntimeError("Inference pool is closed")
+        for attempt in range(2):
+            worker = self._acquire()
+            try:
+                with worker.lock:
+                    try:
+                        return self._send(worker, batch, request, output_planes)
+                    except WorkerCrashed as e:
+                        logger.warning(f"Inference worker {worker.index} failed: {e}")
+                        self._restart(worker)
+            finally:
+                with self._lock:
+                    worker.pending -= 1
+        raise RuntimeError("Inference workers crashed twice on the same batch")
+
+    def predict_batch(
+        self,
+        batch: np.ndarray,
+        normalize: bool = True,
+        tta: tuple = ()
+    ) -> np.ndarray:
+        """Run one forward pass on a worker (see BrainTumorSegmenter.predict_batch)."""
+        request = {"op": "predict", "normalize": normalize, "tta": list(tta)}
+        return self._call(batch, request, settings.NUM_CLASSES)[0]
+
+    def predict_batch_uncertainty(
+        self,
+        batch: np.ndarray,
+        method: str = "entropy",
+        normalize: bool = True,
+        tta: tuple = (),
+        mc_samples: int = 8
+    ):
+        """Run one forward pass with uncertainty on a worker (see BrainTumorSegmenter)."""
+        if method not in self.UNCERTAINTY_METHODS:
+            raise ValueError(f"Unknown uncertainty method '{method}'. Expected {list(self.UNCERTAINTY_METHODS)}")
+        request = {
+            "op": "predict", "normalize": normalize, "tta": list(tta),
+            "method": method, "mc_samples": mc_samples
+        }
+        probabilities, uncertainty = self._call(batch, request, settings.NUM_CLASSES + 1)
+        return probabilities, uncertainty
+
+    def status(self) -> List[Dict]:
+        """Per-worker state for health checks."""
+        return [
+            {
+                "index": w.index,
+                "pid": w.process.pid,
+                "ready": w.ready,
+                "pending": w.pending,
+                "restarts": w.restarts
+            }
+            for w in self.workers
+        ]
+
+    def close(self) -> None:
+        """Stop the workers and free the shared buffers."""
+        self._closed.set()
+        for worker in self.workers:
+            with worker.lock:
+                worker.ready = False
+                if worker.connection is not None:
+                    # Workers exit when their connection closes
+                    worker.connection.close()
+                    worker.connection = None
+                if worker.process is None:
+                    continue
+                try:
+                    worker.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+                    worker.process.wait()
+                worker.input.release()
+                worker.output.release()
+                worker.socket_path.unlink(missing_ok=True)
+        logger.info("Inference pool stopped")
+
+
+_pool: Optional[InferencePool] = None
+
+
+def start_inference_pool(model_path: str, num_workers: int, threads: int = 0) -> InferencePool:
+    """Start the process-wide inference pool."""
+    global _pool
+    if _pool is None:
+        _pool = InferencePool(model_path, num_workers, threads)
+    return _pool
+
+
+def stop_inference_pool() -> None:
+    """Stop the process-wide inference pool, if running."""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def get_inference_pool() -> Optional[InferencePool]:
+    """Get the running inference pool."""
+    return _pool
+
+
+def get_predictor(model_path: str = None):
+    """Get the inference pool if running, otherwise the in-process segmenter."""
+    return _pool if _pool is not None else get_segmenter(model_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inference worker process")
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+    serve(args.socket, args.model, args.threads)
@@ -0,0 +1,174 @@
+"""
+Multi-Orientation Fusion Inference
+==================================
+Runs the 2D U-Net over axial, coronal and sagittal reslicings of one
+native-resolution volume and fuses the per-voxel probabilities.
+
+Reslicings are transposed views of the (D, C, H, W) volume, so no
+reoriented copies are made; each slice is resized to the model grid only
+when its batch is built. Slices of all orientations go through one shared
+batch queue, so every forward pass is full, and their probabilities are
+resized back and summed into a single streaming accumulator laid out
+(num_classes, D, H, W) in float16.
+"""
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+import logging
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from utils.deadline import checkpoint
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Orientation -> axis order of the (D, C, H, W) volume: slice axis, channel
+# axis, then the two in-plane axes
+ORIENTATIONS = {
+    "axial": (0, 1, 2, 3),
+    "coronal": (2, 1, 0, 3),
+    "sagittal": (3, 1, 0, 2),
+}
+
+
+def parse_orientations(spec) -> Tuple[str, ...]:
+    """
+    Parse an orientation set.
+
+    Args:
+        spec: Comma-separated names (e.g. "axial,coronal") or a sequence
+
+    Returns:
+        Tuple of orientation names in ORIENTATIONS order
+    """
+    names = spec.split(",") if isinstance(spec, str) else list(spec)
+    names = {n.strip() for n in names if n.strip()}
+    unknown = sorted(names - set(ORIENTATIONS))
+    if unknown or not names:
+        raise ValueError(f"Unknown orientation(s) {unknown}. Expected {list(ORIENTATIONS)}")
+    return tuple(n for n in ORIENTATIONS if n in names)
+
+
+class MultiPlanarInferer:
+    """Fuses 2D predictions from several slice orientations."""
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        target_size: Tuple[int, int] = (128, 128),
+        batch_size: int = 16,
+        num_classes: int = 4,
+        orientations: Sequence[str] = ("axial", "coronal", "sagittal")
+    ):
+        """
+        Initialize inferer.
+
+        Args:
+            predict_fn: Maps a (B, C, th, tw) batch to (B, num_classes, th, tw) probabilities
+            target_size: Model input (H, W); slices are resized to it
+            batch_size: Slices per forward pass, across orientations
+            num_classes: Number of output classes
+            orientations: Orientation names (see ORIENTATIONS)
+        """
+        self.predict_fn = predict_fn
+        self.target_size = tuple(target_size)
+        self.batch_size = max(1, batch_size)
+        self.num_classes = num_classes
+        self.orientations = parse_orientations(orientations)
+        self.last_stats: Dict = {}
+
+    def _flush(
+        self,
+        volume_views: Dict[str, np.ndarray],
+        accumulator_views: Dict[str, np.ndarray],
+        pending: List[Tuple[str, int]]
+    ) -> None:
+        """Run one mixed-orientation batch and add it to the accumulator."""
+        # Consecutive runs of one orientation share a slice shape
+        runs = []
+        for name, index in pending:
+            if runs and runs[-1][0] == name and runs[-1][2] == index:
+                runs[-1][2] += 1
+            else:
+                runs.append([name, index, index + 1])
+
+        checkpoint("inference")
+        inputs = []
+        for name, start, stop in runs:
+            slices = torch.from_numpy(np.ascontiguousarray(volume_views[name][start:stop]))
+            inputs.append(F.interpolate(slices, size=self.target_size, mode="area"))
+        probabilities = torch.from_numpy(self.predict_fn(torch.cat(inputs).numpy()))
+
+        offset = 0
+        for name, start, stop in runs:
+            count = stop - start
+            target = accumulator_views[name][start:stop]
+            resized = F.interpolate(
+                probabilities[offset:offset + count],
+                size=target.shape[2:],
+                mode="bilinear",
+                align_corners=False
+            )
+            target += resized.numpy()
+            offset += count
+        pending.clear()
+
+    def predict_volume(self, volume: np.ndarray) -> np.ndarray:
+        """
+        Segment a volume by fusing all orientations.
+
+        Args:
+            volume: Normalized input (D, C, H, W)
+
+        Returns:
+            Label volume (H, W, D) uint8, in the original NIfTI layout
+        """
+        num_slices, _, height, width = volume.shape
+        accumulator = np.zeros((self.num_classes, num_slices, height, width), dtype=np.float16)
+
+        # Per orientation: (slices, C, h, w) input view and the matching
+        # (slices, num_classes, h, w) accumulator view
+        volume_views = {name: volume.transpose(ORIENTATIONS[name]) for name in self.orientations}
+        accumulator_views = {
+            name: accumulator.transpose(_accumulator_axes(name)) for name in self.orientations
+        }
+
+        start_time = time.perf_counter()
+        pending: List[Tuple[str, int]] = []
+        batches = 0
+        for name in self.orientations:
+            for index in range(volume_views[name].shape[0]):
+                pending.append((name, index))
+                if len(pending) == self.batch_size:
+                    self._flush(volume_views, accumulator_views, pending)
+                    batches += 1
+        if pending:
+            self._flush(volume_views, accumulator_views, pending)
+            batches += 1
+
+        # (num_classes, D, H, W) -> (H, W, D) labels, a few slices at a time
+        labels = np.empty((height, width, num_slices), dtype=np.uint8)
+        for d in range(0, num_slices, self.batch_size):
+            chunk = np.argmax(accumulator[:, d:d + self.batch_size], axis=0)
+            labels[:, :, d:d + self.batch_size] = chunk.transpose(1, 2, 0)
+
+        self.last_stats = {
+            "orientations": list(self.orientations),
+            "slices": {name: int(volume_views[name].shape[0]) for name in self.orientations},
+            "batches": batches,
+            "seconds": round(time.perf_counter() - start_time, 3)
+        }
+        logger.info(
+            f"Multi-planar inference: {'+'.join(self.orientations)}, "
+            f"{sum(self.last_stats['slices'].values())} slices in {batches} batches"
+        )
+        return labels
+
+
+def _accumulator_axes(name: str) -> Tuple[int, int, int, int]:
+    """Axis order of the (num_classes, D, H, W) accumulator for an orientation."""
+    slice_axis, _, row_axis, col_axis = ORIENTATIONS[name]
+    # Volume axes (D, C, H, W) map to accumulator axes (1, 0, 2, 3)
+    to_accumulator = {0: 1, 1: 0, 2: 2, 3: 3}
+    return (to_accumulator[slice_axis], 0, to_accumulator[row_axis], to_accumulator[col_axis])
@@ -0,0 +1,138 @@
+"""
+Optimized Model Build
+=====================
+Builds an inference-optimized TorchScript version of the U-Net at load time:
+the model is traced, frozen (weights folded into the graph as constants)
+and, on CPU, handed to the oneDNN Graph fuser, which fuses each conv+ReLU
+pair and caches the weights in oneDNN's packed layout. On other devices
+torch.jit.optimize_for_inference is used instead.
+
+The traced graph is cached next to the checkpoint, keyed by the checkpoint
+hash and the torch version, so later starts skip tracing. Freezing and
+fusion run on every load because frozen graphs are not portable across
+builds.
+"""
+import os
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+from utils.helpers import get_file_hash
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def optimized_cache_path(checkpoint_path: str, device: torch.device) -> Path:
+    """
+    Cache file for the traced model of a checkpoint.
+
+    Args:
+        checkpoint_path: Path to the .pth checkpoint
+        device: Target device
+
+    Returns:
+        Path next to the checkpoint, e.g. final_model.3f2a9c41d07b6e15.ts.pt
+    """
+    checkpoint = Path(checkpoint_path)
+    key = hashlib.sha256(
+        f"{get_file_hash(str(checkpoint))}:{torch.__version__}:{device.type}".encode()
+    ).hexdigest()[:16]
+    return checkpoint.with_name(f"{checkpoint.stem}.{key}.ts.pt")
+
+
+def _trace_cached(
+    model: nn.Module,
+    example: torch.Tensor,
+    cache_path: Optional[Path]
+) -> torch.jit.ScriptModule:
+    """Load the traced model from cache, or trace and cache it."""
+    if cache_path is not None and cache_path.exists():
+        try:
+            traced = torch.jit.load(str(cache_path), map_location=example.device)
+            logger.info(f"Loaded traced model from cache {cache_path.name}")
+            return traced
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable model cache {cache_path}: {e}")
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+
+    if cache_path is not None:
+        tmp_path = cache_path.with_suffix(f".tmp{os.getpid()}")
+        try:
+            torch.jit.save(traced, str(tmp_path))
+            os.replace(tmp_path, cache_path)
+            logger.info(f"Cached traced model to {cache_path.name}")
+        except OSError as e:
+            logger.warning(f"Could not cache traced model: {e}")
+            tmp_path.unlink(missing_ok=True)
+    return traced
+
+
+def build_optimized_model(
+    model: nn.Module,
+    checkpoint_path: Optional[str],
+    example_shape: Tuple[int, ...],
+    device: torch.device,
+    use_cache: bool = True,
+    atol: float = 1e-3
+) -> Optional[torch.jit.ScriptModule]:
+    """
+    Build a frozen, fused version of an eval-mode model.
+
+    Args:
+        model: Eager model in eval mode, on `device`
+        checkpoint_path: Checkpoint the model was loaded from (cache key)
+        example_shape: Input shape used for tracing and warm-up
+        device: Target device
+        use_cache: Read/write the traced-model cache
+        atol: Maximum deviation from the eager outputs
+
+    Returns:
+        Optimized module, or None if the build fails or does not match the
+        eager model (callers keep using the eager model)
+    """
+    try:
+        example = torch.rand(example_shape, device=device)
+        cache_path = (
+            optimized_cache_path(checkpoint_path, device)
+            if use_cache and checkpoint_path and os.path.exists(checkpoint_path) else None
+        )
+
+        traced = _trace_cached(model, example, cache_path)
+        traced.eval()
+
+        use_onednn = device.type == 'cpu' and hasattr(torch.jit, "enable_onednn_fusion")
+        if use_onednn:
+            # Fuses conv+ReLU and caches packed weights for constant inputs
+            torch.jit.enable_onednn_fusion(True)
+        optimized = torch.jit.freeze(traced)
+        if not use_onednn:
+            optimized = torch.jit.optimize_for_inference(optimized)
+
+        # Warm up (the profiling executor compiles fusion groups on the
+        # second run) and check parity with the eager model
+        with torch.no_grad():
+            for _ in range(2):
+                optimized(example)
+            expected = model(example)
+            actual = optimized(example)
+        max_diff = (expected - actual).abs().max().item()
+        if max_diff > atol:
+            logger.warning(f"Optimized model deviates from eager (max diff {max_diff:.2e}); not used")
+            return None
+
+        logger.info(
+            f"Optimized model ready ({'oneDNN fusion' if use_onednn else 'optimize_for_inference'}, "
+            f"max diff {max_diff:.1e})"
+        )
+        return optimized
+
+    except Exception as e:
+        logger.warning(f"Model optimization failed, using eager model: {e}")
+        return None
@@ -0,0 +1,178 @@
+"""
+Sliding-Window Inference
+========================
+Tiles native-resolution slices into overlapping patches, runs them through
+the U-Net in batches and blends the patch probabilities with a Gaussian
+importance map. Tiles that contain only background are skipped.
+"""
+import numpy as np
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from utils.deadline import checkpoint
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def gaussian_importance_map(
+    patch_size: Tuple[int, int],
+    sigma_scale: float = 0.125
+) -> np.ndarray:
+    """
+    Build a 2D Gaussian weight map peaking at the patch centre.
+
+    Args:
+        patch_size: Patch (H, W)
+        sigma_scale: Sigma as a fraction of the patch size
+
+    Returns:
+        Weight map (H, W) with values in (0, 1]
+    """
+    axes = []
+    for size in patch_size:
+        coords = np.arange(size, dtype=np.float32) - (size - 1) / 2.0
+        sigma = max(size * sigma_scale, 1e-6)
+        axes.append(np.exp(-(coords ** 2) / (2 * sigma ** 2)))
+    weights = np.outer(axes[0], axes[1]).astype(np.float32)
+    weights /= weights.max()
+    # Keep patch borders from vanishing entirely
+    return np.maximum(weights, 1e-3)
+
+
+def tile_starts(length: int, patch: int, overlap: float) -> List[int]:
+    """
+    Compute tile start offsets along one axis.
+
+    Args:
+        length: Axis length
+        patch: Patch length
+        overlap: Fractional overlap between neighbouring tiles [0, 1)
+
+    Returns:
+        Start offsets; the last tile is aligned to the end of the axis
+    """
+    if length <= patch:
+        return [0]
+    stride = max(1, int(round(patch * (1.0 - overlap))))
+    starts = list(range(0, length - patch + 1, stride))
+    if starts[-1] != length - patch:
+        starts.append(length - patch)
+    return starts
+
+
+class SlidingWindowInferer:
+    """Patch-based inference over native-resolution slices."""
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        patch_size: Tuple[int, int] = (128, 128),
+        overlap: float = 0.5,
+        batch_size: int = 16,
+        num_classes: int = 4,
+        sigma_scale: float = 0.125,
+        background_threshold: float = 0.0
+    ):
+        """
+        Initialize inferer.
+
+        Args:
+            predict_fn: Maps a (B, C, ph, pw) batch to (B, num_classes, ph, pw) probabilities
+            patch_size: Patch (H, W) fed to the model
+            overlap: Fractional overlap between neighbouring tiles
+            batch_size: Number of tiles per forward pass
+            num_classes: Number of output classes
+            sigma_scale: Gaussian sigma as a fraction of the patch size
+            background_threshold: Tiles whose maximum is at or below this are skipped
+        """
+        if not 0.0 <= overlap < 1.0:
+            raise ValueError(f"overlap must be in [0, 1), got {overlap}")
+        self.predict_fn = predict_fn
+        self.patch_size = tuple(patch_size)
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.num_classes = num_classes
+        self.background_threshold = background_threshold
+        self.importance = gaussian_importance_map(self.patch_size, sigma_scale)
+        self.last_stats: Dict[str, int] = {}
+
+    def predict_volume(self, volume: np.ndarray) -> np.ndarray:
+        """
+        Segment a volume slice by slice.
+
+        Only the accumulators of slices with tiles still in flight are kept,
+        so memory is bounded by the batch size rather than the volume.
+
+        Args:
+            volume: Normalized input (D, C, H, W)
+
+        Returns:
+            Label volume (H, W, D) uint8, in the original NIfTI layout
+        """
+        num_slices, channels, height, width = volume.shape
+        ph, pw = self.patch_size
+        ys = tile_starts(height, ph, self.overlap)
+        xs = tile_starts(width, pw, self.overlap)
+        tiles_per_slice = len(ys) * len(xs)
+
+        labels = np.zeros((height, width, num_slices), dtype=np.uint8)
+        # slice index -> [probability sum, weight sum, tiles remaining]
+        pending: Dict[int, list] = {}
+        batch = np.zeros((self.batch_size, channels, ph, pw), dtype=np.float32)
+        coords: List[Tuple[int, int, int]] = []
+        stats = {"tiles": 0, "skipped": 0, "batches": 0}
+
+        def flush():
+            if not coords:
+                return
+            checkpoint("inference")
+            probs = self.predict_fn(batch[:len(coords)])
+            stats["batches"] += 1
+            for k, (d, y, x) in enumerate(coords):
+                h, w = min(ph, height - y), min(pw, width - x)
+                acc, weight, _ = pending[d]
+                importance = self.importance[:h, :w]
+                acc[:, y:y + h, x:x + w] += probs[k, :, :h, :w] * importance
+                weight[y:y + h, x:x + w] += importance
+                pending[d][2] -= 1
+            coords.clear()
+
+        def finalize_ready():
+            for d in [d for d, entry in pending.items() if entry[2] == 0]:
+                acc, weight, _ = pending.pop(d)
+                slice_labels = np.argmax(acc, axis=0).astype(np.uint8)
+                slice_labels[weight == 0] = 0
+                labels[:, :, d] = slice_labels
+
+        for d in range(num_slices):
+            pending[d] = [
+                np.zeros((self.num_classes, height, width), dtype=np.float32),
+                np.zeros((height, width), dtype=np.float32),
+                tiles_per_slice
+            ]
+            for y in ys:
+                for x in xs:
+                    stats["tiles"] += 1
+                    tile = volume[d, :, y:y + ph, x:x + pw]
+                    if tile.max() <= self.background_threshold:
+                        stats["skipped"] += 1
+                        pending[d][2] -= 1
+                        continue
+                    slot = batch[len(coords)]
+                    slot.fill(0)
+                    slot[:, :tile.shape[1], :tile.shape[2]] = tile
+                    coords.append((d, y, x))
+                    if len(coords) == self.batch_size:
+                        flush()
+            finalize_ready()
+
+        flush()
+        finalize_ready()
+
+        self.last_stats = stats
+        logger.info(
+            f"Sliding window: {stats['tiles']} tiles, {stats['skipped']} skipped, "
+            f"{stats['batches']} batches"
+        )
+        return labels
@@ -11,6 +11,11 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import logging
+from typing import Tuple
+
+from utils.config import settings
+from utils.profiling import profile_stage
+from utils.deadline import checkpoint
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -81,7 +86,13 @@ class UNet(nn.Module):
                 if m.bias is not None:
                     nn.init.constant_(m.bias, 0)
     
-    def forward(self, x):
+    def forward(self, x, mc_dropout: bool = False):
+        """
+        Args:
+            x: Input batch (B, C, H, W)
+            mc_dropout: Apply dropout as in training (MC-dropout sampling)
+                        without switching the shared module's mode
+        """
         # Encoder
         conv1 = F.relu(self.conv1_1(x))
         conv1 = F.relu(self.conv1_2(conv1))
@@ -101,7 +112,10 @@ class UNet(nn.Module):
         
         conv5 = F.relu(self.conv5_1(pool4))
         conv5 = F.relu(self.conv5_2(conv5))
-        conv5 = self.dropout(conv5)
+        if mc_dropout:
+            conv5 = F.dropout2d(conv5, self.dropout.p, training=True)
+        else:
+            conv5 = self.dropout(conv5)
         
         # Decoder
         up6 = self.upconv6(conv5)
@@ -145,6 +159,16 @@ class BrainTumorSegmenter:
         3: [0, 255, 255]
     }
     
+    # Test-time augmentations: name -> flipped (H, W) tensor dims
+    TTA_FLIPS = {
+        'hflip': (3,),
+        'vflip': (2,),
+        'hvflip': (2, 3)
+    }
+    
+    # Per-voxel uncertainty measures (see predict_batch_uncertainty)
+    UNCERTAINTY_METHODS = ('entropy', 'max_prob', 'mc_dropout')
+    
     _instance = None
     
     def __new__(cls, model_path: str = None):
@@ -153,7 +177,13 @@ class BrainTumorSegmenter:
             cls._instance = super(BrainTumorSegmenter, cls).__new__(cls)
             cls._instance.model_path = model_path
             cls._instance.model = None
+            cls._instance.optimized_model = None
+            cls._instance.context_slices = settings.CONTEXT_SLICES
             cls._instance.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            cls._instance.precision = settings.INFERENCE_PRECISION
+            cls._instance.channels_last = (
+                settings.CHANNELS_LAST or settings.INFERENCE_PRECISION == "bf16"
+            )
             
             if model_path and os.path.exists(model_path):
                 cls._instance._load_model()
@@ -165,25 +195,47 @@ class BrainTumorSegmenter:
             logger.info(f"Loading PyTorch model from {self.model_path}")
             logger.info(f"Using device: {self.device}")
             
-            # Initialize model (2 channels: FLAIR, T1CE - matching Kaggle notebook)
-            self.model = UNet(in_channels=2, num_classes=4)
-            
             # Load checkpoint
             checkpoint = torch.load(self.model_path, map_location=self.device)
             
             # Handle different save formats
             if isinstance(checkpoint, dict):
+                state_dict = checkpoint.get('model_state_dict', checkpoint)
+                # Input channels: FLAIR, T1CE per context slice (2 = plain 2D,
+                # matching Kaggle notebook); the checkpoint decides
+                in_channels = settings.NUM_CHANNELS * settings.CONTEXT_SLICES
+                if 'conv1_1.weight' in state_dict:
+                    in_channels = state_dict['conv1_1.weight'].shape[1]
+                self.model = UNet(in_channels=in_channels, num_classes=settings.NUM_CLASSES)
+                self.model.load_state_dict(state_dict)
                 if 'model_state_dict' in checkpoint:
-                    self.model.load_state_dict(checkpoint['model_state_dict'])
                     logger.info(f"Loaded from checkpoint (epoch {checkpoint.get('epoch', 'unknown')})")
-                else:
-                    self.model.load_state_dict(checkpoint)
             else:
                 self.model = checkpoint  # Direct model save
             
+            self.context_slices = self.model.conv1_1.in_channels // settings.NUM_CHANNELS
+            if self.context_slices != settings.CONTEXT_SLICES:
+                logger.warning(
+                    f"Checkpoint expects {self.context_slices} context slice(s), "
+                    f"overriding CONTEXT_SLICES={settings.CONTEXT_SLICES}"
+                )
+            logger.info(f"Model input: {self.context_slices} slice(s) x {settings.NUM_CHANNELS} modalities")
+            
             self.model.to(self.device)
             self.model.eval()
             
+            # Fused/frozen model for fp32 inference (cached by checkpoint hash)
+            if settings.OPTIMIZE_MODEL:
+                from models.optimize import build_optimized_model
+                self.optimized_model = build_optimized_model(
+                    self.model,
+                    self.model_path,
+                    (settings.INFERENCE_BATCH_SIZE, self.model.conv1_1.in_channels) + tuple(settings.TARGET_SIZE),
+                    self.device
+                )
+            
+            self.configure(self.precision, self.channels_last)
+            
             logger.info("✅ PyTorch model loaded successfully")
             
         except Exception as e:
@@ -192,10 +244,383 @@ class BrainTumorSegmenter:
             traceback.print_exc()
             self.model = None
     
+    def configure(self, precision: str = "fp32", channels_last: bool = False):
+        """
+        Set the inference precision and memory format.
+        
+        Args:
+            precision: "fp32", or "bf16" for bfloat16 autocast
+            channels_last: Run convolutions in channels-last (NHWC) layout
+        """
+        if precision not in ("fp32", "bf16"):
+            raise ValueError(f"Unknown precision '{precision}'")
+        self.precision = precision
+        self.channels_last = channels_last
+        
+        if self.model is not None:
+            memory_format = torch.channels_last if channels_last else torch.contiguous_format
+            self.model = self.model.to(memory_format=memory_format)
+        
+        if precision == "bf16" and self.device.type == 'cpu':
+            logger.info(
+                f"bfloat16 autocast enabled (CPU capability: "
+                f"{torch.backends.cpu.get_cpu_capability()})"
+            )
+    
+    def share_memory(self) -> int:
+        """
+        Move the eager model's weights into shared memory.
+        
+        Called in a pre-forking server master: forked workers then map the
+        same weight pages instead of each getting copy-on-write duplicates.
+        The optimized graph is dropped, since it holds its own frozen (and,
+        on CPU, repacked) copy of the weights; workers serve the eager model.
+        
+        Returns:
+            Bytes of parameters and buffers now in shared memory
+        """
+        if self.model is None:
+            return 0
+        if self.optimized_model is not None:
+            logger.info("Dropping the optimized model: it cannot use the shared weights")
+            self.optimized_model = None
+        self.model.share_memory()
+        return sum(
+            t.numel() * t.element_size()
+            for t in list(self.model.parameters()) + list(self.model.buffers())
+        )
+    
+    def _runtime_model(self):
+        """
+        Model used for forward passes: the optimized graph for plain fp32,
+        the eager model for bf16 or channels-last (the graph is frozen with
+        contiguous weights, so it would ignore the layout).
+        """
+        if self.optimized_model is not None and self.precision == "fp32" and not self.channels_last:
+            return self.optimized_model
+        return self.model
+    
+    def _autocast(self):
+        """Autocast context for the configured precision."""
+        return torch.autocast(
+            device_type=self.device.type,
+            dtype=torch.bfloat16,
+            enabled=self.precision == "bf16"
+        )
+    
     def is_loaded(self) -> bool:
         """Check if model is loaded."""
         return self.model is not None
     
+    def is_optimized(self) -> bool:
+        """Check if forward passes use the optimized graph."""
+        return self.optimized_model is not None
+    
+    @classmethod
+    def parse_tta(cls, spec) -> tuple:
+        """
+        Parse a test-time augmentation set.
+        
+        Args:
+            spec: Comma-separated names (e.g. "hflip,vflip"), a sequence of
+                  names, or None/""/"none" for no augmentation
+        
+        Returns:
+            Tuple of augmentation names (identity is implicit)
+        """
+        if not spec or spec == "none":
+            return ()
+        names = spec.split(",") if isinstance(spec, str) else list(spec)
+        names = tuple(dict.fromkeys(n.strip() for n in names if n.strip()))
+        unknown = [n for n in names if n not in cls.TTA_FLIPS]
+        if unknown:
+            raise ValueError(f"Unknown TTA transform(s) {unknown}. Expected {list(cls.TTA_FLIPS)}")
+        return names
+    
+    def _forward_samples(
+        self,
+        batch: np.ndarray,
+        normalize: bool = True,
+        tta: tuple = (),
+        mc_samples: int = 0
+    ) -> torch.Tensor:
+        """
+        Run one forward pass over all variants of a batch.
+        
+        TTA flips and MC-dropout samples are stacked into the same forward
+        batch; flipped probabilities are un-flipped and averaged into a
+        running accumulator per dropout sample.
+        
+        Args:
+            batch: Input batch (B, C, H, W) - numpy array
+            normalize: Divide by the batch maximum (as in the notebook)
+            tta: Augmentation names from parse_tta
+            mc_samples: Stochastic forward samples with Dropout2d active
+                        (0 = deterministic)
+        
+        Returns:
+            Softmax probabilities (S, B, num_classes, H, W), S = max(1, mc_samples)
+        """
+        if self.model is None:
+            raise ValueError("Model not loaded")
+        
+        # Copies only this batch (2.5D inputs are strided views)
+        image_tensor = torch.from_numpy(
+            np.ascontiguousarray(batch, dtype=np.float32)
+        ).to(self.device)
+        
+        # Normalize
+        if normalize and image_tensor.max() > 0:
+            image_tensor = image_tensor / image_tensor.max()
+        
+        # Stack augmented variants: (len(tta) + 1) * B samples
+        flips = [()] + [self.TTA_FLIPS[name] for name in tta]
+        if len(flips) > 1:
+            image_tensor = torch.cat(
+                [image_tensor.flip(dims) if dims else image_tensor for dims in flips]
+            )
+        
+        # MC dropout needs the eager model (dropout is folded away in the
+        # optimized graph); it samples dropout functionally, so concurrent
+        # deterministic passes on the same model are unaffected
+        samples = max(1, mc_samples)
+        model = self.model if mc_samples else self._runtime_model()
+        if samples > 1:
+            image_tensor = image_tensor.repeat(samples, 1, 1, 1)
+        if self.channels_last and model is self.model:
+            image_tensor = image_tensor.contiguous(memory_format=torch.channels_last)
+        
+        # Predict
+        with torch.inference_mode(), self._autocast(), profile_stage("unet.forward"):
+            batch_output = model(image_tensor, mc_dropout=True) if mc_samples else model(image_tensor)
+            # Apply softmax (in float32) to get probabilities
+            batch_output = F.softmax(batch_output.float(), dim=1)
+            batch_output = batch_output.view(
+                samples, len(flips), batch.shape[0], *batch_output.shape[1:]
+            )
+            
+            if len(flips) > 1:
+                accumulator = batch_output[:, 0].clone()
+                for k, dims in enumerate(flips[1:], start=1):
+                    accumulator += batch_output[:, k].flip([d + 1 for d in dims])
+                batch_output = accumulator.div_(len(flips))
+            else:
+                batch_output = batch_output[:, 0]
+        
+        # Clear memory
+        del image_tensor
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
+        
+        return batch_output
+    
+    def predict_batch(
+        self,
+        batch: np.ndarray,
+        normalize: bool = True,
+        tta: tuple = ()
+    ) -> np.ndarray:
+        """
+        Run one forward pass.
+        
+        Args:
+            batch: Input batch (B, C, H, W) - numpy array
+            normalize: Divide by the batch maximum (as in the notebook)
+            tta: Augmentation names from parse_tta
+            
+        Returns:
+            Softmax probabilities (B, num_classes, H, W)
+        """
+        return self._forward_samples(batch, normalize, tta)[0].cpu().numpy()
+    
+    def predict_batch_uncertainty(
+        self,
+        batch: np.ndarray,
+        method: str = "entropy",
+        normalize: bool = True,
+        tta: tuple = (),
+        mc_samples: int = 8
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run one forward pass and compute per-pixel uncertainty.
+        
+        Args:
+            batch: Input batch (B, C, H, W) - numpy array
+            method: "entropy" (normalized predictive entropy), "max_prob"
+                    (1 - max probability, rescaled) or "mc_dropout"
+                    (variance over mc_samples dropout samples)
+            normalize: Divide by the batch maximum (as in the notebook)
+            tta: Augmentation names from parse_tta
+            mc_samples: Dropout samples for "mc_dropout"
+            
+        Returns:
+            (probabilities (B, num_classes, H, W), uncertainty (B, H, W) in [0, 1]);
+            with "mc_dropout" the probabilities are the sample mean
+        """
+        if method not in self.UNCERTAINTY_METHODS:
+            raise ValueError(f"Unknown uncertainty method '{method}'. Expected {list(self.UNCERTAINTY_METHODS)}")
+        
+        samples = self._forward_samples(
+            batch, normalize, tta, mc_samples=max(2, mc_samples) if method == "mc_dropout" else 0
+        )
+        probabilities = samples.mean(dim=0)
+        num_classes = probabilities.shape[1]
+        
+        if method == "entropy":
+            entropy = -(probabilities * probabilities.clamp_min(1e-8).log()).sum(dim=1)
+            uncertainty = entropy / np.log(num_classes)
+        elif method == "max_prob":
+            uncertainty = (1.0 - probabilities.max(dim=1).values) * num_classes / (num_classes - 1)
+        else:
+            # Per-class variance is at most 0.25
+            uncertainty = samples.var(dim=0, unbiased=False).mean(dim=1) * 4.0
+        
+        return probabilities.cpu().numpy(), uncertainty.clamp_(0.0, 1.0).cpu().numpy()
+    
+    @staticmethod
+    def _normalized_groups(image: np.ndarray, group_size: int):
+        """
+        Cut a volume into groups of slices, each divided by its own maximum.
+        
+        Callers use batch_size groups (as in the notebook) however many
+        forward passes a group is then split into, so TTA flips and
+        MC-dropout samples do not change how the input is normalized.
+        
+        Yields:
+            (start, float32 copy of image[start:start + group_size])
+        """
+        for start in range(0, image.shape[0], group_size):
+            chunk = np.array(image[start:start + group_size], dtype=np.float32)
+            peak = chunk.max()
+            if peak > 0:
+                chunk /= peak
+            yield start, chunk
+    
+    def iter_predict(self, image: np.ndarray, batch_size: int = 16, tta: tuple = ()):
+        """
+        Predict segmentation batch by batch.
+        
+        Args:
+            image: Input image (batch, C, H, W) - numpy array
+            batch_size: Slices per normalization group and samples per
+                        forward pass; with TTA each slice takes len(tta) + 1
+                        samples, so a group is split over several passes
+            tta: Augmentation names from parse_tta
+            
+        Yields:
+            (start, probabilities) with probabilities of shape (B, num_classes, H, W)
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not loaded")
+        
+        slices_per_pass = max(1, batch_size // (len(tta) + 1))
+        for group_start, group in self._normalized_groups(image, max(1, batch_size)):
+            for offset in range(0, group.shape[0], slices_per_pass):
+                checkpoint("inference")
+                yield group_start + offset, self.predict_batch(
+                    group[offset:offset + slices_per_pass], normalize=False, tta=tta
+                )
+    
+    def iter_predict_many(self, volumes, batch_size: int = 16, tta: tuple = ()):
+        """
+        Predict several volumes through shared forward batches.
+        
+        Each volume is cut into the same batch_size groups as iter_predict
+        and every group is normalized by its own maximum, so results match
+        single-volume inference; the groups are then packed back to back
+        into passes, so one forward batch can hold the tail of one study and
+        the head of the next.
+        
+        Args:
+            volumes: Iterable of (key, image (D, C, H, W)); consumed lazily,
+                     one volume ahead of the model at most
+            batch_size: Samples per forward pass (see iter_predict)
+            tta: Augmentation names from parse_tta
+            
+        Yields:
+            (key, start, probabilities (B, num_classes, H, W), done), with
+            done True on the last slices of a volume
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not loaded")
+        
+        slices_per_pass = max(1, batch_size // (len(tta) + 1))
+        # Normalized chunks waiting for a forward pass: [key, start, array, last]
+        queue = []
+        queued = 0
+        
+        def run(count):
+            parts, owners = [], []
+            while count:
+                key, start, array, last = queue[0]
+                taken = min(count, array.shape[0])
+                parts.append(array[:taken])
+                whole = taken == array.shape[0]
+                owners.append((key, start, taken, last and whole))
+                if whole:
+                    queue.pop(0)
+                else:
+                    queue[0] = [key, start + taken, array[taken:], last]
+                count -= taken
+            batch = parts[0] if len(parts) == 1 else np.concatenate(parts)
+            checkpoint("inference")
+            probabilities = self.predict_batch(batch, normalize=False, tta=tta)
+            offset = 0
+            for key, start, taken, done in owners:
+                yield key, start, probabilities[offset:offset + taken], done
+                offset += taken
+        
+        for key, image in volumes:
+            num_slices = image.shape[0]
+            for start, chunk in self._normalized_groups(image, max(1, batch_size)):
+                queue.append([key, start, chunk, start + chunk.shape[0] >= num_slices])
+                queued += chunk.shape[0]
+                while queued >= slices_per_pass:
+                    yield from run(slices_per_pass)
+                    queued -= slices_per_pass
+        
+        while queued:
+            count = min(queued, slices_per_pass)
+            yield from run(count)
+            queued -= count
+    
+    def iter_predict_uncertainty(
+        self,
+        image: np.ndarray,
+        method: str = "entropy",
+        batch_size: int = 16,
+        tta: tuple = (),
+        mc_samples: int = 8
+    ):
+        """
+        Predict segmentation and uncertainty batch by batch.
+        
+        Args:
+            image: Input image (batch, C, H, W) - numpy array
+            method: Uncertainty method (see predict_batch_uncertainty)
+            batch_size: Slices per normalization group (as in iter_predict)
+                        and samples per forward pass, shared by TTA
+                        variants and dropout samples
+            tta: Augmentation names from parse_tta
+            mc_samples: Dropout samples for "mc_dropout"
+            
+        Yields:
+            (start, probabilities (B, num_classes, H, W), uncertainty (B, H, W))
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not loaded")
+        
+        variants = (len(tta) + 1) * (max(2, mc_samples) if method == "mc_dropout" else 1)
+        slices_per_pass = max(1, batch_size // variants)
+        for group_start, group in self._normalized_groups(image, max(1, batch_size)):
+            for offset in range(0, group.shape[0], slices_per_pass):
+                checkpoint("inference")
+                probabilities, uncertainty = self.predict_batch_uncertainty(
+                    group[offset:offset + slices_per_pass], method,
+                    normalize=False, tta=tta, mc_samples=mc_samples
+                )
+                yield group_start + offset, probabilities, uncertainty
+    
     def predict(self, image: np.ndarray) -> np.ndarray:
         """
         Predict segmentation.
@@ -214,34 +639,8 @@ class BrainTumorSegmenter:
         if len(image.shape) == 3:
             image = np.expand_dims(image, axis=0)  # Add batch dim
         
-        # Process in batches to avoid OOM
-        batch_size = 16  # Process 16 slices at a time
-        num_samples = image.shape[0]
-        output_list = []
-        
-        for i in range(0, num_samples, batch_size):
-            batch_np = image[i : i + batch_size]
-            
-            # Input is already (B, C, H, W) from preprocessor
-            image_tensor = torch.FloatTensor(batch_np).to(self.device)
-            
-            # Normalize
-            if image_tensor.max() > 0:
-                image_tensor = image_tensor / image_tensor.max()
-            
-            # Predict
-            with torch.no_grad():
-                batch_output = self.model(image_tensor)
-                # Apply softmax to get probabilities
-                batch_output = F.softmax(batch_output, dim=1)
-                
-            # Output is (B, C, H, W) - keep as-is
-            output_list.append(batch_output.cpu().numpy())
-            
-            # Clear memory
-            del image_tensor, batch_output
-            if self.device == 'cuda':
-                torch.cuda.empty_cache()
+        # Process in batches to avoid OOM (16 slices at a time)
+        output_list = [batch for _, batch in self.iter_predict(image, batch_size=16)]
         
         # Concatenate results
         output_np = np.concatenate(output_list, axis=0)
@@ -255,19 +654,11 @@ class BrainTumorSegmenter:
         return np.argmax(pred, axis=1)
     
     def get_tumor_regions(self, class_mask: np.ndarray) -> dict:
-        """Get tumor statistics."""
-        total_pixels = class_mask.size
-        stats = {}
-        
-        for class_idx, label in self.CLASS_LABELS.items():
-            pixel_count = int(np.sum(class_mask == class_idx))
-            percentage = float((pixel_count / total_pixels) * 100)
-            stats[label] = {
-                'pixel_count': pixel_count,
-                'percentage': round(percentage, 2)
-            }
-        
-        return stats
+        """Get tumor statistics (single bincount pass)."""
+        from postprocessing.statistics import class_counts, class_statistics
+        
+        counts = class_counts(class_mask, len(self.CLASS_LABELS))
+        return class_statistics(counts, self.CLASS_LABELS)
 
 
 def get_segmenter(model_path: str = None) -> BrainTumorSegmenter:
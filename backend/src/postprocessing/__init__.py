@@ -0,0 +1 @@
+"""Postprocessing module."""
@@ -0,0 +1,102 @@
+"""
+Chunked Probability Resampling
+==============================
+Maps per-slice class probabilities from the model grid back to the
+original volume grid. Probabilities are resampled before the argmax
+(so class boundaries stay smooth) a chunk of slices at a time, and the
+uint8 labels are streamed into the output volume.
+"""
+import numpy as np
+import torch
+import torch.nn.functional as F
+import logging
+from typing import Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ProbabilityResampler:
+    """
+    Streams probability batches into a uint8 label volume.
+
+    Peak memory is one chunk of resampled probabilities
+    (chunk_size, num_classes, H, W) plus the output volume itself.
+    """
+
+    def __init__(
+        self,
+        original_shape: Tuple[int, ...],
+        num_classes: int = 4,
+        chunk_size: int = 16,
+        mode: str = "bilinear",
+        slice_offset: int = 0,
+        keep_low_res: bool = True
+    ):
+        """
+        Initialize resampler.
+
+        Args:
+            original_shape: Original volume shape (H, W, D)
+            num_classes: Number of classes in the probabilities
+            chunk_size: Slices resampled per step
+            mode: torch interpolation mode ("bilinear", "bicubic" or "nearest")
+            slice_offset: Output slice index of the first model slice
+            keep_low_res: Also keep the model-grid argmax (D, h, w) for stats/overlays
+        """
+        self.original_shape = tuple(original_shape)
+        self.num_classes = num_classes
+        self.chunk_size = max(1, chunk_size)
+        self.mode = mode
+        self.slice_offset = slice_offset
+        self.keep_low_res = keep_low_res
+
+        self.output = np.zeros(self.original_shape, dtype=np.uint8)
+        self.low_res_labels: Optional[np.ndarray] = None
+
+    def add(self, start: int, probabilities: np.ndarray) -> None:
+        """
+        Resample a batch of slices and write their labels.
+
+        Args:
+            start: Model slice index of the first slice in the batch
+            probabilities: Probabilities (B, num_classes, h, w)
+        """
+        num_out_slices = self.original_shape[2]
+        height, width = self.original_shape[0], self.original_shape[1]
+
+        if self.keep_low_res:
+            if self.low_res_labels is None:
+                self.low_res_labels = np.zeros(
+                    (num_out_slices - self.slice_offset,) + probabilities.shape[2:],
+                    dtype=np.uint8
+                )
+            stop = min(start + probabilities.shape[0], self.low_res_labels.shape[0])
+            if stop > start:
+                self.low_res_labels[start:stop] = np.argmax(
+                    probabilities[:stop - start], axis=1
+                )
+
+        for offset in range(0, probabilities.shape[0], self.chunk_size):
+            first = start + offset + self.slice_offset
+            count = min(self.chunk_size, probabilities.shape[0] - offset, num_out_slices - first)
+            if count <= 0:
+                break
+
+            chunk = torch.from_numpy(
+                np.ascontiguousarray(probabilities[offset:offset + count], dtype=np.float32)
+            )
+            if self.mode == "nearest":
+                resampled = F.interpolate(chunk, size=(height, width), mode="nearest")
+            else:
+                resampled = F.interpolate(
+                    chunk, size=(height, width), mode=self.mode, align_corners=False
+                )
+            labels = resampled.argmax(dim=1).to(torch.uint8).numpy()  # (count, H, W)
+
+            # (count, H, W) -> (H, W, count)
+            self.output[:, :, first:first + count] = labels.transpose(1, 2, 0)
+
+    def result(self) -> np.ndarray:
+        """Get the label volume in the original (H, W, D) layout."""
+        return self.output
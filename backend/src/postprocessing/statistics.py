@@ -0,0 +1,177 @@
+"""
+Tumor Statistics
+================
+Single-pass class counts (chunked bincount), volumes in mm³ from the
+NIfTI voxel spacing, the standard BraTS regions and connected-component
+metrics of the whole tumor.
+"""
+import numpy as np
+from scipy import ndimage
+from typing import Dict, Optional, Sequence, Tuple
+
+# BraTS evaluation regions over the remapped labels
+# (1 = Necrotic/Core, 2 = Edema, 3 = Enhancing Tumor)
+BRATS_REGIONS = {
+    "Whole Tumor": (1, 2, 3),
+    "Tumor Core": (1, 3),
+    "Enhancing Tumor": (3,),
+}
+
+# Voxels per bincount step; bounds the temporary index array
+_COUNT_CHUNK = 1 << 20
+
+
+def class_counts(mask: np.ndarray, num_classes: int = 4) -> np.ndarray:
+    """
+    Count voxels per class in one pass.
+
+    Args:
+        mask: Integer label mask of any shape
+        num_classes: Number of classes
+
+    Returns:
+        Counts (num_classes,) int64; labels >= num_classes are ignored
+    """
+    flat = mask.reshape(-1)
+    counts = np.zeros(num_classes, dtype=np.int64)
+    for start in range(0, flat.size, _COUNT_CHUNK):
+        chunk = np.bincount(flat[start:start + _COUNT_CHUNK], minlength=num_classes)
+        counts += chunk[:num_classes]
+    return counts
+
+
+def class_statistics(counts: np.ndarray, class_labels: Dict[int, str]) -> Dict:
+    """
+    Per-class pixel counts and percentages.
+
+    Args:
+        counts: Output of class_counts
+        class_labels: Class index -> label
+
+    Returns:
+        {label: {'pixel_count', 'percentage'}}
+    """
+    total = max(int(counts.sum()), 1)
+    return {
+        label: {
+            'pixel_count': int(counts[idx]),
+            'percentage': round(float(counts[idx] / total * 100), 2)
+        }
+        for idx, label in class_labels.items()
+    }
+
+
+def voxel_volume_mm3(voxel_spacing: Optional[Sequence[float]]) -> float:
+    """Volume of one voxel in mm³ (1.0 if the spacing is unknown)."""
+    if not voxel_spacing:
+        return 1.0
+    return float(np.prod([abs(float(z)) for z in voxel_spacing[:3]]))
+
+
+def connected_components(
+    mask: np.ndarray,
+    max_components: int = 10
+) -> Tuple[int, np.ndarray]:
+    """
+    Label the 6-connected components of a binary mask.
+
+    The labeling runs on the bounding box of the mask only.
+
+    Args:
+        mask: Binary mask (H, W, D)
+        max_components: Number of component sizes returned
+
+    Returns:
+        (component count, sizes in voxels sorted descending, at most max_components)
+    """
+    box = ndimage.find_objects(mask.view(np.uint8) if mask.dtype == bool else mask.astype(np.uint8))
+    if not box or box[0] is None:
+        return 0, np.zeros(0, dtype=np.int64)
+    labels, count = ndimage.label(mask[box[0]])
+    sizes = np.bincount(labels.reshape(-1))[1:]
+    return int(count), np.sort(sizes)[::-1][:max_components]
+
+
+def tumor_volumetrics(
+    mask: np.ndarray,
+    voxel_spacing: Optional[Sequence[float]] = None,
+    counts: Optional[np.ndarray] = None,
+    class_labels: Optional[Dict[int, str]] = None,
+    max_components: int = 10
+) -> Dict:
+    """
+    Volumetric tumor statistics in the original scan space.
+
+    Args:
+        mask: Label volume (H, W, D)
+        voxel_spacing: Voxel size in mm (from the NIfTI header)
+        counts: Precomputed class_counts(mask), reused if given
+        class_labels: Class index -> label (defaults to 1-3 BraTS labels)
+        max_components: Number of component sizes reported
+
+    Returns:
+        Dictionary with per-class volumes, BraTS regions (WT/TC/ET) and
+        whole-tumor connected components
+    """
+    if counts is None:
+        counts = class_counts(mask)
+    if class_labels is None:
+        class_labels = {1: 'Necrotic/Core', 2: 'Edema', 3: 'Enhancing Tumor'}
+    voxel_mm3 = voxel_volume_mm3(voxel_spacing)
+
+    def volume(voxels: int) -> Dict:
+        return {
+            'voxels': int(voxels),
+            'volume_mm3': round(voxels * voxel_mm3, 2),
+            'volume_ml': round(voxels * voxel_mm3 / 1000.0, 3)
+        }
+
+    classes = {
+        label: volume(counts[idx])
+        for idx, label in class_labels.items()
+        if idx != 0 and idx < counts.size
+    }
+    regions = {
+        name: volume(sum(int(counts[c]) for c in members if c < counts.size))
+        for name, members in BRATS_REGIONS.items()
+    }
+
+    count, sizes = connected_components(mask > 0, max_components)
+
+    return {
+        'voxel_spacing_mm': [float(z) for z in voxel_spacing[:3]] if voxel_spacing else None,
+        'voxel_volume_mm3': round(voxel_mm3, 4),
+        'classes': classes,
+        'regions': regions,
+        'whole_tumor_components': {
+            'count': count,
+            'largest_voxels': [int(s) for s in sizes],
+            'largest_volume_mm3': [round(float(s) * voxel_mm3, 2) for s in sizes]
+        }
+    }
+
+
+def dice_scores(
+    prediction: np.ndarray,
+    reference: np.ndarray,
+    regions: Optional[Dict[str, Sequence[int]]] = None
+) -> Dict[str, float]:
+    """
+    Dice overlap per region between two label volumes.
+
+    Args:
+        prediction: Predicted labels
+        reference: Reference labels (same shape)
+        regions: Region name -> member labels (defaults to BRATS_REGIONS)
+
+    Returns:
+        {region: dice}; 1.0 when both masks are empty for a region
+    """
+    regions = regions or BRATS_REGIONS
+    scores = {}
+    for name, members in regions.items():
+        pred = np.isin(prediction, members)
+        ref = np.isin(reference, members)
+        denom = int(pred.sum()) + int(ref.sum())
+        scores[name] = 1.0 if denom == 0 else round(2.0 * int((pred & ref).sum()) / denom, 4)
+    return scores
@@ -0,0 +1,147 @@
+"""
+Uncertainty Maps
+================
+Streams per-slice uncertainty (values in [0, 1]) from the model grid into
+a uint8 volume in the original scan space, writes it as a NIfTI with
+scl_slope = 1/255 (viewers show the [0, 1] values) and summarizes it from
+a 256-bin histogram.
+"""
+import gzip
+import numpy as np
+import torch
+import torch.nn.functional as F
+import nibabel as nib
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Quantization steps of the uint8 map
+LEVELS = 255
+
+
+class UncertaintyMap:
+    """Streams uncertainty batches into a uint8 (H, W, D) volume."""
+
+    def __init__(
+        self,
+        original_shape: Tuple[int, ...],
+        chunk_size: int = 16,
+        slice_offset: int = 0
+    ):
+        """
+        Initialize map.
+
+        Args:
+            original_shape: Original volume shape (H, W, D)
+            chunk_size: Slices resampled per step
+            slice_offset: Output slice index of the first model slice
+        """
+        self.original_shape = tuple(original_shape)
+        self.chunk_size = max(1, chunk_size)
+        self.slice_offset = slice_offset
+        self.output = np.zeros(self.original_shape, dtype=np.uint8)
+
+    def add(self, start: int, uncertainty: np.ndarray) -> None:
+        """
+        Resample a batch of slices (bilinear) and quantize them.
+
+        Args:
+            start: Model slice index of the first slice in the batch
+            uncertainty: Uncertainty (B, h, w) in [0, 1]
+        """
+        num_out_slices = self.original_shape[2]
+        height, width = self.original_shape[0], self.original_shape[1]
+
+        for offset in range(0, uncertainty.shape[0], self.chunk_size):
+            first = start + offset + self.slice_offset
+            count = min(self.chunk_size, uncertainty.shape[0] - offset, num_out_slices - first)
+            if count <= 0:
+                break
+            chunk = torch.from_numpy(
+                np.ascontiguousarray(uncertainty[offset:offset + count, None], dtype=np.float32)
+            )
+            resampled = F.interpolate(chunk, size=(height, width), mode="bilinear", align_corners=False)
+            quantized = resampled[:, 0].mul_(LEVELS).round_().clamp_(0, LEVELS).to(torch.uint8)
+            self.output[:, :, first:first + count] = quantized.numpy().transpose(1, 2, 0)
+
+    def result(self) -> np.ndarray:
+        """Get the uint8 map in the original (H, W, D) layout."""
+        return self.output
+
+    def write(
+        self,
+        path: Path,
+        affine: Optional[np.ndarray] = None,
+        header: Optional[nib.Nifti1Header] = None,
+        compression_level: int = 1
+    ) -> Path:
+        """
+        Write the map as gzip NIfTI in the source geometry.
+
+        Args:
+            path: Output path (.nii.gz)
+            affine: Source affine
+            header: Source NIfTI header
+            compression_level: gzip level (1 = fastest, 9 = smallest)
+
+        Returns:
+            Path of the written file
+        """
+        if affine is None:
+            affine = header.get_best_affine() if header is not None else np.eye(4)
+        img = nib.Nifti1Image(self.output, affine, header=header)
+        img.set_data_dtype(np.uint8)
+        img.header.set_slope_inter(1.0 / LEVELS, 0)
+        img.header.set_intent("estimate")
+        img.header["cal_min"], img.header["cal_max"] = 0, 1
+        with gzip.open(path, "wb", compresslevel=int(np.clip(compression_level, 0, 9))) as f:
+            img.to_stream(f)
+        logger.info(f"Uncertainty map written to {path} ({Path(path).stat().st_size} bytes)")
+        return Path(path)
+
+    def summary(self, mask: Optional[np.ndarray] = None, threshold: float = 0.5) -> Dict:
+        """
+        Summarize the map, overall and inside the predicted tumor.
+
+        Args:
+            mask: Label volume (H, W, D); voxels > 0 are tumor
+            threshold: Uncertainty above which a voxel counts as uncertain
+
+        Returns:
+            Dictionary with mean/p95 over all voxels and over tumor voxels,
+            and the fraction of uncertain tumor voxels
+        """
+        def stats(histogram: np.ndarray) -> Dict:
+            total = int(histogram.sum())
+            if total == 0:
+                return {'voxels': 0, 'mean': None, 'p95': None}
+            values = np.arange(LEVELS + 1) / LEVELS
+            p95 = int(np.searchsorted(np.cumsum(histogram), 0.95 * total))
+            return {
+                'voxels': total,
+                'mean': round(float((histogram * values).sum() / total), 4),
+                'p95': round(float(values[p95]), 4)
+            }
+
+        # Joint histogram (tumor, level), a chunk of slices at a time
+        histogram = np.zeros((2, LEVELS + 1), dtype=np.int64)
+        for d in range(0, self.output.shape[2], self.chunk_size):
+            levels = self.output[:, :, d:d + self.chunk_size].reshape(-1).astype(np.int64)
+            if mask is not None:
+                levels += (mask[:, :, d:d + self.chunk_size].reshape(-1) > 0) * (LEVELS + 1)
+            histogram += np.bincount(levels, minlength=2 * (LEVELS + 1)).reshape(2, -1)
+
+        tumor = histogram[1]
+        cutoff = int(np.floor(threshold * LEVELS)) + 1
+        tumor_total = int(tumor.sum())
+        return {
+            'all': stats(histogram.sum(axis=0)),
+            'tumor': stats(tumor),
+            'uncertain_tumor_fraction': (
+                round(float(tumor[cutoff:].sum() / tumor_total), 4) if tumor_total else None
+            ),
+            'threshold': threshold
+        }
@@ -0,0 +1,108 @@
+"""
+Segmentation Mask Writer
+========================
+Serializes label volumes in the geometry of the source scan. Supports
+uncompressed NIfTI, gzip NIfTI at a configurable (fast by default)
+compression level, and the packed "BSM1" label format for the viewer.
+"""
+import gzip
+import numpy as np
+import nibabel as nib
+import logging
+from pathlib import Path
+from typing import Optional
+
+from utils import mask_codec
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Output format -> file extension
+MASK_FORMATS = {
+    "nii": ".nii",
+    "nii.gz": ".nii.gz",
+    "bsm": ".bsm",
+}
+
+
+class MaskWriter:
+    """Writes uint8 label volumes to disk."""
+
+    def __init__(self, fmt: str = "nii.gz", compression_level: int = 1):
+        """
+        Initialize writer.
+
+        Args:
+            fmt: Output format ("nii", "nii.gz" or "bsm")
+            compression_level: gzip level for "nii.gz" (1 = fastest, 9 = smallest)
+        """
+        if fmt not in MASK_FORMATS:
+            raise ValueError(f"Unknown mask format '{fmt}'. Expected one of {list(MASK_FORMATS)}")
+        self.fmt = fmt
+        self.compression_level = int(np.clip(compression_level, 0, 9))
+
+    @property
+    def extension(self) -> str:
+        """File extension of the configured format."""
+        return MASK_FORMATS[self.fmt]
+
+    def to_nifti(
+        self,
+        volume: np.ndarray,
+        affine: Optional[np.ndarray] = None,
+        header: Optional[nib.Nifti1Header] = None
+    ) -> nib.Nifti1Image:
+        """
+        Wrap a label volume in a NIfTI image reusing the source geometry.
+
+        Args:
+            volume: Label volume (H, W, D) uint8
+            affine: Source affine (identity if omitted)
+            header: Source header; spacing, orientation and qform/sform are kept
+
+        Returns:
+            NIfTI image with uint8 label data and no intensity scaling
+        """
+        if affine is None:
+            affine = header.get_best_affine() if header is not None else np.eye(4)
+        img = nib.Nifti1Image(volume, affine, header=header)
+        img.set_data_dtype(np.uint8)
+        img.header.set_slope_inter(1, 0)
+        img.header.set_intent("label")
+        img.header["cal_min"], img.header["cal_max"] = 0, max(int(volume.max()), 1)
+        return img
+
+    def write(
+        self,
+        volume: np.ndarray,
+        path_without_ext: Path,
+        affine: Optional[np.ndarray] = None,
+        header: Optional[nib.Nifti1Header] = None
+    ) -> Path:
+        """
+        Write a label volume.
+
+        Args:
+            volume: Label volume (H, W, D) uint8
+            path_without_ext: Output path; the format's extension is appended
+            affine: Source affine
+            header: Source NIfTI header
+
+        Returns:
+            Path of the written file
+        """
+        path = Path(f"{path_without_ext}{self.extension}")
+
+        if self.fmt == "bsm":
+            if affine is None and header is not None:
+                affine = header.get_best_affine()
+            path.write_bytes(mask_codec.encode_mask(volume, affine))
+        elif self.fmt == "nii":
+            nib.save(self.to_nifti(volume, affine, header), path)
+        else:
+            img = self.to_nifti(volume, affine, header)
+            with gzip.open(path, "wb", compresslevel=self.compression_level) as f:
+                img.to_stream(f)
+
+        logger.info(f"Mask written to {path} ({path.stat().st_size} bytes, {self.fmt})")
+        return path
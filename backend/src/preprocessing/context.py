@@ -0,0 +1,80 @@
+"""
+2.5D Slice Context
+==================
+Builds k-slice context inputs as strided views over one contiguous,
+edge-padded preprocessed volume, so the model input takes O(volume)
+memory instead of O(k x volume).
+
+For a volume laid out (D + k - 1, C, H, W), sample j of the view is the
+(k * C, H, W) block starting at slice j. Channels are slice-major:
+[slice j-r: c0..cC-1, slice j-r+1: c0..cC-1, ...] with r = k // 2.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from typing import Tuple
+
+
+def allocate_padded(
+    num_slices: int,
+    channels: int,
+    height: int,
+    width: int,
+    context_slices: int = 1,
+    dtype=np.float32
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Allocate a volume with room for the context padding.
+
+    Args:
+        num_slices: Number of slices D
+        channels: Channels per slice
+        height: Slice height
+        width: Slice width
+        context_slices: Odd number of slices per sample (k)
+
+    Returns:
+        (padded buffer (D + k - 1, C, H, W), centre view (D, C, H, W)) -
+        fill the centre view, then call fill_edges
+    """
+    if context_slices < 1 or context_slices % 2 == 0:
+        raise ValueError(f"context_slices must be a positive odd number, got {context_slices}")
+    radius = context_slices // 2
+    padded = np.zeros((num_slices + 2 * radius, channels, height, width), dtype=dtype)
+    return padded, padded[radius:radius + num_slices]
+
+
+def fill_edges(padded: np.ndarray, context_slices: int) -> None:
+    """Replicate the first/last slice into the padding (in place)."""
+    radius = context_slices // 2
+    if radius == 0:
+        return
+    padded[:radius] = padded[radius]
+    padded[-radius:] = padded[-radius - 1]
+
+
+def context_view(padded: np.ndarray, context_slices: int) -> np.ndarray:
+    """
+    Strided (D, k * C, H, W) view over a padded volume (no copy).
+
+    Args:
+        padded: C-contiguous (D + k - 1, C, H, W) volume
+        context_slices: Slices per sample (k)
+
+    Returns:
+        Read-only view; sample j covers padded[j:j + k]
+    """
+    if context_slices == 1:
+        return padded
+    if not padded.flags['C_CONTIGUOUS']:
+        raise ValueError("context_view needs a C-contiguous volume")
+    total, channels, height, width = padded.shape
+    num_slices = total - (context_slices - 1)
+    slice_stride, channel_stride, row_stride, col_stride = padded.strides
+    # Consecutive slices are contiguous, so (slice, channel) merges into one
+    # axis with the channel stride
+    return as_strided(
+        padded,
+        shape=(num_slices, context_slices * channels, height, width),
+        strides=(slice_stride, channel_stride, row_stride, col_stride),
+        writeable=False
+    )
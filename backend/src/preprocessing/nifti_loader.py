@@ -12,6 +12,12 @@ from skimage.transform import resize
 from typing import Tuple, List, Optional, Dict
 import logging
 
+from utils.profiling import profile_stage
+from utils.deadline import checkpoint
+from preprocessing.context import allocate_padded, fill_edges, context_view
+from preprocessing.tensor_cache import TensorCache
+from preprocessing.normalization import IntensityNormalizer
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -56,7 +62,9 @@ class BraTSPreprocessor:
         target_size: Tuple[int, int] = (128, 128),
         volume_slices: int = 100,
         volume_start_at: int = 22,
-        num_classes: int = 4
+        num_classes: int = 4,
+        cache: Optional[TensorCache] = None,
+        normalizer: Optional[IntensityNormalizer] = None
     ):
         """
         Initialize preprocessor.
@@ -66,17 +74,24 @@ class BraTSPreprocessor:
             volume_slices: Number of slices to process
             volume_start_at: Starting slice index
             num_classes: Number of output classes
+            cache: Cache of preprocessed volumes used by preprocess_for_inference
+                   and preprocess_native (None = always preprocess)
+            normalizer: Intensity normalization (default: min-max, as in
+                        the notebook)
         """
         self.target_size = target_size
         self.volume_slices = volume_slices
         self.volume_start_at = volume_start_at
         self.num_classes = num_classes
+        self.cache = cache
+        self.normalizer = normalizer or IntensityNormalizer()
         
         logger.info(f"Preprocessor initialized:")
         logger.info(f"  Target size: {target_size}")
         logger.info(f"  Volume slices: {volume_slices}")
         logger.info(f"  Volume start: {volume_start_at}")
         logger.info(f"  Num classes: {num_classes}")
+        logger.info(f"  Normalization: {self.normalizer.strategy}")
         logger.info(f"  Input channels: 2 (flair, t1ce)")
     
     def load_nifti(self, filepath: str) -> np.ndarray:
@@ -89,9 +104,20 @@ class BraTSPreprocessor:
         Returns:
             Numpy array of image data
         """
+        return self.load_nifti_image(filepath).get_fdata()
+    
+    def load_nifti_image(self, filepath: str) -> nib.Nifti1Image:
+        """
+        Open a NIfTI file, keeping its header and affine.
+        
+        Args:
+            filepath: Path to NIfTI file
+        
+        Returns:
+            nibabel image (data is read lazily)
+        """
         try:
-            nii_img = nib.load(filepath)
-            return nii_img.get_fdata()
+            return nib.load(filepath)
         except Exception as e:
             logger.error(f"Failed to load NIfTI file {filepath}: {e}")
             raise
@@ -127,30 +153,36 @@ class BraTSPreprocessor:
         """
         return cv2.resize(slice_data, self.target_size, interpolation=cv2.INTER_AREA)
     
-    def preprocess_for_inference(
+    def _load_normalized_pair(
         self,
         flair_path: str,
-        t1ce_path: str
-    ) -> Dict:
+        t1ce_path: str,
+        normalization: Optional[Dict] = None
+    ) -> Tuple[np.ndarray, np.ndarray, nib.Nifti1Image, Dict]:
         """
-        Preprocess 2 modalities for model inference (matching Kaggle notebook).
+        Load FLAIR and T1CE, check their shapes agree and normalize both.
         
         Args:
             flair_path: Path to FLAIR NIfTI file
             t1ce_path: Path to T1CE NIfTI file
+            normalization: {modality: statistics} to apply instead of the
+                           volumes' own
         
         Returns:
-            Dictionary containing:
-                - 'model_input': Preprocessed data for model (VOLUME_SLICES, 2, H, W)
-                - 'original_shape': Original volume shape
-                - 'modalities': List of modality names
+            Normalized float32 (flair, t1ce) volumes of shape (H, W, D), the
+            FLAIR image whose header/affine describe the output geometry,
+            and the {modality: statistics} used (see
+            preprocessing/normalization.py)
         """
-        logger.info("Starting preprocessing for inference (2-channel)...")
-        
-        # Load 2 modalities (matching Kaggle notebook)
+        # Load 2 modalities (matching Kaggle notebook) as float32: half the
+        # memory of get_fdata's float64, and normalized in place below
         logger.info("Loading modalities (flair, t1ce)...")
-        flair = self.load_nifti(flair_path)
-        t1ce = self.load_nifti(t1ce_path)
+        with profile_stage("preprocess.load"):
+            checkpoint("preprocess.load")
+            reference = self.load_nifti_image(flair_path)
+            flair = reference.get_fdata(caching="unchanged", dtype=np.float32)
+            checkpoint("preprocess.load")
+            t1ce = self.load_nifti_image(t1ce_path).get_fdata(caching="unchanged", dtype=np.float32)
         
         original_shape = flair.shape
         logger.info(f"Original shape: {original_shape}")
@@ -164,38 +196,239 @@ class BraTSPreprocessor:
         
         # Normalize each modality
         logger.info("Normalizing modalities...")
-        flair = self.normalize_modality(flair)
-        t1ce = self.normalize_modality(t1ce)
+        with profile_stage("preprocess.normalize"):
+            checkpoint("preprocess.normalize")
+            if normalization is None:
+                normalization = {
+                    'flair': self.normalizer.compute(flair),
+                    't1ce': self.normalizer.compute(t1ce)
+                }
+            self.normalizer.apply(flair, normalization['flair'])
+            self.normalizer.apply(t1ce, normalization['t1ce'])
+        
+        return flair, t1ce, reference, normalization
+    
+    def _geometry(self, reference: nib.Nifti1Image) -> Dict:
+        """Geometry entries shared by the preprocessing results."""
+        return {
+            'affine': reference.affine,
+            'header': reference.header,
+            'voxel_spacing': tuple(float(z) for z in reference.header.get_zooms()[:3])
+        }
+    
+    def _cache_lookup(
+        self,
+        flair_path: str,
+        t1ce_path: str,
+        pipeline: str,
+        context_slices: int
+    ) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Find a study's preprocessed volume in the cache.
+        
+        Returns:
+            (cache key, result in the preprocess_* layout) - the result is
+            None on a miss, both are None without a cache
+        """
+        if self.cache is None:
+            return None, None
+        with profile_stage("preprocess.cache"):
+            key = self.cache.key(
+                flair_path, t1ce_path, pipeline,
+                target_size=list(self.target_size), context_slices=context_slices,
+                normalization=self.normalizer.params()
+            )
+            cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+        
+        padded, geometry = cached
+        radius = context_slices // 2
+        logger.info(f"Preprocessed volume loaded from cache ({key[:12]})")
+        return key, {
+            'model_input': context_view(padded, context_slices),
+            'volume': padded[radius:padded.shape[0] - radius],
+            'modalities': self.MODALITIES,
+            **geometry
+        }
+    
+    def _cache_store(self, key: Optional[str], padded: np.ndarray, result: Dict) -> None:
+        """Add a freshly preprocessed volume to the cache."""
+        if key is not None:
+            self.cache.put(key, padded, result)
+    
+    def preprocess_for_inference(
+        self,
+        flair_path: str,
+        t1ce_path: str,
+        context_slices: int = 1
+    ) -> Dict:
+        """
+        Preprocess 2 modalities for model inference (matching Kaggle notebook).
+        
+        Args:
+            flair_path: Path to FLAIR NIfTI file
+            t1ce_path: Path to T1CE NIfTI file
+            context_slices: Slices stacked per sample for 2.5D models (odd)
+        
+        Returns:
+            Dictionary containing:
+                - 'model_input': Preprocessed data for model (D, 2 * context_slices, H, W),
+                  a strided view over 'volume' when context_slices > 1
+                - 'volume': Preprocessed slices (D, 2, H, W)
+                - 'original_shape': Original volume shape
+                - 'modalities': List of modality names
+                - 'affine', 'header', 'voxel_spacing': Source geometry (FLAIR)
+                - 'normalization': {modality: statistics} of the intensity
+                  normalization
+        """
+        logger.info("Starting preprocessing for inference (2-channel)...")
+        
+        key, cached = self._cache_lookup(flair_path, t1ce_path, "resize", context_slices)
+        if cached is not None:
+            return cached
+        
+        flair, t1ce, reference, normalization = self._load_normalized_pair(flair_path, t1ce_path)
+        original_shape = flair.shape
         
         # Get number of slices from input volume
         # Typically (H, W, D), so shape[2] is depth/slices
         num_slices = flair.shape[2]
         
-        # Initialize output array: (num_slices, 2, H, W)
+        # Initialize output array: (num_slices, 2, H, W), inside a buffer
+        # padded by context_slices // 2 slices on each side for 2.5D input
         # Use all slices as requested by user
-        model_input = np.zeros(
-            (num_slices, 2, self.target_size[0], self.target_size[1]),
-            dtype=np.float32
+        padded, volume = allocate_padded(
+            num_slices, 2, self.target_size[0], self.target_size[1], context_slices
         )
         
         # Process each slice
         logger.info(f"Processing all {num_slices} slices...")
-        for j in range(num_slices):
-            # No offset, start from 0
-            
-            # Extract and resize each modality slice
-            # Channel 0: FLAIR
-            model_input[j, 0, :, :] = self.resize_slice(flair[:, :, j])
-            # Channel 1: T1CE
-            model_input[j, 1, :, :] = self.resize_slice(t1ce[:, :, j])
+        checkpoint("preprocess.resize")
+        with profile_stage("preprocess.resize"):
+            for j in range(num_slices):
+                # No offset, start from 0
+                
+                # Extract and resize each modality slice
+                # Channel 0: FLAIR
+                volume[j, 0, :, :] = self.resize_slice(flair[:, :, j])
+                # Channel 1: T1CE
+                volume[j, 1, :, :] = self.resize_slice(t1ce[:, :, j])
+        
+        fill_edges(padded, context_slices)
+        model_input = context_view(padded, context_slices)
         
         logger.info(f"Preprocessing complete. Output shape: {model_input.shape}")
         
-        return {
+        result = {
             'model_input': model_input,
+            'volume': volume,
             'original_shape': original_shape,
-            'modalities': self.MODALITIES
+            'modalities': self.MODALITIES,
+            'normalization': normalization,
+            **self._geometry(reference)
         }
+        self._cache_store(key, padded, result)
+        return result
+    
+    def preprocess_native(
+        self,
+        flair_path: str,
+        t1ce_path: str,
+        context_slices: int = 1
+    ) -> Dict:
+        """
+        Preprocess 2 modalities at native in-plane resolution.
+        Used by sliding-window inference, which tiles the full slices
+        instead of resizing them to the target size.
+        
+        Args:
+            flair_path: Path to FLAIR NIfTI file
+            t1ce_path: Path to T1CE NIfTI file
+            context_slices: Slices stacked per sample for 2.5D models (odd)
+        
+        Returns:
+            Dictionary containing:
+                - 'model_input': Normalized volume (D, 2 * context_slices, H, W),
+                  a strided view over 'volume' when context_slices > 1
+                - 'volume': Normalized slices (D, 2, H, W)
+                - 'original_shape': Original volume shape
+                - 'modalities': List of modality names
+                - 'affine', 'header', 'voxel_spacing': Source geometry (FLAIR)
+                - 'normalization': {modality: statistics} of the intensity
+                  normalization
+        """
+        logger.info("Starting native-resolution preprocessing (2-channel)...")
+        
+        key, cached = self._cache_lookup(flair_path, t1ce_path, "native", context_slices)
+        if cached is not None:
+            return cached
+        
+        flair, t1ce, reference, normalization = self._load_normalized_pair(flair_path, t1ce_path)
+        original_shape = flair.shape
+        
+        # (H, W, D) -> (D, 2, H, W)
+        checkpoint("preprocess.stack")
+        padded, volume = allocate_padded(
+            original_shape[2], 2, original_shape[0], original_shape[1], context_slices
+        )
+        volume[:, 0] = np.moveaxis(flair, 2, 0)
+        volume[:, 1] = np.moveaxis(t1ce, 2, 0)
+        
+        fill_edges(padded, context_slices)
+        model_input = context_view(padded, context_slices)
+        
+        logger.info(f"Preprocessing complete. Output shape: {model_input.shape}")
+        
+        result = {
+            'model_input': model_input,
+            'volume': volume,
+            'original_shape': original_shape,
+            'modalities': self.MODALITIES,
+            'normalization': normalization,
+            **self._geometry(reference)
+        }
+        self._cache_store(key, padded, result)
+        return result
+    
+    def preprocess_slices(
+        self,
+        flair_path: str,
+        t1ce_path: str,
+        normalization: Dict,
+        in_plane_shape: Optional[Tuple[int, int]] = None
+    ) -> np.ndarray:
+        """
+        Preprocess replacement slices for an already preprocessed volume.
+        
+        The slabs are normalized with the full volume's intensity statistics
+        (not their own) so they line up with the slices they replace.
+        
+        Args:
+            flair_path: FLAIR NIfTI file holding the slices (H, W, n)
+            t1ce_path: T1CE NIfTI file holding the slices (H, W, n)
+            normalization: {modality: statistics} of the original volume
+            in_plane_shape: Required (H, W) of the original volume
+        
+        Returns:
+            Preprocessed slices (n, 2, target H, target W)
+        """
+        flair, t1ce, _, _ = self._load_normalized_pair(flair_path, t1ce_path, normalization)
+        if flair.ndim == 2:
+            flair, t1ce = flair[:, :, None], t1ce[:, :, None]
+        if in_plane_shape is not None and tuple(flair.shape[:2]) != tuple(in_plane_shape):
+            raise ValueError(
+                f"Replacement slices are {flair.shape[0]}x{flair.shape[1]}, "
+                f"expected {in_plane_shape[0]}x{in_plane_shape[1]}"
+            )
+        
+        slices = np.empty(
+            (flair.shape[2], 2, self.target_size[0], self.target_size[1]), dtype=np.float32
+        )
+        for j in range(flair.shape[2]):
+            slices[j, 0] = self.resize_slice(flair[:, :, j])
+            slices[j, 1] = self.resize_slice(t1ce[:, :, j])
+        return slices
     
     def preprocess_with_segmentation(
         self,
@@ -254,33 +487,32 @@ class BraTSPreprocessor:
     ) -> np.ndarray:
         """
         Post-process model prediction back to original space.
+        Probabilities are resampled (bilinear) before the argmax, a chunk
+        of slices at a time.
         
         Args:
-            prediction: Model output (VOLUME_SLICES, 4, H, W)
+            prediction: Model output (num_slices, 4, H, W)
             original_shape: Original volume shape (H, W, D)
             target_orientation: Target orientation
         
         Returns:
             Resized prediction in original space
         """
-        # Get class predictions
-        class_mask = np.argmax(prediction, axis=1)  # (VOLUME_SLICES, H, W)
+        from postprocessing.resample import ProbabilityResampler
         
-        # Resize back to original dimensions
-        output_volume = np.zeros(original_shape, dtype=np.uint8)
+        # Whole-volume predictions map slice j to slice j; shorter ones
+        # cover VOLUME_SLICES slices starting at VOLUME_START_AT
+        slice_offset = 0 if prediction.shape[0] >= original_shape[2] else self.volume_start_at
         
-        for j in range(min(self.volume_slices, original_shape[2] - self.volume_start_at)):
-            slice_pos = j + self.volume_start_at
-            if slice_pos < original_shape[2]:
-                # Resize slice back to original size
-                resized_slice = cv2.resize(
-                    class_mask[j].astype(np.float32),
-                    (original_shape[0], original_shape[1]),
-                    interpolation=cv2.INTER_NEAREST
-                )
-                output_volume[:, :, slice_pos] = resized_slice.astype(np.uint8)
+        resampler = ProbabilityResampler(
+            original_shape,
+            num_classes=prediction.shape[1],
+            slice_offset=slice_offset,
+            keep_low_res=False
+        )
+        resampler.add(0, prediction)
         
-        return output_volume
+        return resampler.result()
 
 
 def load_and_preprocess_2channel(
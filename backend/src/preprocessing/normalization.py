@@ -0,0 +1,173 @@
+"""
+Intensity Normalization
+=======================
+Per-modality intensity normalization strategies:
+
+- "minmax": (x - min) / (max - min) over the whole volume, as in the
+  notebook the model was trained with.
+- "percentile": the same with the range taken from low/high percentiles
+  of the brain voxels and clipped to [0, 1], so a few hot voxels cannot
+  squash the dynamic range.
+- "zscore": (x - mean) / std of the brain voxels; background stays 0.
+
+Brain voxels are the non-zero ones (BraTS volumes are skull-stripped).
+Volumes are normalized in place in float32. Percentiles and z-score
+moments are estimated from a strided subsample of at most
+NORMALIZATION_SAMPLE_VOXELS voxels, which is deterministic and avoids
+sorting the whole volume.
+
+Statistics are plain dicts ({"strategy", "center", "scale"}) so they can
+travel with preprocessing results, cached tensors and result records, and
+slices normalized later line up with their volume.
+"""
+import logging
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("minmax", "percentile", "zscore")
+
+# Elements per block of the single-pass min/max (fits in L2 cache)
+MINMAX_BLOCK = 1 << 16
+
+
+def min_max(data: np.ndarray) -> Tuple[float, float]:
+    """
+    Minimum and maximum in one pass over memory.
+
+    Both reductions run on each cache-sized block before moving on, instead
+    of two full passes over the volume.
+    """
+    # Memory order: a view for the Fortran-ordered arrays nibabel returns
+    flat = data.ravel(order="K")
+    low, high = np.inf, -np.inf
+    for start in range(0, flat.size, MINMAX_BLOCK):
+        block = flat[start:start + MINMAX_BLOCK]
+        # np.minimum/maximum propagate NaN like a whole-array reduction
+        low = np.minimum(low, block.min())
+        high = np.maximum(high, block.max())
+    return float(low), float(high)
+
+
+def as_stats(value: Union[Dict, Sequence[float]]) -> Dict:
+    """
+    Statistics dict from compute(), or from a legacy [min, max] range.
+    """
+    if isinstance(value, dict):
+        return value
+    data_min, data_max = value
+    return {"strategy": "minmax", "center": float(data_min), "scale": float(data_max) - float(data_min)}
+
+
+class IntensityNormalizer:
+    """Computes and applies per-volume intensity normalization."""
+
+    def __init__(
+        self,
+        strategy: str = "minmax",
+        percentiles: Tuple[float, float] = (0.5, 99.5),
+        sample_voxels: int = 1_000_000
+    ):
+        """
+        Initialize normalizer.
+
+        Args:
+            strategy: One of STRATEGIES
+            percentiles: (low, high) percentiles for the "percentile" strategy
+            sample_voxels: Maximum voxels sampled for percentiles and moments
+
+        Raises:
+            ValueError: On an unknown strategy or invalid percentiles
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown normalization strategy '{strategy}'. Valid: {', '.join(STRATEGIES)}")
+        low, high = percentiles
+        if not 0 <= low < high <= 100:
+            raise ValueError(f"Invalid normalization percentiles: {percentiles}")
+        self.strategy = strategy
+        self.percentiles = (float(low), float(high))
+        self.sample_voxels = max(1, int(sample_voxels))
+
+    def params(self) -> Dict:
+        """Settings the normalized volume depends on (part of cache keys)."""
+        params = {"strategy": self.strategy}
+        if self.strategy != "minmax":
+            params["sample_voxels"] = self.sample_voxels
+        if self.strategy == "percentile":
+            params["percentiles"] = list(self.percentiles)
+        return params
+
+    def _brain_sample(self, data: np.ndarray) -> np.ndarray:
+        """Non-zero voxels of a strided subsample of the volume."""
+        # Memory order: a view for the Fortran-ordered arrays nibabel returns
+        flat = data.ravel(order="K")
+        step = max(1, flat.size // self.sample_voxels)
+        sample = flat[::step]
+        return sample[sample != 0]
+
+    def compute(self, data: np.ndarray) -> Dict:
+        """
+        Statistics of one modality volume.
+
+        Args:
+            data: Modality volume (float32 recommended)
+
+        Returns:
+            {"strategy", "center", "scale"}: normalized = (x - center) / scale
+        """
+        if self.strategy == "minmax":
+            low, high = min_max(data)
+            return {"strategy": self.strategy, "center": low, "scale": high - low}
+
+        sample = self._brain_sample(data)
+        if sample.size == 0:
+            # Empty volume: leave the data as it is
+            return {"strategy": self.strategy, "center": 0.0, "scale": 0.0}
+        if self.strategy == "percentile":
+            low, high = np.percentile(sample, self.percentiles)
+            return {"strategy": self.strategy, "center": float(low), "scale": float(high - low)}
+        return {
+            "strategy": self.strategy,
+            "center": float(sample.mean(dtype=np.float64)),
+            "scale": float(sample.std(dtype=np.float64))
+        }
+
+    @staticmethod
+    def apply(data: np.ndarray, stats: Union[Dict, Sequence[float]]) -> np.ndarray:
+        """
+        Normalize a volume in place.
+
+        Args:
+            data: Writable float32 volume (or slices of one)
+            stats: Statistics from compute(), possibly of another volume
+
+        Returns:
+            data, normalized
+        """
+        stats = as_stats(stats)
+        strategy, center, scale = stats["strategy"], stats["center"], stats["scale"]
+        background = data == 0 if strategy == "zscore" else None
+
+        # Constant volumes are left unchanged, as before
+        if scale > 0:
+            np.subtract(data, center, out=data)
+            np.divide(data, scale, out=data)
+            if strategy == "percentile":
+                np.clip(data, 0.0, 1.0, out=data)
+        if background is not None:
+            data[background] = 0.0
+        return data
+
+
+def get_normalizer() -> IntensityNormalizer:
+    """Normalizer configured by the NORMALIZATION_* settings."""
+    return IntensityNormalizer(
+        settings.NORMALIZATION_STRATEGY,
+        percentiles=settings.NORMALIZATION_PERCENTILES,
+        sample_voxels=settings.NORMALIZATION_SAMPLE_VOXELS
+    )
@@ -0,0 +1,247 @@
+"""
+Preprocessed Tensor Cache
+=========================
+Caches preprocessed model inputs on disk so re-running a study (another
+model, TTA setting or class filter) skips decoding, normalization and
+resizing.
+
+Entries are keyed by the content hash of the FLAIR and T1CE files plus
+everything that shapes the tensor (pipeline, target size, context slices,
+normalization settings).
+Each entry is a padded (D + k - 1, 2, H, W) volume saved as .npy, loaded
+back as a copy-on-write memory map so a hit costs page-cache reads rather
+than a copy, and a .json sidecar with the source geometry.
+
+Files are written atomically, so worker processes can share one cache
+directory. Hits refresh the entry's mtime; the least recently used
+entries are removed while the cache exceeds its size limit.
+"""
+import os
+import json
+import base64
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import nibabel as nib
+
+from utils.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when preprocessing changes so stale tensors are never reused
+PREPROCESS_VERSION = 3
+
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def content_hash(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def geometry_to_json(result: Dict) -> Dict:
+    """
+    JSON form of a preprocessing result's geometry.
+
+    Args:
+        result: Result of a BraTSPreprocessor.preprocess_* method
+
+    Returns:
+        'original_shape', 'affine', 'voxel_spacing', 'normalization' and the
+        source header (class name and base64 binary block)
+    """
+    header = result['header']
+    return {
+        "original_shape": list(result['original_shape']),
+        "affine": np.asarray(result['affine']).tolist(),
+        "voxel_spacing": list(result['voxel_spacing']),
+        "normalization": result.get('normalization'),
+        "header_class": type(header).__name__,
+        "header": base64.b64encode(header.binaryblock).decode()
+    }
+
+
+def geometry_from_json(meta: Dict) -> Dict:
+    """Inverse of geometry_to_json."""
+    header_class = getattr(nib, meta["header_class"])
+    return {
+        'original_shape': tuple(meta["original_shape"]),
+        'affine': np.array(meta["affine"]),
+        'header': header_class(binaryblock=base64.b64decode(meta["header"])),
+        'voxel_spacing': tuple(meta["voxel_spacing"]),
+        'normalization': meta.get("normalization")
+    }
+
+
+class TensorCache:
+    """LRU cache of preprocessed volumes as memory-mappable .npy files."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        """
+        Initialize cache.
+
+        Args:
+            root: Cache directory
+            max_bytes: Size limit of the cached tensors (0 = unbounded)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, flair_path: str, t1ce_path: str, pipeline: str, **params) -> str:
+        """
+        Cache key of a study under the given preprocessing settings.
+
+        Args:
+            flair_path: Path to FLAIR NIfTI file
+            t1ce_path: Path to T1CE NIfTI file
+            pipeline: Preprocessing method ("resize" or "native")
+            **params: Settings the tensor depends on
+
+        Returns:
+            Hex key
+        """
+        description = json.dumps({
+            "version": PREPROCESS_VERSION,
+            "flair": content_hash(flair_path),
+            "t1ce": content_hash(t1ce_path),
+            "pipeline": pipeline,
+            **params
+        }, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()[:32]
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.root / f"{key}.npy", self.root / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, Dict]]:
+        """
+        Look up a padded volume.
+
+        Returns:
+            (copy-on-write memory-mapped padded volume, geometry in the
+            preprocessing result layout), or None
+        """
+        tensor_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            padded = np.load(tensor_path, mmap_mode="c")
+            geometry = geometry_from_json(meta)
+            os.utime(tensor_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable preprocessing cache entry {key}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return padded, geometry
+
+    def put(self, key: str, padded: np.ndarray, geometry: Dict) -> None:
+        """
+        Store a padded volume and its geometry, then evict over the limit.
+
+        Args:
+            key: Cache key
+            padded: Padded (D + k - 1, C, H, W) volume
+            geometry: Preprocessing result holding the geometry entries
+        """
+        tensor_path, meta_path = self._paths(key)
+        meta = geometry_to_json(geometry)
+        staged = []
+        try:
+            # Unique temp files per writer (threads of one process too).
+            # Tensor first: get() reads the sidecar first, so an entry
+            # counts once its sidecar exists
+            with tempfile.NamedTemporaryFile(
+                dir=self.root, prefix=f"{tensor_path.name}.", suffix=".tmp", delete=False
+            ) as f:
+                staged.append(Path(f.name))
+                np.save(f, padded)
+            os.replace(staged[-1], tensor_path)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.root, prefix=f"{meta_path.name}.", suffix=".tmp", delete=False
+            ) as f:
+                staged.append(Path(f.name))
+                json.dump(meta, f)
+            os.replace(staged[-1], meta_path)
+        except OSError as e:
+            logger.warning(f"Could not cache preprocessed volume: {e}")
+            for path in staged:
+                path.unlink(missing_ok=True)
+            return
+        self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every cached tensor."""
+        entries = []
+        for path in self.root.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries while over the size limit.
+
+        Returns:
+            Number of entries removed
+        """
+        if not self.max_bytes:
+            return 0
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # Sidecar first, so get() never finds it without its tensor;
+            # open memory maps stay valid after unlink
+            path.with_suffix(".json").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} preprocessed volume(s) from cache")
+        return removed
+
+    def status(self) -> Dict:
+        """Size and hit counts for health checks."""
+        sizes = [size for _, size, _ in self._entries()]
+        return {
+            'entries': len(sizes),
+            'total_bytes': sum(sizes),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+_cache: Optional[TensorCache] = None
+
+
+def get_tensor_cache() -> Optional[TensorCache]:
+    """Get or create the cache singleton (None when disabled)."""
+    global _cache
+    if _cache is None and settings.PREPROCESS_CACHE:
+        _cache = TensorCache(
+            settings.PREPROCESS_CACHE_DIR,
+            max_bytes=int(settings.PREPROCESS_CACHE_MB * 1024 * 1024)
+        )
+    return _cache
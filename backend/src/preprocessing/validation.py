@@ -0,0 +1,179 @@
+"""
+Upload Validation
+=================
+Header-only checks of a FLAIR/T1CE pair, run before anything is decoded
+or queued so malformed and mismatched studies fail in milliseconds.
+
+Only the NIfTI header is read (348 bytes, 540 for NIfTI-2): for .nii.gz
+files that is the start of the first deflate block. Each file must
+- be gzip-compressed exactly when named .gz (the loader picks its
+  opener from the name),
+- hold a single-file NIfTI-1/2 header,
+- describe a 3D volume of at most MAX_VOLUME_VOXELS voxels,
+- use a real-valued data type,
+- have finite, positive voxel spacing,
+- be large enough for the data its header describes.
+Both files must agree on shape and, within SPACING_TOLERANCE, on spacing.
+"""
+import os
+import gzip
+import zlib
+import logging
+from pathlib import Path
+from typing import Dict, Union
+
+import numpy as np
+import nibabel as nib
+from nibabel.spatialimages import HeaderDataError
+
+from utils.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# sizeof_hdr -> header class
+HEADER_CLASSES = {348: nib.Nifti1Header, 540: nib.Nifti2Header}
+
+# Deflate cannot compress by more than ~1032:1, so a smaller .nii.gz
+# cannot hold the volume its header describes
+MAX_DEFLATE_RATIO = 1032
+
+# Relative voxel spacing difference tolerated between modalities
+SPACING_TOLERANCE = 0.01
+
+
+def read_header(path: Union[str, Path]) -> nib.Nifti1Header:
+    """
+    Read a NIfTI file's header without touching the image data.
+
+    Args:
+        path: .nii or .nii.gz file
+
+    Returns:
+        Nifti1Header or Nifti2Header
+
+    Raises:
+        ValueError: If the file is not a single-file NIfTI image
+    """
+    path = str(path)
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed != path.lower().endswith(".gz"):
+        raise ValueError(
+            "file is gzip-compressed but not named .nii.gz" if compressed
+            else "file is named .gz but is not gzip-compressed"
+        )
+
+    opener = gzip.open if compressed else open
+    try:
+        with opener(path, "rb") as f:
+            raw = f.read(max(HEADER_CLASSES))
+    except (OSError, EOFError, zlib.error) as e:
+        raise ValueError(f"corrupt gzip stream ({e})")
+
+    header_class = None
+    if len(raw) >= 4:
+        for byteorder in ("little", "big"):
+            header_class = HEADER_CLASSES.get(int.from_bytes(raw[:4], byteorder))
+            if header_class is not None:
+                break
+    if header_class is None or len(raw) < header_class.template_dtype.itemsize:
+        raise ValueError("not a NIfTI file")
+
+    header = header_class(binaryblock=raw[:header_class.template_dtype.itemsize], check=False)
+    # "n+1\0" (NIfTI-1) or "n+2\0\r\n\032\n" (NIfTI-2) for single files
+    magic = header['magic'].item()[:3]
+    if magic in (b"ni1", b"ni2"):
+        raise ValueError("separate header/image (.hdr/.img) files are not supported")
+    if magic not in (b"n+1", b"n+2"):
+        raise ValueError("not a NIfTI file (bad magic)")
+    return header
+
+
+def validate_header(path: Union[str, Path]) -> Dict:
+    """
+    Check one NIfTI file from its header.
+
+    Args:
+        path: .nii or .nii.gz file
+
+    Returns:
+        {'shape', 'dtype', 'voxel_spacing', 'compressed'}
+
+    Raises:
+        ValueError: If the file cannot be a usable modality volume
+    """
+    header = read_header(path)
+
+    try:
+        shape = tuple(int(d) for d in header.get_data_shape())
+        dtype = header.get_data_dtype()
+    except HeaderDataError as e:
+        raise ValueError(f"invalid header ({e})")
+    if len(shape) != 3:
+        raise ValueError(f"expected a 3D volume, got shape {shape}")
+    voxels = int(np.prod(shape))
+    if voxels == 0:
+        raise ValueError(f"empty volume of shape {shape}")
+    if voxels > settings.MAX_VOLUME_VOXELS:
+        raise ValueError(
+            f"volume of shape {shape} has {voxels} voxels, "
+            f"more than the maximum of {settings.MAX_VOLUME_VOXELS}"
+        )
+    if dtype.kind not in "iuf":
+        raise ValueError(f"unsupported data type {header.get_value_label('datatype')}")
+
+    spacing = tuple(float(z) for z in header.get_zooms()[:3])
+    if not all(np.isfinite(z) and z > 0 for z in spacing):
+        raise ValueError(f"invalid voxel spacing {spacing}")
+
+    # Data starts at vox_offset and runs for voxels * itemsize bytes
+    expected = int(header['vox_offset']) + voxels * dtype.itemsize
+    size = os.path.getsize(path)
+    compressed = str(path).lower().endswith(".gz")
+    if not compressed and size < expected:
+        raise ValueError(f"truncated file: the header describes {expected} bytes, the file has {size}")
+    if compressed and size * MAX_DEFLATE_RATIO < expected:
+        raise ValueError(f"a {size}-byte .nii.gz cannot hold the {shape} volume its header describes")
+
+    return {
+        'shape': shape,
+        'dtype': dtype.name,
+        'voxel_spacing': spacing,
+        'compressed': compressed
+    }
+
+
+def validate_pair(flair_path: Union[str, Path], t1ce_path: Union[str, Path]) -> Dict:
+    """
+    Check a FLAIR/T1CE pair from the headers alone.
+
+    Args:
+        flair_path: FLAIR NIfTI file
+        t1ce_path: T1CE NIfTI file
+
+    Returns:
+        validate_header() result of the FLAIR file
+
+    Raises:
+        ValueError: Naming the modality and the problem
+    """
+    infos = {}
+    for modality, path in (("flair", flair_path), ("t1ce", t1ce_path)):
+        try:
+            infos[modality] = validate_header(path)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Invalid {modality.upper()} file: {e}")
+
+    flair, t1ce = infos['flair'], infos['t1ce']
+    if t1ce['shape'] != flair['shape']:
+        raise ValueError(f"Shape mismatch: t1ce has shape {t1ce['shape']}, expected {flair['shape']}")
+    for a, b in zip(flair['voxel_spacing'], t1ce['voxel_spacing']):
+        if abs(a - b) > SPACING_TOLERANCE * max(a, b):
+            raise ValueError(
+                f"Voxel spacing mismatch: t1ce has spacing {t1ce['voxel_spacing']}, "
+                f"expected {flair['voxel_spacing']}"
+            )
+    return flair
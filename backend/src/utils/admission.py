@@ -0,0 +1,302 @@
+"""
+Admission Control
+=================
+Cost-based admission and per-client fair queuing for prediction requests.
+
+- Cost: megavoxels x forward variants (TTA flips, dropout samples) x mode
+  factor. Before the body is read it is estimated from Content-Length;
+  once the volumes are on disk the exact cost is settled against the
+  client's bucket.
+- Token buckets: every client has a bucket refilled at `rate` units/s up
+  to `burst`. A request is admitted while the bucket is positive and then
+  charged in full (the bucket may go into debt), so large studies are
+  never starved but are paid back before the client's next request.
+- Weighted fair queuing: admitted requests wait for one of `concurrency`
+  inference slots, ordered by virtual finish time (start tag + cost /
+  weight per client), so a client's burst queues behind its own earlier
+  requests instead of in front of everyone else's.
+- Shedding: a client in debt gets 429, a full queue 503, both with
+  Retry-After and before the upload is read.
+
+State is per process. Under gunicorn every worker has its own controller,
+so the configured limits are split evenly across SERVER_WORKERS; the
+kernel spreads connections over the workers, so each sees about its share
+of every client's traffic.
+"""
+import time
+import heapq
+import asyncio
+import itertools
+import ipaddress
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Relative cost of an inference mode per input voxel
+MODE_COST = {
+    "resize": 1.0,
+    "sliding_window": 2.0,
+    "multiplanar": 3.0
+}
+
+# Idle entries are pruned once a table grows past this many clients
+MAX_TRACKED_CLIENTS = 10000
+
+
+def estimate_cost(
+    voxels: float,
+    tta_count: int = 0,
+    mode: str = "resize",
+    mc_samples: int = 0
+) -> float:
+    """
+    Estimate the cost of one study.
+
+    Args:
+        voxels: Voxels of one input volume
+        tta_count: TTA flips besides the identity
+        mode: Inference mode
+        mc_samples: MC-dropout samples (0 = deterministic)
+
+    Returns:
+        Cost in megavoxel-passes
+    """
+    variants = (tta_count + 1) * max(1, mc_samples)
+    return voxels / 1e6 * variants * MODE_COST.get(mode, 1.0)
+
+
+class TokenBucket:
+    """Token bucket that admits while positive and may go into debt."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self) -> float:
+        """Add the tokens earned since the last update."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def take(self, cost: float) -> Optional[float]:
+        """
+        Charge a request.
+
+        Returns:
+            None if admitted, otherwise seconds until the bucket is positive
+        """
+        if self.refill() <= 0:
+            return -self.tokens / self.rate if self.rate > 0 else 60.0
+        self.tokens -= cost
+        return None
+
+
+class FairQueue:
+    """Weighted fair queue in front of a fixed number of slots (asyncio)."""
+
+    def __init__(self, concurrency: int = 1):
+        self.concurrency = max(1, concurrency)
+        self.active = 0
+        self.queued = 0
+        self.virtual_time = 0.0
+        # client -> finish tag of its latest request
+        self._finish: Dict[str, float] = {}
+        # (finish tag, sequence, future)
+        self._waiting: List[Tuple[float, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    def _release(self) -> None:
+        """Free a slot and hand it to the waiter with the smallest tag."""
+        self.active -= 1
+        while self._waiting and self.active < self.concurrency:
+            tag, _, future = heapq.heappop(self._waiting)
+            if future.cancelled():
+                continue
+            self.queued -= 1
+            self.active += 1
+            self.virtual_time = max(self.virtual_time, tag)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, client: str, cost: float, weight: float = 1.0):
+        """
+        Hold an inference slot for the enclosed block.
+
+        Args:
+            client: Client key
+            cost: Request cost
+            weight: Client share (higher = more throughput)
+        """
+        if len(self._finish) > MAX_TRACKED_CLIENTS:
+            self._finish = {c: t for c, t in self._finish.items() if t > self.virtual_time}
+        tag = max(self.virtual_time, self._finish.get(client, 0.0)) + cost / max(weight, 1e-6)
+        self._finish[client] = tag
+
+        if self.active < self.concurrency and not self.queued:
+            self.active += 1
+            self.virtual_time = max(self.virtual_time, tag)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (tag, next(self._sequence), future))
+            self.queued += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just before cancellation
+                    self._release()
+                else:
+                    self.queued -= 1
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+
+class AdmissionController:
+    """Per-client token buckets in front of a weighted fair queue."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        concurrency: int = 1,
+        max_queued: int = 32,
+        bytes_per_voxel: float = 2.0
+    ):
+        """
+        Initialize controller.
+
+        Args:
+            rate: Bucket refill per client (cost units per second)
+            burst: Bucket capacity per client
+            concurrency: Requests running inference at once
+            max_queued: Requests allowed to wait for a slot
+            bytes_per_voxel: Upload bytes per voxel assumed for estimates
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_queued = max_queued
+        self.bytes_per_voxel = bytes_per_voxel
+        self.queue = FairQueue(concurrency)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.shed = {"client": 0, "overload": 0}
+
+    def _bucket(self, client: str) -> TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                # Full buckets carry no state worth keeping
+                self._buckets = {c: b for c, b in self._buckets.items() if b.refill() < b.burst}
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def estimate_upload_cost(self, content_length: int) -> float:
+        """Estimate a request's cost from its body size (server defaults for options)."""
+        tta = settings.TTA_TRANSFORMS
+        tta_count = 0 if tta in ("", "none") else len([n for n in tta.split(",") if n.strip()])
+        mc_samples = settings.MC_DROPOUT_SAMPLES if settings.UNCERTAINTY_MODE == "mc_dropout" else 0
+        return estimate_cost(
+            content_length / self.bytes_per_voxel, tta_count, settings.INFERENCE_MODE, mc_samples
+        )
+
+    def admit(self, client: str, cost: float) -> Optional[Tuple[int, str, float]]:
+        """
+        Decide on a request before its body is read, charging the client.
+
+        Args:
+            client: Client key
+            cost: Estimated cost
+
+        Returns:
+            None if admitted, else (status code, detail, retry-after seconds)
+        """
+        if self.queue.queued >= self.max_queued:
+            self.shed["overload"] += 1
+            return 503, "Server busy, try again later", 1.0
+        retry_after = self._bucket(client).take(cost)
+        if retry_after is not None:
+            self.shed["client"] += 1
+            return 429, "Too many requests from this client", retry_after
+        return None
+
+    def settle(self, client: str, estimated: float, actual: float) -> None:
+        """Charge (or refund) the difference between estimated and actual cost."""
+        bucket = self._bucket(client)
+        bucket.refill()
+        bucket.tokens = min(bucket.burst, bucket.tokens - (actual - estimated))
+
+    def slot(self, client: str, cost: float):
+        """Fair-queued inference slot (async context manager)."""
+        return self.queue.slot(client, cost)
+
+    def status(self) -> Dict:
+        """Queue state for health checks."""
+        return {
+            "active": self.queue.active,
+            "queued": self.queue.queued,
+            "concurrency": self.queue.concurrency,
+            "clients": len(self._buckets),
+            "shed": dict(self.shed)
+        }
+
+
+def _peer_trusted(host: Optional[str]) -> bool:
+    """Whether the peer is a proxy allowed to name the client (see settings)."""
+    global _trusted_networks
+    if _trusted_networks is None:
+        _trusted_networks = [
+            ipaddress.ip_network(entry.strip(), strict=False)
+            for entry in settings.ADMISSION_TRUSTED_PROXIES.split(",")
+            if entry.strip()
+        ]
+    if not _trusted_networks:
+        return False
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_networks)
+
+
+def client_key(request) -> str:
+    """
+    Client identity: the configured header if sent by a trusted proxy,
+    else the peer address.
+    """
+    host = request.client.host if request.client else None
+    if settings.ADMISSION_CLIENT_HEADER and _peer_trusted(host):
+        value = request.headers.get(settings.ADMISSION_CLIENT_HEADER)
+        if value:
+            return f"key:{value}"
+    return f"ip:{host or 'unknown'}"
+
+
+_trusted_networks: Optional[List] = None
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Get or create the controller singleton (None when disabled)."""
+    global _controller
+    if _controller is None and settings.ADMISSION_CONTROL:
+        # This process's share of the limits (see module docstring)
+        workers = settings.SERVER_WORKERS
+        concurrency = settings.ADMISSION_CONCURRENCY or max(1, settings.INFERENCE_WORKERS)
+        _controller = AdmissionController(
+            rate=settings.ADMISSION_RATE / workers,
+            burst=settings.ADMISSION_BURST / workers,
+            concurrency=max(1, concurrency // workers),
+            max_queued=max(1, settings.ADMISSION_MAX_QUEUED // workers),
+            bytes_per_voxel=settings.ADMISSION_BYTES_PER_VOXEL
+        )
+    return _controller
@@ -0,0 +1,352 @@
+"""
+Artifact Store
+==============
+Bounded storage for prediction outputs (masks, uncertainty maps, overlays).
+
+- Layout: OUTPUT_DIR/<shard>/<name>, sharded by the first two hex digits
+  of the artifact id ("segmentation_3fa2...nii.gz" -> "3f/"), so no
+  directory grows past a few thousand entries. Names (and /outputs/<name>
+  URLs) stay flat.
+- Index: SQLite (WAL) next to the shards with size, media type, creation
+  and last-access time per artifact; safe to share between worker
+  processes.
+- Eviction: artifacts older than the TTL are removed, then the least
+  recently accessed ones until the store fits its quota. Runs in a
+  background thread and whenever a write pushes the store over quota.
+"""
+import os
+import re
+import time
+import sqlite3
+import mimetypes
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "<kind>_<hex id><extensions>"; writers that append their own extension
+# are handed the stem
+ARTIFACT_NAME = re.compile(r"^(?P<kind>[a-z]+)_(?P<id>[0-9a-f]{2,})(?P<ext>(\.[a-z0-9]+)*)$")
+
+MEDIA_TYPES = {
+    ".nii.gz": "application/gzip",
+    ".nii": "application/octet-stream",
+    ".bsm": "application/x-bsm",
+    ".png": "image/png",
+}
+
+# Marker of files being written before publish(): "<kind>_<id>.tmp<hex><ext>"
+STAGING_MARKER = re.compile(r"\.tmp[0-9a-f]+")
+
+# Last-access times are only rewritten when older than this (seconds), so
+# range requests do not turn into one index write each
+ACCESS_RESOLUTION_S = 60.0
+
+# Files in shard directories without an index row (interrupted writes)
+# are removed after this many seconds
+ORPHAN_GRACE_S = 3600.0
+
+
+def media_type(name: str) -> str:
+    """Content type of an artifact from its extension."""
+    for ext, media in MEDIA_TYPES.items():
+        if name.endswith(ext):
+            return media
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+class ArtifactStore:
+    """Sharded output directory with a metadata index, TTL and quota."""
+
+    def __init__(self, root: Path, ttl_s: float = 0, quota_bytes: int = 0):
+        """
+        Open (or create) a store.
+
+        Args:
+            root: Store directory
+            ttl_s: Maximum artifact age in seconds (0 = no TTL)
+            quota_bytes: Maximum total size in bytes (0 = no quota)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s
+        self.quota_bytes = quota_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            " name TEXT PRIMARY KEY, size INTEGER NOT NULL, media_type TEXT NOT NULL,"
+            " created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS artifacts_access ON artifacts (last_access)")
+        self._db.commit()
+        self._adopt_flat_files()
+
+    @staticmethod
+    def _shard(name: str) -> str:
+        match = ARTIFACT_NAME.match(name)
+        if not match:
+            raise ValueError(f"Invalid artifact name: {name}")
+        return match["id"][:2]
+
+    def path(self, name: str) -> Path:
+        """
+        Path of an artifact (its shard directory is created).
+
+        Args:
+            name: Artifact name, or its stem for writers that add the extension
+
+        Raises:
+            ValueError: If the name is not an artifact name
+        """
+        directory = self.root / self._shard(name)
+        directory.mkdir(exist_ok=True)
+        return directory / name
+
+    def staging_path(self, name: str) -> Path:
+        """
+        Path to write an artifact at before publishing it.
+
+        Args:
+            name: Artifact name, or its stem for writers that add the extension
+
+        Returns:
+            Unique path in the artifact's shard keeping its extension
+        """
+        match = ARTIFACT_NAME.match(name)
+        if not match:
+            raise ValueError(f"Invalid artifact name: {name}")
+        return self.path(f"{match['kind']}_{match['id']}.tmp{os.urandom(4).hex()}{match['ext']}")
+
+    def publish(self, staged: Path) -> Path:
+        """
+        Move a file written to staging_path() into place and index it.
+
+        The rename is atomic, so replacing an existing artifact never
+        exposes a partly written file.
+
+        Returns:
+            Final artifact path
+        """
+        staged = Path(staged)
+        target = staged.with_name(STAGING_MARKER.sub("", staged.name, count=1))
+        os.replace(staged, target)
+        self.register(target)
+        return target
+
+    def register(self, path: Path) -> str:
+        """
+        Index a file written to path(name).
+
+        Returns:
+            Artifact name
+        """
+        path = Path(path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (path.name, path.stat().st_size, media_type(path.name), now, now)
+            )
+            self._db.commit()
+        if self.quota_bytes and self.total_size() > self.quota_bytes:
+            self.evict()
+        return path.name
+
+    def lookup(self, name: str, touch: bool = True) -> Optional[Dict]:
+        """
+        Find an artifact.
+
+        Args:
+            name: Artifact name
+            touch: Record the access for LRU eviction
+
+        Returns:
+            {'path', 'size', 'media_type', 'created', 'last_access'}, or None
+            if unknown, expired or missing on disk
+        """
+        if not ARTIFACT_NAME.match(name):
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, media_type, created, last_access FROM artifacts WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        size, media, created, last_access = row
+        if self.ttl_s and time.time() - created > self.ttl_s:
+            return None
+        path = self.root / self._shard(name) / name
+        if not path.is_file():
+            return None
+
+        now = time.time()
+        if touch and now - last_access > ACCESS_RESOLUTION_S:
+            with self._lock:
+                self._db.execute("UPDATE artifacts SET last_access = ? WHERE name = ?", (now, name))
+                self._db.commit()
+            last_access = now
+        return {
+            'path': path,
+            'size': size,
+            'media_type': media,
+            'created': created,
+            'last_access': last_access
+        }
+
+    def expires_in(self, artifact: Dict) -> Optional[float]:
+        """Seconds until a looked-up artifact expires (None = no TTL)."""
+        if not self.ttl_s:
+            return None
+        return max(0.0, artifact['created'] + self.ttl_s - time.time())
+
+    def total_size(self) -> int:
+        """Bytes held by indexed artifacts."""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def _delete(self, names) -> int:
+        """Remove artifacts from disk and index; returns bytes freed."""
+        freed = 0
+        for name in names:
+            path = self.root / self._shard(name) / name
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._db.executemany("DELETE FROM artifacts WHERE name = ?", [(n,) for n in names])
+            self._db.commit()
+        return freed
+
+    def discard(self, *names: str) -> int:
+        """Remove artifacts that no longer match their result; returns bytes freed."""
+        return self._delete(list(names))
+
+    def evict(self) -> Dict:
+        """
+        Remove expired artifacts, then least recently used ones over quota.
+
+        Returns:
+            Counts and bytes removed
+        """
+        stats = {'expired': 0, 'evicted': 0, 'orphans': 0, 'freed_bytes': 0}
+
+        if self.ttl_s:
+            with self._lock:
+                expired = [n for (n,) in self._db.execute(
+                    "SELECT name FROM artifacts WHERE created < ?", (time.time() - self.ttl_s,)
+                )]
+            stats['expired'] = len(expired)
+            stats['freed_bytes'] += self._delete(expired)
+
+        if self.quota_bytes:
+            excess = self.total_size() - self.quota_bytes
+            if excess > 0:
+                victims = []
+                with self._lock:
+                    for name, size in self._db.execute(
+                        "SELECT name, size FROM artifacts ORDER BY last_access"
+                    ):
+                        victims.append(name)
+                        excess -= size
+                        if excess <= 0:
+                            break
+                stats['evicted'] = len(victims)
+                stats['freed_bytes'] += self._delete(victims)
+
+        stats['orphans'] = self._sweep_orphans()
+        if stats['expired'] or stats['evicted'] or stats['orphans']:
+            logger.info(f"Artifact store eviction: {stats}")
+        return stats
+
+    def _sweep_orphans(self) -> int:
+        """Delete stale shard files that were never indexed."""
+        cutoff = time.time() - ORPHAN_GRACE_S
+        removed = 0
+        for directory in self.root.iterdir():
+            if not directory.is_dir() or len(directory.name) != 2:
+                continue
+            for path in directory.iterdir():
+                try:
+                    if path.stat().st_mtime > cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                with self._lock:
+                    known = self._db.execute(
+                        "SELECT 1 FROM artifacts WHERE name = ?", (path.name,)
+                    ).fetchone()
+                if known is None:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+    def _adopt_flat_files(self) -> None:
+        """Move outputs written before the store existed into their shards."""
+        for path in self.root.iterdir():
+            if path.is_file() and ARTIFACT_NAME.match(path.name):
+                target = self.path(path.name)
+                try:
+                    os.replace(path, target)
+                except FileNotFoundError:
+                    # Adopted by another worker process
+                    continue
+                self.register(target)
+
+    def status(self) -> Dict:
+        """Size and limits for health checks."""
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        return {
+            'artifacts': count,
+            'total_bytes': self.total_size(),
+            'quota_bytes': self.quota_bytes,
+            'ttl_s': self.ttl_s
+        }
+
+
+class Evictor:
+    """Background thread running ArtifactStore.evict periodically."""
+
+    def __init__(self, store: ArtifactStore, interval_s: float = 300.0):
+        self.store = store
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="artifact-evictor", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.store.evict()
+            except Exception:
+                logger.exception("Artifact eviction failed")
+
+
+_store: Optional[ArtifactStore] = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Get or create the store singleton."""
+    global _store
+    if _store is None:
+        _store = ArtifactStore(
+            settings.OUTPUT_DIR,
+            ttl_s=settings.OUTPUT_TTL_HOURS * 3600,
+            quota_bytes=int(settings.OUTPUT_QUOTA_MB * 1024 * 1024)
+        )
+    return _store
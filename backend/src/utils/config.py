@@ -2,6 +2,7 @@
 Configuration settings for the backend.
 """
 import os
+import tempfile
 from pathlib import Path
 from typing import List
 
@@ -25,7 +26,7 @@ class Settings:
     
     # Model path - now expects PyTorch .pth file
     # Use relative path for portability (Docker/Linux support)
-    MODEL_PATH = MODELS_DIR / "saved_models" / "final_model.pth"
+    MODEL_PATH = Path(os.getenv("MODEL_PATH", str(MODELS_DIR / "saved_models" / "final_model.pth")))
     
     # Alternative model paths to try
     ALT_MODEL_PATHS = [
@@ -36,6 +37,11 @@ class Settings:
     
     DATA_PATH = DATA_DIR
     
+    # Server-side ingestion (/api/predict/by-path): studies are read in place
+    # from files under INGEST_ROOT instead of being uploaded (opt-in)
+    PATH_INGESTION = os.getenv("PATH_INGESTION", "false").lower() == "true"
+    INGEST_ROOT = Path(os.getenv("INGEST_ROOT", str(DATA_PATH)))
+    
     # API settings
     HOST = os.getenv("API_HOST", "0.0.0.0")
     PORT = int(os.getenv("API_PORT", "8000"))
@@ -59,6 +65,12 @@ class Settings:
     # File upload settings
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(100 * 1024 * 1024)))  # 100 MB default
     ALLOWED_EXTENSIONS = {".nii", ".nii.gz", ".gz"}
+    # Largest volume accepted, checked from the NIfTI header before decoding
+    # (see preprocessing/validation.py); BraTS volumes are 240x240x155
+    MAX_VOLUME_VOXELS = int(os.getenv("MAX_VOLUME_VOXELS", str(512 * 512 * 256)))
+    
+    # Bulk prediction (/api/predict/bulk): studies per request
+    BULK_MAX_STUDIES = int(os.getenv("BULK_MAX_STUDIES", "50"))
     
     # Preprocessing settings (match notebook exactly)
     TARGET_SIZE = (128, 128)
@@ -66,6 +78,81 @@ class Settings:
     VOLUME_START_AT = 22
     NUM_CLASSES = 4
     NUM_CHANNELS = 2  # 2 channels: flair, t1ce (matching Kaggle notebook)
+
+    # Intensity normalization per modality (see preprocessing/normalization.py):
+    # "minmax" (notebook, what the model was trained with), "percentile"
+    # (range from NORMALIZATION_PERCENTILES of the brain voxels, clipped) or
+    # "zscore" (mean/std of the brain voxels)
+    NORMALIZATION_STRATEGY = os.getenv("NORMALIZATION_STRATEGY", "minmax")
+    NORMALIZATION_PERCENTILES = tuple(
+        float(p) for p in os.getenv("NORMALIZATION_PERCENTILES", "0.5,99.5").split(",")
+    )
+    NORMALIZATION_SAMPLE_VOXELS = int(os.getenv("NORMALIZATION_SAMPLE_VOXELS", "1000000"))
+
+    # 2.5D input: neighbouring slices stacked per sample (odd, 1 = plain 2D).
+    # The UNet then takes NUM_CHANNELS * CONTEXT_SLICES input channels; a
+    # checkpoint trained with a different context overrides this at load.
+    CONTEXT_SLICES = int(os.getenv("CONTEXT_SLICES", "1"))
+    
+    # Inference mode: "resize" (whole slices resized to TARGET_SIZE),
+    # "sliding_window" (overlapping TARGET_SIZE patches at native resolution)
+    # or "multiplanar" (axial/coronal/sagittal predictions fused per voxel)
+    INFERENCE_MODES = ("resize", "sliding_window", "multiplanar")
+    INFERENCE_MODE = os.getenv("INFERENCE_MODE", "resize")
+    SW_OVERLAP = float(os.getenv("SW_OVERLAP", "0.5"))
+    SW_BATCH_SIZE = int(os.getenv("SW_BATCH_SIZE", "16"))
+    SW_SIGMA_SCALE = float(os.getenv("SW_SIGMA_SCALE", "0.125"))
+    SW_BACKGROUND_THRESHOLD = float(os.getenv("SW_BACKGROUND_THRESHOLD", "0"))
+    MULTIPLANAR_ORIENTATIONS = os.getenv("MULTIPLANAR_ORIENTATIONS", "axial,coronal,sagittal")
+    
+    # Inference precision: "fp32" or "bf16" (bfloat16 autocast, opt-in; fast on
+    # CPUs with AVX512-BF16/AMX). bf16 always runs the UNet channels-last.
+    INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")
+    CHANNELS_LAST = os.getenv("CHANNELS_LAST", "false").lower() == "true"
+    
+    # Default test-time augmentation set (comma-separated: hflip, vflip,
+    # hvflip; empty = off). Flipped variants share the forward batch.
+    TTA_TRANSFORMS = os.getenv("TTA_TRANSFORMS", "")
+    
+    # Default per-voxel uncertainty output: "entropy", "max_prob",
+    # "mc_dropout" or empty (off); resize mode only. MC dropout runs
+    # MC_DROPOUT_SAMPLES stochastic samples per slice in the same forward batch.
+    UNCERTAINTY_MODE = os.getenv("UNCERTAINTY_MODE", "")
+    MC_DROPOUT_SAMPLES = int(os.getenv("MC_DROPOUT_SAMPLES", "8"))
+    
+    # Build a frozen, conv+ReLU-fused model at load (fp32 only); the traced
+    # graph is cached next to the checkpoint, keyed by its hash
+    OPTIMIZE_MODEL = os.getenv("OPTIMIZE_MODEL", "true").lower() == "true"
+    
+    # Inference worker pool: forward passes run in this many local worker
+    # processes (batches handed over through shared memory on Unix sockets,
+    # see models/inference_pool.py); 0 = in the API process.
+    # INFERENCE_WORKER_THREADS = torch threads per worker (0 = CPUs / workers)
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+    INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", "0"))
+    INFERENCE_SOCKET_DIR = Path(os.getenv("INFERENCE_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "brats-inference")))
+    
+    # Inference/postprocessing batching: slices per forward pass, and slices
+    # resampled to the original grid per step (bounds postprocessing memory)
+    INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "16"))
+    POSTPROCESS_CHUNK_SLICES = int(os.getenv("POSTPROCESS_CHUNK_SLICES", "16"))
+    POSTPROCESS_INTERPOLATION = os.getenv("POSTPROCESS_INTERPOLATION", "bilinear")
+    
+    # 3D cleanup of the final mask (see postprocessing/cleanup.py): minimum
+    # component volume, keep only the largest whole-tumor component, fill
+    # enclosed holes; steps past the time budget are skipped
+    POSTPROCESS_CLEANUP = os.getenv("POSTPROCESS_CLEANUP", "true").lower() == "true"
+    POSTPROCESS_MIN_COMPONENT_MM3 = float(os.getenv("POSTPROCESS_MIN_COMPONENT_MM3", "50"))
+    POSTPROCESS_KEEP_LARGEST = os.getenv("POSTPROCESS_KEEP_LARGEST", "true").lower() == "true"
+    POSTPROCESS_FILL_HOLES = os.getenv("POSTPROCESS_FILL_HOLES", "true").lower() == "true"
+    POSTPROCESS_TIME_BUDGET_S = float(os.getenv("POSTPROCESS_TIME_BUDGET_S", "1.0"))
+    
+    # Segmentation mask output: "nii.gz", "nii" (uncompressed) or "bsm"
+    # (packed labels for the viewer, see utils/mask_codec.py)
+    MASK_FORMAT = os.getenv("MASK_FORMAT", "nii.gz")
+    MASK_COMPRESSION_LEVEL = int(os.getenv("MASK_COMPRESSION_LEVEL", "1"))
+    # Also write a packed .bsm copy served by /api/masks for the viewer
+    MASK_VIEWER_SIDECAR = os.getenv("MASK_VIEWER_SIDECAR", "true").lower() == "true"
     
     # Class labels
     CLASS_LABELS = {
@@ -85,6 +172,65 @@ class Settings:
     # Modality names (2 channels - matching Kaggle notebook)
     MODALITIES = ["flair", "t1ce"]
     
+    # Admin endpoints (token sent as X-Admin-Token; open only in DEBUG when unset)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    
+    # Request profiling (opt-in; zero overhead when disabled)
+    PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_HEADER = "X-Profile"
+    PROFILES_DIR = Path(os.getenv("PROFILES_DIR", str(BASE_DIR / "profiles")))
+    PROFILES_MAX_RUNS = int(os.getenv("PROFILES_MAX_RUNS", "20"))
+    PROFILES_ROW_LIMIT = int(os.getenv("PROFILES_ROW_LIMIT", "40"))
+    
+    # Admission control for prediction routes (see utils/admission.py).
+    # Cost unit: megavoxels x forward variants (TTA flips, dropout samples)
+    # x mode factor. Each client gets a token bucket refilled at
+    # ADMISSION_RATE units/s up to ADMISSION_BURST; admitted requests share
+    # ADMISSION_CONCURRENCY inference slots (0 = number of inference
+    # workers, at least 1) through a weighted fair queue of at most
+    # ADMISSION_MAX_QUEUED requests. Clients are told apart by the
+    # ADMISSION_CLIENT_HEADER value when the peer is a proxy listed in
+    # ADMISSION_TRUSTED_PROXIES (comma-separated addresses or networks;
+    # none by default), else by the peer address. The default header is the
+    # X-Real-IP that docker/nginx.conf sets; list the nginx address to use it.
+    ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+    ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "2.0"))
+    ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "100"))
+    ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "0"))
+    ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "32"))
+    ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "X-Real-IP")
+    ADMISSION_TRUSTED_PROXIES = os.getenv("ADMISSION_TRUSTED_PROXIES", "")
+    # Upload bytes per voxel assumed before the volumes are read
+    # (two gzip'd int16 volumes are ~2 bytes per voxel together)
+    ADMISSION_BYTES_PER_VOXEL = float(os.getenv("ADMISSION_BYTES_PER_VOXEL", "2.0"))
+    # Server processes (WORKERS, exported by gunicorn.conf.py). Buckets and
+    # queues are per process, so the limits above are divided among them.
+    SERVER_WORKERS = max(1, int(os.getenv("WORKERS", "1")))
+    
+    # Request deadlines for prediction routes (see utils/deadline.py): the
+    # client's REQUEST_TIMEOUT_HEADER (seconds) or REQUEST_TIMEOUT_S, capped
+    # at REQUEST_TIMEOUT_MAX_S; 0 = no limit. Without the header, bulk
+    # requests get that default once per study, within the same cap.
+    REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+    REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", "300"))
+    REQUEST_TIMEOUT_MAX_S = float(os.getenv("REQUEST_TIMEOUT_MAX_S", "1800"))
+    
+    # Cache of preprocessed model inputs (see preprocessing/tensor_cache.py),
+    # least recently used volumes are evicted beyond PREPROCESS_CACHE_MB
+    PREPROCESS_CACHE = os.getenv("PREPROCESS_CACHE", "true").lower() == "true"
+    PREPROCESS_CACHE_DIR = Path(os.getenv("PREPROCESS_CACHE_DIR", str(BASE_DIR / "cache" / "preprocessed")))
+    PREPROCESS_CACHE_MB = float(os.getenv("PREPROCESS_CACHE_MB", "4096"))
+    
+    # Output artifact store (see utils/artifact_store.py): results expire
+    # OUTPUT_TTL_HOURS after creation and the least recently accessed are
+    # evicted while OUTPUT_DIR holds more than OUTPUT_QUOTA_MB; 0 = no limit
+    OUTPUT_TTL_HOURS = float(os.getenv("OUTPUT_TTL_HOURS", "168"))
+    OUTPUT_QUOTA_MB = float(os.getenv("OUTPUT_QUOTA_MB", "2048"))
+    OUTPUT_EVICT_INTERVAL_S = float(os.getenv("OUTPUT_EVICT_INTERVAL_S", "300"))
+    # Keep resize-mode inputs and raw labels with each result so slice
+    # ranges can be re-segmented (/api/predict/results/<id>/resegment)
+    RESULT_STATE = os.getenv("RESULT_STATE", "true").lower() == "true"
+    
     @classmethod
     def get_model_path(cls) -> Path:
         """Get the first available model path."""
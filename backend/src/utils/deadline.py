@@ -0,0 +1,144 @@
+"""
+Request Deadlines
+=================
+Deadline propagation and cooperative cancellation for prediction work.
+
+A request gets a Deadline from its timeout header (or the server default)
+when it arrives; the API cancels it early if the client disconnects. The
+pipeline calls checkpoint() between preprocessing stages and inference
+batches, which raises DeadlineExceeded once the deadline has passed or was
+cancelled, so abandoned work stops within one batch.
+
+The active deadline lives in a context variable (set by deadline_scope in
+the thread running the job); checkpoint() is a no-op outside a scope.
+"""
+import time
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+from utils.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Set only while a request's job is running in the current context
+_active_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed or the request was cancelled."""
+
+
+class Deadline:
+    """Expiry time plus a cancellation flag, shared across threads."""
+
+    def __init__(self, timeout_s: Optional[float] = None):
+        """
+        Initialize deadline.
+
+        Args:
+            timeout_s: Seconds from now (None = no time limit)
+        """
+        self.started = time.monotonic()
+        # Set by deadline_from_header when the client chose the timeout
+        self.explicit = False
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        self.set_timeout(timeout_s)
+
+    def set_timeout(self, timeout_s: Optional[float]) -> None:
+        """Change the time limit, counted from when the deadline started."""
+        self.timeout_s = timeout_s
+        self.expires_at = self.started + timeout_s if timeout_s else None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Cancel the work (e.g. the client disconnected)."""
+        self.reason = reason
+        self._cancelled.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (None = no time limit)."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, stage: str = "") -> None:
+        """
+        Raise if the work should stop.
+
+        Raises:
+            DeadlineExceeded: If cancelled or past the deadline
+        """
+        where = f" during {stage}" if stage else ""
+        if self._cancelled.is_set():
+            raise DeadlineExceeded(f"Request {self.reason}{where}")
+        if self.expires_at is not None and time.monotonic() > self.expires_at:
+            raise DeadlineExceeded(f"Request deadline of {self.timeout_s:g}s exceeded{where}")
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make `deadline` the active one for checkpoints in this context."""
+    token = _active_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _active_deadline.reset(token)
+
+
+def checkpoint(stage: str = "") -> None:
+    """Stop here if the active deadline has passed or was cancelled."""
+    deadline = _active_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def deadline_from_header(value: Optional[str]) -> Deadline:
+    """
+    Build a request's deadline from its timeout header.
+
+    Args:
+        value: Header value in seconds (None = server default)
+
+    Returns:
+        Deadline capped at REQUEST_TIMEOUT_MAX_S (0 = uncapped)
+
+    Raises:
+        ValueError: If the value is not a positive number
+    """
+    timeout_s = settings.REQUEST_TIMEOUT_S
+    if value is not None:
+        try:
+            timeout_s = float(value)
+        except ValueError:
+            raise ValueError(f"{settings.REQUEST_TIMEOUT_HEADER} must be a number of seconds")
+        if not timeout_s > 0:
+            raise ValueError(f"{settings.REQUEST_TIMEOUT_HEADER} must be positive")
+    if settings.REQUEST_TIMEOUT_MAX_S > 0:
+        timeout_s = min(timeout_s or settings.REQUEST_TIMEOUT_MAX_S, settings.REQUEST_TIMEOUT_MAX_S)
+    deadline = Deadline(timeout_s or None)
+    deadline.explicit = value is not None
+    return deadline
+
+
+def scale_for_studies(deadline: Optional[Deadline], studies: int) -> None:
+    """
+    Give a multi-study request the server's timeout once per study.
+
+    Only the server default is scaled; a timeout the client sent in
+    REQUEST_TIMEOUT_HEADER covers the whole request. The result is still
+    capped at REQUEST_TIMEOUT_MAX_S (0 = uncapped).
+
+    Args:
+        deadline: The request's deadline (None = nothing to do)
+        studies: Number of studies in the request
+    """
+    if deadline is None or deadline.explicit or not deadline.timeout_s or studies <= 1:
+        return
+    timeout_s = deadline.timeout_s * studies
+    if settings.REQUEST_TIMEOUT_MAX_S > 0:
+        timeout_s = min(timeout_s, settings.REQUEST_TIMEOUT_MAX_S)
+    deadline.set_timeout(timeout_s)
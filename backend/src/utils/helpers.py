@@ -18,6 +18,46 @@ def validate_nifti_file(filepath: str) -> bool:
     return any(filepath.endswith(ext) for ext in valid_extensions)
 
 
+def resolve_data_path(path: str, root: Path, max_size: Optional[int] = None) -> Path:
+    """
+    Resolve a client-supplied NIfTI path inside an allow-listed root.
+    
+    Relative paths are taken relative to the root. Symlinks and ".." are
+    resolved before the containment check, so neither can leave the root.
+    
+    Args:
+        path: Path from the request
+        root: Allow-listed directory
+        max_size: Optional file size limit in bytes
+    
+    Returns:
+        Resolved path of an existing regular .nii/.nii.gz file under root
+    
+    Raises:
+        ValueError: If the path is empty, outside the root, missing, not a
+                    regular NIfTI file or too large
+    """
+    if not path or "\x00" in path:
+        raise ValueError("Empty or invalid path")
+    root = Path(root).resolve()
+    candidate = Path(path)
+    if not candidate.is_absolute():
+        candidate = root / candidate
+    try:
+        resolved = candidate.resolve(strict=True)
+    except (OSError, RuntimeError):
+        raise ValueError(f"File not found: {path}")
+    if resolved != root and root not in resolved.parents:
+        raise ValueError(f"Path is outside the data root: {path}")
+    if not resolved.is_file():
+        raise ValueError(f"Not a regular file: {path}")
+    if not resolved.name.lower().endswith((".nii", ".nii.gz")):
+        raise ValueError(f"Not a NIfTI file: {path}")
+    if max_size is not None and resolved.stat().st_size > max_size:
+        raise ValueError(f"File exceeds {max_size} bytes: {path}")
+    return resolved
+
+
 def get_file_hash(filepath: str) -> str:
     """Compute MD5 hash of file."""
     hash_md5 = hashlib.md5()
@@ -55,7 +95,8 @@ def get_mask_statistics(mask: np.ndarray) -> Dict:
     if len(mask.shape) == 4 and mask.shape[-1] == 4:
         mask = np.argmax(mask, axis=-1)
     
-    total_pixels = mask.size
+    from postprocessing.statistics import class_counts, class_statistics
+    
     class_names = {
         0: 'Non-tumor',
         1: 'Necrotic/Core',
@@ -63,14 +104,8 @@ def get_mask_statistics(mask: np.ndarray) -> Dict:
         3: 'Enhancing Tumor'
     }
     
-    stats = {'total_pixels': total_pixels}
-    for class_idx, class_name in class_names.items():
-        count = int(np.sum(mask == class_idx))
-        percentage = float((count / total_pixels) * 100)
-        stats[class_name] = {
-            'pixel_count': count,
-            'percentage': round(percentage, 2)
-        }
+    stats = {'total_pixels': mask.size}
+    stats.update(class_statistics(class_counts(mask, len(class_names)), class_names))
     
     return stats
 
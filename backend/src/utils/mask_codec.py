@@ -0,0 +1,210 @@
+"""
+Packed label-mask codec ("BSM1").
+
+Compact, slice-addressable encoding of uint8 label volumes for the viewer.
+Every axial slice (volume[:, :, k]) is cropped to the bounding box of its
+non-zero labels and run-length encoded; a fixed-size index table makes
+each slice retrievable with a single byte range.
+
+Layout (little-endian):
+    header  : magic "BSM1", uint32 H, W, D, uint32 reserved,
+              float64[16] affine (row-major)                      148 bytes
+    index   : D x (uint32 offset, uint32 length,
+                   uint16 y0, y1, x0, x1)                          16 bytes each
+    payload : per non-empty slice, uint32 n_runs, uint8[n_runs] values,
+              uint16[n_runs] run lengths; runs cover the bounding box
+              [y0:y1, x0:x1] in row-major order. Empty slices have length 0.
+"""
+import struct
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+MAGIC = b"BSM1"
+MEDIA_TYPE = "application/x-bsm"
+
+_HEADER = struct.Struct("<4sIIII16d")
+_INDEX_ENTRY = np.dtype([
+    ("offset", "<u4"), ("length", "<u4"),
+    ("y0", "<u2"), ("y1", "<u2"), ("x0", "<u2"), ("x1", "<u2"),
+])
+_MAX_RUN = np.iinfo(np.uint16).max
+
+HEADER_SIZE = _HEADER.size
+INDEX_ENTRY_SIZE = _INDEX_ENTRY.itemsize
+
+
+def _encode_runs(flat: np.ndarray) -> bytes:
+    """Run-length encode a flat uint8 array (vectorized)."""
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    lengths = np.diff(np.append(starts, flat.size))
+    values = flat[starts]
+
+    # Split runs that do not fit in uint16
+    if lengths.max() > _MAX_RUN:
+        parts = -(-lengths // _MAX_RUN)
+        values = np.repeat(values, parts)
+        split = np.full(parts.sum(), _MAX_RUN, dtype=np.int64)
+        last = np.cumsum(parts) - 1
+        split[last] = lengths - (parts - 1) * _MAX_RUN
+        lengths = split
+
+    return (
+        struct.pack("<I", values.size)
+        + values.astype(np.uint8).tobytes()
+        + lengths.astype("<u2").tobytes()
+    )
+
+
+def _decode_runs(payload: memoryview, size: int) -> np.ndarray:
+    """Decode a run-length payload into a flat uint8 array of `size` voxels."""
+    (n_runs,) = struct.unpack_from("<I", payload, 0)
+    values = np.frombuffer(payload, dtype=np.uint8, count=n_runs, offset=4)
+    lengths = np.frombuffer(payload, dtype="<u2", count=n_runs, offset=4 + n_runs)
+    flat = np.repeat(values, lengths.astype(np.int64))
+    if flat.size != size:
+        raise ValueError(f"Corrupt slice payload: {flat.size} voxels, expected {size}")
+    return flat
+
+
+def encode_slice(labels: np.ndarray) -> Optional[Tuple[Tuple[int, int, int, int], bytes]]:
+    """
+    Encode one slice as a standalone payload (same format as in a file).
+
+    Args:
+        labels: Label slice (H, W), values 0-255
+
+    Returns:
+        ((y0, y1, x0, x1) bounding box, payload), or None for an empty slice
+    """
+    rows = np.flatnonzero(labels.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(labels.any(axis=0))
+    y0, y1, x0, x1 = int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+    payload = _encode_runs(np.ascontiguousarray(labels[y0:y1, x0:x1], dtype=np.uint8).ravel())
+    return (y0, y1, x0, x1), payload
+
+
+def encode_mask(volume: np.ndarray, affine: Optional[np.ndarray] = None) -> bytes:
+    """
+    Encode a label volume.
+
+    Args:
+        volume: Label volume (H, W, D), values 0-255
+        affine: 4x4 voxel-to-world affine (identity if omitted)
+
+    Returns:
+        Encoded bytes
+    """
+    if volume.ndim != 3:
+        raise ValueError(f"Expected a 3D volume, got shape {volume.shape}")
+    height, width, depth = volume.shape
+    affine = np.eye(4) if affine is None else np.asarray(affine, dtype=np.float64)
+
+    index = np.zeros(depth, dtype=_INDEX_ENTRY)
+    payloads = []
+    offset = HEADER_SIZE + depth * INDEX_ENTRY_SIZE
+
+    # Non-zero rows/columns per slice, computed in one pass each
+    row_any = volume.any(axis=1)  # (H, D)
+    col_any = volume.any(axis=0)  # (W, D)
+
+    for k in range(depth):
+        rows = np.flatnonzero(row_any[:, k])
+        if rows.size == 0:
+            continue
+        cols = np.flatnonzero(col_any[:, k])
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        payload = _encode_runs(
+            np.ascontiguousarray(volume[y0:y1, x0:x1, k], dtype=np.uint8).ravel()
+        )
+        index[k] = (offset, len(payload), y0, y1, x0, x1)
+        payloads.append(payload)
+        offset += len(payload)
+
+    header = _HEADER.pack(MAGIC, height, width, depth, 0, *affine.ravel())
+    return b"".join([header, index.tobytes()] + payloads)
+
+
+def read_shape(data: bytes) -> Tuple[Tuple[int, int, int], np.ndarray]:
+    """
+    Parse the fixed-size header only.
+
+    Args:
+        data: At least the first HEADER_SIZE bytes
+
+    Returns:
+        (shape (H, W, D), affine 4x4)
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Truncated BSM1 header")
+    magic, height, width, depth, _, *affine = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a BSM1 mask")
+    return (height, width, depth), np.array(affine).reshape(4, 4)
+
+
+def read_header(data: bytes) -> Dict:
+    """
+    Parse the header and slice index.
+
+    Args:
+        data: At least the first HEADER_SIZE + D * INDEX_ENTRY_SIZE bytes
+
+    Returns:
+        Dictionary with 'shape', 'affine' and 'index' (structured array)
+    """
+    shape, affine = read_shape(data)
+    index = np.frombuffer(data, dtype=_INDEX_ENTRY, count=shape[2], offset=HEADER_SIZE)
+    return {
+        "shape": shape,
+        "affine": affine,
+        "index": index,
+    }
+
+
+def index_size(depth: int) -> int:
+    """Bytes taken by the header and the index table."""
+    return HEADER_SIZE + depth * INDEX_ENTRY_SIZE
+
+
+def decode_slice(data: bytes, k: int, header: Optional[Dict] = None) -> np.ndarray:
+    """
+    Decode one axial slice.
+
+    Args:
+        data: Encoded mask
+        k: Slice index
+        header: Result of read_header (parsed if omitted)
+
+    Returns:
+        Slice labels (H, W) uint8
+    """
+    header = header or read_header(data)
+    height, width, _ = header["shape"]
+    entry = header["index"][k]
+    out = np.zeros((height, width), dtype=np.uint8)
+    if entry["length"] == 0:
+        return out
+    y0, y1, x0, x1 = int(entry["y0"]), int(entry["y1"]), int(entry["x0"]), int(entry["x1"])
+    start = int(entry["offset"])
+    payload = memoryview(data)[start:start + int(entry["length"])]
+    out[y0:y1, x0:x1] = _decode_runs(payload, (y1 - y0) * (x1 - x0)).reshape(y1 - y0, x1 - x0)
+    return out
+
+
+def decode_mask(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode a full mask.
+
+    Args:
+        data: Encoded mask
+
+    Returns:
+        (volume (H, W, D) uint8, affine 4x4)
+    """
+    header = read_header(data)
+    volume = np.zeros(header["shape"], dtype=np.uint8)
+    for k in range(header["shape"][2]):
+        volume[:, :, k] = decode_slice(data, k, header)
+    return volume, header["affine"]
@@ -0,0 +1,196 @@
+"""
+Request-scoped profiling.
+Captures a Python-level profile (cProfile) and torch.profiler operator
+tables for selected requests, and keeps a bounded, rotating set of runs
+on disk for retrieval through the admin endpoints.
+"""
+import os
+import io
+import json
+import time
+import random
+import shutil
+import pstats
+import cProfile
+import contextvars
+import logging
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Artifacts written for every profiled run
+ARTIFACTS = {
+    "meta.json": "application/json",
+    "python.pstats": "application/octet-stream",
+    "python.txt": "text/plain",
+    "torch_ops.txt": "text/plain",
+}
+
+# Set only while a profiling session is running in the current context
+_active_run = contextvars.ContextVar("active_profile_run", default=None)
+
+
+def profile_stage(name: str):
+    """
+    Label a pipeline stage in the torch profile.
+
+    Returns a no-op context unless a profiling session is active, so
+    instrumented code pays nothing when profiling is disabled.
+    """
+    if _active_run.get() is None:
+        return nullcontext()
+    import torch
+    return torch.profiler.record_function(name)
+
+
+class RequestProfiler:
+    """Profiles sampled requests into a bounded, rotating directory."""
+
+    def __init__(
+        self,
+        output_dir: Path,
+        sample_rate: float = 0.0,
+        max_runs: int = 20,
+        row_limit: int = 40
+    ):
+        """
+        Initialize profiler.
+
+        Args:
+            output_dir: Directory holding one sub-directory per run
+            sample_rate: Fraction of requests profiled without a header
+            max_runs: Number of runs kept on disk (oldest are removed)
+            row_limit: Rows kept in the text tables
+        """
+        self.output_dir = Path(output_dir)
+        self.sample_rate = sample_rate
+        self.max_runs = max_runs
+        self.row_limit = row_limit
+
+    def should_profile(self, requested: bool = False) -> bool:
+        """Decide whether the current request is profiled."""
+        if requested:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def session(self, label: str):
+        """
+        Profile the enclosed block.
+
+        Args:
+            label: Free-form label stored in the run metadata
+
+        Yields:
+            Run id under which the artifacts are written
+        """
+        import torch
+
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+        run_dir = self.output_dir / run_id
+        run_dir.mkdir(parents=True, exist_ok=True)
+
+        python_profile = cProfile.Profile()
+        torch_profile = torch.profiler.profile(
+            activities=[torch.profiler.ProfilerActivity.CPU],
+            record_shapes=True
+        )
+        token = _active_run.set(run_id)
+        started = time.time()
+        error = None
+
+        torch_profile.__enter__()
+        python_profile.enable()
+        try:
+            yield run_id
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            python_profile.disable()
+            torch_profile.__exit__(None, None, None)
+            _active_run.reset(token)
+            duration = time.time() - started
+            try:
+                self._write_run(run_dir, label, started, duration, error,
+                                python_profile, torch_profile)
+            except Exception as write_e:
+                logger.warning(f"Could not write profile {run_id}: {write_e}")
+            self._rotate()
+            logger.info(f"Profile {run_id} written ({duration:.2f}s, {label})")
+
+    def _write_run(self, run_dir, label, started, duration, error,
+                   python_profile, torch_profile) -> None:
+        """Write the artifacts of a finished run."""
+        python_profile.dump_stats(str(run_dir / "python.pstats"))
+
+        stream = io.StringIO()
+        stats = pstats.Stats(python_profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(self.row_limit)
+        (run_dir / "python.txt").write_text(stream.getvalue())
+
+        table = torch_profile.key_averages().table(
+            sort_by="self_cpu_time_total", row_limit=self.row_limit
+        )
+        (run_dir / "torch_ops.txt").write_text(table)
+
+        meta = {
+            "run_id": run_dir.name,
+            "label": label,
+            "started_at": started,
+            "duration_s": round(duration, 4),
+            "error": error,
+            "artifacts": sorted(ARTIFACTS),
+        }
+        (run_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    def _rotate(self) -> None:
+        """Keep only the newest `max_runs` runs."""
+        runs = sorted(
+            (p for p in self.output_dir.iterdir() if p.is_dir()),
+            key=lambda p: p.stat().st_mtime
+        )
+        for old in runs[:max(0, len(runs) - self.max_runs)]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def list_runs(self) -> List[Dict]:
+        """List stored runs, newest first."""
+        if not self.output_dir.exists():
+            return []
+        runs = []
+        for run_dir in self.output_dir.iterdir():
+            meta_path = run_dir / "meta.json"
+            if meta_path.is_file():
+                try:
+                    runs.append(json.loads(meta_path.read_text()))
+                except (OSError, ValueError):
+                    continue
+        return sorted(runs, key=lambda m: m.get("started_at", 0), reverse=True)
+
+    def get_artifact(self, run_id: str, name: str) -> Optional[Path]:
+        """Resolve an artifact path, or None if unknown."""
+        if name not in ARTIFACTS or Path(run_id).name != run_id:
+            return None
+        path = self.output_dir / run_id / name
+        return path if path.is_file() else None
+
+
+_profiler: Optional[RequestProfiler] = None
+
+
+def get_profiler() -> RequestProfiler:
+    """Get or create the profiler singleton."""
+    global _profiler
+    if _profiler is None:
+        _profiler = RequestProfiler(
+            output_dir=settings.PROFILES_DIR,
+            sample_rate=settings.PROFILING_SAMPLE_RATE,
+            max_runs=settings.PROFILES_MAX_RUNS,
+            row_limit=settings.PROFILES_ROW_LIMIT
+        )
+    return _profiler
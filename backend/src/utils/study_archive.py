@@ -0,0 +1,129 @@
+"""
+Study Archives
+==============
+Finds FLAIR/T1CE pairs in tar/zip archives and extracts them to disk.
+
+Members are matched by file name (e.g. BraTS20_Training_001_flair.nii.gz)
+and written under generated names, so archive paths never reach the
+filesystem (no traversal, links or special files).
+"""
+import re
+import tarfile
+import zipfile
+import logging
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "<study prefix>[_-.]<modality>.nii[.gz]"
+MODALITY_FILE = re.compile(r"^(?P<study>.*?)[_\-.]?(?P<modality>flair|t1ce)\.nii(\.gz)?$", re.IGNORECASE)
+
+COPY_CHUNK = 1024 * 1024
+
+
+def copy_limited(source: BinaryIO, dest_path: Path, limit: int) -> int:
+    """
+    Stream a file object to disk, refusing more than `limit` bytes.
+
+    Returns:
+        Bytes written
+
+    Raises:
+        ValueError: If the source is larger than the limit
+    """
+    written = 0
+    with open(dest_path, "wb") as f:
+        while True:
+            chunk = source.read(COPY_CHUNK)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > limit:
+                raise ValueError(f"{dest_path.name} exceeds {limit} bytes")
+            f.write(chunk)
+    return written
+
+
+def study_name(filename: str, index: int) -> str:
+    """Study key of an uploaded volume ("case1_flair.nii.gz" -> "case1")."""
+    match = MODALITY_FILE.match(Path(filename or "").name)
+    return match["study"] if match and match["study"] else f"study_{index}"
+
+
+def pair_studies(names: List[str]) -> Tuple[Dict[str, Dict[str, str]], List[str]]:
+    """
+    Group member names into studies.
+
+    Args:
+        names: Archive member paths
+
+    Returns:
+        ({study: {'flair': name, 't1ce': name}} for complete studies,
+         sorted study keys that are missing a modality)
+    """
+    studies: Dict[str, Dict[str, str]] = {}
+    for name in names:
+        match = MODALITY_FILE.match(name)
+        if match:
+            studies.setdefault(match["study"], {})[match["modality"].lower()] = name
+    complete = {k: v for k, v in studies.items() if len(v) == 2}
+    incomplete = sorted(k for k in studies if k not in complete)
+    return dict(sorted(complete.items())), incomplete
+
+
+def extract_studies(
+    archive_path: Path,
+    dest_dir: Path,
+    max_file_size: int,
+    max_studies: int
+) -> Tuple[List[Tuple[str, Path, Path]], List[str]]:
+    """
+    Extract the FLAIR/T1CE pairs of a tar (any compression) or zip archive.
+
+    Args:
+        archive_path: Archive on disk
+        dest_dir: Directory the volumes are written to
+        max_file_size: Per-volume size limit in bytes
+        max_studies: Maximum number of studies
+
+    Returns:
+        ([(study, flair_path, t1ce_path)], incomplete study keys)
+
+    Raises:
+        ValueError: Unreadable archive, too many studies or oversized member
+    """
+    if zipfile.is_zipfile(archive_path):
+        archive = zipfile.ZipFile(archive_path)
+        members = {i.filename: i for i in archive.infolist() if not i.is_dir()}
+        sizes = {name: info.file_size for name, info in members.items()}
+        open_member = archive.open
+    else:
+        try:
+            archive = tarfile.open(archive_path, mode="r:*")
+        except tarfile.TarError as e:
+            raise ValueError(f"Not a tar or zip archive: {e}")
+        members = {m.name: m for m in archive.getmembers() if m.isfile()}
+        sizes = {name: m.size for name, m in members.items()}
+        open_member = archive.extractfile
+
+    with archive:
+        studies, incomplete = pair_studies(list(members))
+        if len(studies) > max_studies:
+            raise ValueError(f"Archive holds {len(studies)} studies, the limit is {max_studies}")
+
+        extracted = []
+        for index, (study, files) in enumerate(studies.items()):
+            paths = {}
+            for modality, name in files.items():
+                if sizes[name] > max_file_size:
+                    raise ValueError(f"{name} exceeds {max_file_size} bytes")
+                suffix = ".nii.gz" if name.lower().endswith(".gz") else ".nii"
+                paths[modality] = dest_dir / f"{index:04d}_{modality}{suffix}"
+                with open_member(members[name]) as source:
+                    copy_limited(source, paths[modality], max_file_size)
+            extracted.append((study, paths["flair"], paths["t1ce"]))
+
+    logger.info(f"Extracted {len(extracted)} studies from {archive_path.name}")
+    return extracted, incomplete
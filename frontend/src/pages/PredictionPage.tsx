@@ -1,7 +1,9 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Brain, Info, FileText, Activity } from 'lucide-react';
 import { predictionApi } from '@/services/api';
-import type { PredictionResponse, FileUploadState } from '@/types';
+import { decodeStreamSlice } from '@/services/maskCodec';
+import { CLASS_COLORS } from '@/types';
+import type { PredictionResponse, PredictionStreamBatch, FileUploadState } from '@/types';
 
 // UI Components (simplified inline versions)
 interface CardProps {
@@ -116,6 +118,86 @@ const FileUpload = ({
   </div>
 );
 
+// Streaming progress: slices predicted so far
+interface StreamProgress {
+  total: number;
+  done: number;
+  height: number;
+  width: number;
+  tumorVoxels: number[]; // per slice, -1 = not predicted yet
+  preview: { index: number; labels: Uint8Array } | null;
+}
+
+// Label slice drawn with the class colours (background transparent)
+const SlicePreview = ({ labels, height, width }: { labels: Uint8Array; height: number; width: number }) => {
+  const canvasRef = useRef<HTMLCanvasElement>(null);
+
+  useEffect(() => {
+    const ctx = canvasRef.current?.getContext('2d');
+    if (!ctx) return;
+    const image = ctx.createImageData(width, height);
+    labels.forEach((label, i) => {
+      if (label === 0) return;
+      const hex = CLASS_COLORS[label] ?? '#FFFFFF';
+      image.data[4 * i] = parseInt(hex.slice(1, 3), 16);
+      image.data[4 * i + 1] = parseInt(hex.slice(3, 5), 16);
+      image.data[4 * i + 2] = parseInt(hex.slice(5, 7), 16);
+      image.data[4 * i + 3] = 255;
+    });
+    ctx.putImageData(image, 0, 0);
+  }, [labels, height, width]);
+
+  return (
+    <canvas
+      ref={canvasRef}
+      width={width}
+      height={height}
+      className="w-48 h-48 bg-gray-900 rounded-lg border"
+      style={{ imageRendering: 'pixelated' }}
+    />
+  );
+};
+
+const ProgressPanel = ({ progress }: { progress: StreamProgress }) => {
+  const maxTumor = Math.max(1, ...progress.tumorVoxels);
+  return (
+    <div className="space-y-4">
+      <div>
+        <div className="flex justify-between text-sm text-gray-600 mb-1">
+          <span>Segmenting slices</span>
+          <span>{progress.done} / {progress.total}</span>
+        </div>
+        <div className="h-2 bg-gray-200 rounded-full overflow-hidden">
+          <div
+            className="h-full bg-blue-600 transition-all duration-300"
+            style={{ width: `${(100 * progress.done) / Math.max(1, progress.total)}%` }}
+          />
+        </div>
+      </div>
+
+      {/* Tumor area per slice, filled in as batches arrive */}
+      <div className="flex items-end h-12 gap-px">
+        {progress.tumorVoxels.map((voxels, i) => (
+          <div
+            key={i}
+            className={`flex-1 ${voxels < 0 ? 'bg-gray-100' : 'bg-red-400'}`}
+            style={{ height: voxels < 0 ? '100%' : `${Math.max(2, (100 * voxels) / maxTumor)}%` }}
+          />
+        ))}
+      </div>
+
+      {progress.preview && (
+        <div className="flex items-center gap-4">
+          <SlicePreview labels={progress.preview.labels} height={progress.height} width={progress.width} />
+          <p className="text-sm text-gray-600">
+            Largest tumor area so far: slice {progress.preview.index}
+          </p>
+        </div>
+      )}
+    </div>
+  );
+};
+
 // Results Panel Component
 const ResultsPanel = ({ results }: { results: PredictionResponse }) => (
   <div className="space-y-6">
@@ -184,6 +266,7 @@ export function PredictionPage() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [results, setResults] = useState<PredictionResponse | null>(null);
+  const [progress, setProgress] = useState<StreamProgress | null>(null);
   const [modelInfo, setModelInfo] = useState<any>(null);
 
   // Fetch model info on mount
@@ -206,17 +289,50 @@ export function PredictionPage() {
 
     setLoading(true);
     setError(null);
+    setProgress(null);
+
+    const onBatch = (batch: PredictionStreamBatch) =>
+      setProgress((prev) => {
+        if (!prev) return prev;
+        const tumorVoxels = [...prev.tumorVoxels];
+        let preview = prev.preview;
+        batch.class_counts.forEach((counts, i) => {
+          const index = batch.start + i;
+          tumorVoxels[index] = counts.slice(1).reduce((a, b) => a + b, 0);
+          const best = preview ? tumorVoxels[preview.index] : 0;
+          if (batch.mask_slices && tumorVoxels[index] > best) {
+            preview = {
+              index,
+              labels: decodeStreamSlice(batch.mask_slices[i], prev.height, prev.width),
+            };
+          }
+        });
+        return { ...prev, done: Math.max(prev.done, batch.stop), tumorVoxels, preview };
+      });
 
     try {
-      const result = await predictionApi.predict({
-        flair: files.flair!,
-        t1ce: files.t1ce!,
-      });
+      const result = await predictionApi.predictStream(
+        { flair: files.flair!, t1ce: files.t1ce! },
+        {
+          onStart: (start) =>
+            setProgress({
+              total: start.slices,
+              done: 0,
+              height: start.input_shape[0],
+              width: start.input_shape[1],
+              tumorVoxels: new Array(start.slices).fill(-1),
+              preview: null,
+            }),
+          onBatch,
+        },
+        { maskSlices: true }
+      );
       setResults(result);
     } catch (err: any) {
-      setError(err.response?.data?.detail || err.message || 'Prediction failed');
+      setError(err.message || 'Prediction failed');
     } finally {
       setLoading(false);
+      setProgress(null);
     }
   };
 
@@ -224,6 +340,7 @@ export function PredictionPage() {
     setFiles({ flair: null, t1ce: null });
     setResults(null);
     setError(null);
+    setProgress(null);
   };
 
   return (
@@ -317,6 +434,12 @@ export function PredictionPage() {
               </div>
             </div>
 
+            {progress && (
+              <div className="mb-6">
+                <ProgressPanel progress={progress} />
+              </div>
+            )}
+
             {/* Action Buttons */}
             <div className="flex gap-4">
               <Button
@@ -1,5 +1,11 @@
 import axios from 'axios';
-import type { PredictionResponse, HealthStatus } from '@/types';
+import type {
+  PredictionResponse,
+  PredictionStreamHandlers,
+  HealthStatus,
+  MaskIndex,
+} from '@/types';
+import { decodeMaskSlice, sliceByteRange } from './maskCodec';
 
 const API_BASE_URL = (import.meta.env.VITE_API_URL || 'http://localhost:8000').replace(/\/$/, '');
 
@@ -37,6 +43,20 @@ api.interceptors.response.use(
   }
 );
 
+/** Split one Server-Sent Events message into its event name and data. */
+function parseSseMessage(message: string): { event: string; data: string } {
+  let event = 'message';
+  const data: string[] = [];
+  for (const line of message.split('\n')) {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      data.push(line.slice(5).replace(/^ /, ''));
+    }
+  }
+  return { event, data: data.join('\n') };
+}
+
 export const healthApi = {
   async check(): Promise<HealthStatus> {
     const response = await api.get('/health/');
@@ -86,6 +106,74 @@ export const predictionApi = {
     return response.data;
   },
 
+  /**
+   * Run a prediction over `/predict/stream` (Server-Sent Events). The
+   * handlers are called as soon as each forward batch finishes; resolves
+   * with the final result.
+   */
+  async predictStream(
+    files: {
+      flair: File;
+      t1ce: File;
+    },
+    handlers: PredictionStreamHandlers = {},
+    options: { maskSlices?: boolean; signal?: AbortSignal } = {}
+  ): Promise<PredictionResponse> {
+    const formData = new FormData();
+    formData.append('flair', files.flair);
+    formData.append('t1ce', files.t1ce);
+    formData.append('mask_slices', options.maskSlices ? 'true' : 'false');
+
+    // EventSource cannot POST, so the stream is read from fetch
+    const response = await fetch(`${API_BASE_URL}/api/predict/stream`, {
+      method: 'POST',
+      body: formData,
+      headers: { Accept: 'text/event-stream' },
+      signal: options.signal,
+    });
+    if (!response.ok || !response.body) {
+      const detail = await response.json().then(
+        (body) => body.detail,
+        () => response.statusText
+      );
+      throw new Error(typeof detail === 'string' ? detail : `Prediction failed (${response.status})`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += value;
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary >= 0) {
+        const { event, data } = parseSseMessage(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        const payload = JSON.parse(data);
+        switch (event) {
+          case 'start':
+            handlers.onStart?.(payload);
+            break;
+          case 'batch':
+            handlers.onBatch?.(payload);
+            break;
+          case 'result':
+            await reader.cancel();
+            return payload as PredictionResponse;
+          case 'error':
+          case 'cancelled':
+            await reader.cancel();
+            throw new Error(payload.detail);
+        }
+      }
+    }
+    throw new Error('Prediction stream ended without a result');
+  },
+
   async getClasses(): Promise<Record<number, string>> {
     const response = await api.get('/predict/classes');
     return response.data;
@@ -106,6 +194,51 @@ export const predictionApi = {
   },
 };
 
+export const maskApi = {
+  /** Fetch the slice index of a packed mask (`viewer_mask` URL from a prediction). */
+  async getIndex(viewerMask: string): Promise<MaskIndex> {
+    const response = await axios.get<MaskIndex>(`${API_BASE_URL}${viewerMask}/index`);
+    return response.data;
+  },
+
+  /**
+   * Fetch and decode slices [start, stop) with a single HTTP range request.
+   * Returns one height x width label array per slice.
+   */
+  async getSlices(
+    viewerMask: string,
+    index: MaskIndex,
+    start: number,
+    stop: number
+  ): Promise<Uint8Array[]> {
+    const [height, width] = index.shape;
+    const entries = index.slices.slice(start, stop);
+    const range = sliceByteRange(index, start, stop);
+    if (range === null) {
+      return entries.map(() => new Uint8Array(height * width));
+    }
+
+    const response = await axios.get<ArrayBuffer>(`${API_BASE_URL}${viewerMask}`, {
+      responseType: 'arraybuffer',
+      headers: { Range: `bytes=${range[0]}-${range[1]}` },
+    });
+    // Servers may ignore the range and send the whole file
+    const base = response.status === 206 ? range[0] : 0;
+    const buffer = response.data;
+
+    return entries.map((entry) =>
+      entry.length === 0
+        ? new Uint8Array(height * width)
+        : decodeMaskSlice(
+            new DataView(buffer, entry.offset - base, entry.length),
+            entry,
+            height,
+            width
+          )
+    );
+  },
+};
+
 export const dataApi = {
   async getDatasetInfo() {
     const response = await api.get('/data/dataset-info');
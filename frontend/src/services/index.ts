@@ -1 +1,2 @@
-export { default as api, healthApi, predictionApi, dataApi } from './api';
+export { default as api, healthApi, predictionApi, maskApi, dataApi } from './api';
+export { decodeMaskSlice, decodeStreamSlice, sliceByteRange } from './maskCodec';
@@ -0,0 +1,90 @@
+import type { MaskIndex, MaskSliceEntry, StreamMaskSlice } from '@/types';
+
+/**
+ * Decode one slice payload of a packed (BSM1) mask.
+ *
+ * A payload is `uint32 nRuns`, `uint8[nRuns]` values and `uint16[nRuns]`
+ * run lengths (little-endian) covering the slice bounding box row by row.
+ * Returns the full slice (height x width, row-major) with zeros outside
+ * the bounding box.
+ */
+export function decodeMaskSlice(
+  payload: DataView,
+  entry: MaskSliceEntry,
+  height: number,
+  width: number
+): Uint8Array {
+  const out = new Uint8Array(height * width);
+  if (entry.length === 0) {
+    return out;
+  }
+
+  const [y0, y1, x0, x1] = entry.bbox;
+  const boxWidth = x1 - x0;
+  const nRuns = payload.getUint32(0, true);
+  const valuesOffset = 4;
+  const lengthsOffset = 4 + nRuns;
+
+  let pos = 0; // position inside the bounding box
+  for (let r = 0; r < nRuns; r++) {
+    const value = payload.getUint8(valuesOffset + r);
+    let remaining = payload.getUint16(lengthsOffset + 2 * r, true);
+    if (value === 0) {
+      pos += remaining;
+      continue;
+    }
+    while (remaining > 0) {
+      const row = Math.floor(pos / boxWidth);
+      const col = pos % boxWidth;
+      const span = Math.min(remaining, boxWidth - col);
+      const start = (y0 + row) * width + x0 + col;
+      out.fill(value, start, start + span);
+      pos += span;
+      remaining -= span;
+    }
+  }
+
+  if (pos !== (y1 - y0) * boxWidth) {
+    throw new Error(`Corrupt mask slice: decoded ${pos} voxels`);
+  }
+  return out;
+}
+
+/**
+ * Byte range (inclusive) covering the payloads of slices [start, stop).
+ * Returns null when every slice in the range is empty.
+ */
+export function sliceByteRange(
+  index: MaskIndex,
+  start: number,
+  stop: number
+): [number, number] | null {
+  const entries = index.slices.slice(start, stop).filter((e) => e.length > 0);
+  if (entries.length === 0) {
+    return null;
+  }
+  const first = entries[0];
+  const last = entries[entries.length - 1];
+  return [first.offset, last.offset + last.length - 1];
+}
+
+/**
+ * Decode a label slice from a streamed prediction batch (`mask_slices`).
+ * Empty slices are sent as null.
+ */
+export function decodeStreamSlice(
+  slice: StreamMaskSlice | null,
+  height: number,
+  width: number
+): Uint8Array {
+  if (slice === null) {
+    return new Uint8Array(height * width);
+  }
+  const bytes = Uint8Array.from(atob(slice.data), (c) => c.charCodeAt(0));
+  return decodeMaskSlice(
+    new DataView(bytes.buffer),
+    { offset: 0, length: bytes.length, bbox: slice.bbox },
+    height,
+    width
+  );
+}
@@ -1,6 +1,10 @@
 export interface PredictionResponse {
   status: string;
+  result_id: string;
+  revision: number;
   segmentation_mask: string;
+  mask_format: string;
+  viewer_mask: string | null;
   overlay_image: string | null;
   tumor_stats: Record<string, {
     pixel_count: number;
@@ -16,6 +20,44 @@ export interface PredictionResponse {
   model_used: string;
 }
 
+export interface MaskSliceEntry {
+  offset: number;
+  length: number;
+  bbox: [number, number, number, number]; // y0, y1, x0, x1
+}
+
+export interface MaskIndex {
+  shape: [number, number, number];
+  affine: number[][];
+  media_type: string;
+  size: number;
+  slices: MaskSliceEntry[];
+}
+
+/** Label slice in a streamed batch: BSM1 run-length payload (base64) over `bbox`. */
+export interface StreamMaskSlice {
+  bbox: [number, number, number, number]; // y0, y1, x0, x1
+  data: string;
+}
+
+export interface PredictionStreamStart {
+  slices: number;
+  input_shape: number[];
+  slices_per_batch: number;
+}
+
+export interface PredictionStreamBatch {
+  start: number;
+  stop: number;
+  class_counts: number[][]; // per slice, voxels per class (before cleanup)
+  mask_slices?: (StreamMaskSlice | null)[];
+}
+
+export interface PredictionStreamHandlers {
+  onStart?: (event: PredictionStreamStart) => void;
+  onBatch?: (event: PredictionStreamBatch) => void;
+}
+
 export interface HealthStatus {
   status: string;
   service: string;